@@ -7,12 +7,38 @@ import argparse
 
 import sh
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "src"))
 
-def compile_project(quit_pdb, optimize, jit, debug, output):
+
+def freeze_stdlib(snapshot_path):
+    """
+    Run the stdlib with the untranslated interpreter and save the snapshot,
+    which is then embedded into the binary by the `frozen_stdlib` module.
+    """
+    from tinySelf.vm import frozen_stdlib
+
+    with open(frozen_stdlib.STDLIB_PATH) as f:
+        stdlib_source = f.read()
+
+    snapshot = frozen_stdlib.freeze_stdlib(stdlib_source,
+                                           frozen_stdlib.STDLIB_PATH)
+
+    with open(snapshot_path, "wb") as f:
+        f.write(snapshot)
+
+
+def compile_project(quit_pdb, optimize, jit, debug, output, freeze):
     target_path = os.path.join(
         os.path.dirname(__file__),
         "src/target.py"
     )
+    env = dict(os.environ)
+    if freeze:
+        snapshot_path = os.path.abspath(output + ".stdlib.snapshot")
+        freeze_stdlib(snapshot_path)
+        env["TINYSELF_FROZEN_STDLIB"] = snapshot_path
+
     args = {
         "opt": optimize,
         "gc": "incminimark",
@@ -46,7 +72,7 @@ def compile_project(quit_pdb, optimize, jit, debug, output):
         )
 
     try:
-        rpython(args, target_path, _fg=True)
+        rpython(args, target_path, _env=env, _fg=True)
     except sh.ErrorReturnCode_1:
         pass
 
@@ -91,6 +117,16 @@ if __name__ == '__main__':
         action="store_true",
         help="Add debug informations into the binary."
     )
+    parser.add_argument(
+        "-n",
+        "--no-frozen-stdlib",
+        action="store_true",
+        help=(
+            "Don't embed the initialized stdlib into the binary. The stdlib "
+            "is then run at each start from objects/stdlib.tself of this "
+            "checkout."
+        )
+    )
 
     args = parser.parse_args()
 
@@ -101,6 +137,7 @@ if __name__ == '__main__':
             args.jit,
             args.debug,
             args.output,
+            not args.no_frozen_stdlib,
         )
     except Exception as e:
         sys.stderr.write(e.message + "\n")
@@ -19,15 +19,41 @@ from tinySelf.parser import lex_and_parse_as_root
 
 from tinySelf.vm.object_layout import Object
 from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.snapshot import SnapshotError
+from tinySelf.vm.snapshot import load_snapshot
+from tinySelf.vm.snapshot import save_snapshot
 from tinySelf.vm.virtual_machine import virtual_machine
+from tinySelf.vm.frozen_stdlib import STDLIB_PATH
+from tinySelf.vm.frozen_stdlib import FROZEN_STDLIB
 from tinySelf.vm.primitives import PrimitiveNilObject
 
 
 NIL = PrimitiveNilObject()
 
 
-def run_interactive():
-    _, interpreter = virtual_machine("()")
+def read_stdlib():
+    """
+    Source of the stdlib for the binary built without the frozen stdlib.
+
+    Returns:
+        str: Source of the stdlib, or "" when the frozen stdlib is used.
+    """
+    if FROZEN_STDLIB:
+        return ""
+
+    if not os.path.exists(STDLIB_PATH):
+        ewriteln("Stdlib `%s` not found, using bare universe." % STDLIB_PATH)
+        return ""
+
+    with open(STDLIB_PATH) as f:
+        return f.read()
+
+
+def run_interactive(interpreter=None):
+    if interpreter is None:
+        _, interpreter = virtual_machine("()", stdlib_source=read_stdlib(),
+                                         stdlib_path=STDLIB_PATH,
+                                         snapshot_data=FROZEN_STDLIB)
 
     while True:
         line = stdin_readline(":> ")
@@ -61,9 +87,21 @@ def run_interactive():
     return 0
 
 
-def run_script(path):
+def run_script(path, snapshot_path=""):
+    # the snapshot already contains its own stdlib
+    stdlib_source = ""
+    if not snapshot_path:
+        stdlib_source = read_stdlib()
+
     with open(path) as f:
-        process, interpreter = virtual_machine(f.read())
+        process, interpreter = virtual_machine(f.read(), path=path,
+                                               stdlib_source=stdlib_source,
+                                               stdlib_path=STDLIB_PATH,
+                                               snapshot_path=snapshot_path,
+                                               snapshot_data=FROZEN_STDLIB)
+
+    if process is None:
+        return 1
 
     if process.finished_with_error:
         ewrite("Error: ")
@@ -108,21 +146,51 @@ def compile_file(path):
     return 0
 
 
-# def run_snapshot(path):
-#     print "Running snapshot", path
-#     return 0
+def run_snapshot(path):
+    try:
+        interpreter = load_snapshot(path)
+    except SnapshotError as e:
+        ewriteln("Couldn't load snapshot:")
+        ewriteln(e.message)
+        return 1
+
+    return run_interactive(interpreter)
+
+
+def write_snapshot(script_path, snapshot_path):
+    with open(script_path) as f:
+        process, interpreter = virtual_machine(f.read(), path=script_path)
+
+    if process is None or process.finished_with_error:
+        ewriteln("Couldn't run `%s`, snapshot not written." % script_path)
+        if process is not None:
+            ewriteln(process.result.__str__())
+
+        return 1
+
+    try:
+        save_snapshot(interpreter, snapshot_path)
+    except SnapshotError as e:
+        ewriteln("Couldn't write snapshot:")
+        ewriteln(e.message)
+        return 1
+
+    return 0
 
 
 def print_help(fn):
     ewriteln("Usage:")
-    ewriteln("\t%s [-h, -v] [-f FN] [-c FN] [-a FN]" % fn)
+    ewriteln("\t%s [-h, -v] [-f FN] [-s FN [SCRIPT]] [-w FN SNAPSHOT] [-c FN] [-a FN]" % fn)
     ewriteln("")
     ewriteln("\t-f FN, --filename FN")
     ewriteln("\t\tRun `FN` as a tinySelf script.")
     ewriteln("")
-    # ewriteln("\t-s FN, --snapshot FN")
-    # ewriteln("\t\tRun memory snapshot `FN`.")
-    # ewriteln("")
+    ewriteln("\t-s FN [SCRIPT], --snapshot FN [SCRIPT]")
+    ewriteln("\t\tRun memory snapshot `FN`, interactively or with the `SCRIPT`.")
+    ewriteln("")
+    ewriteln("\t-w FN SNAPSHOT, --write-snapshot FN SNAPSHOT")
+    ewriteln("\t\tRun `FN` (usually the stdlib) and save the universe to `SNAPSHOT`.")
+    ewriteln("")
     ewriteln("\t-h, --help")
     ewriteln("\t\tShow this help.")
     ewriteln("")
@@ -153,8 +221,26 @@ def parse_arg_with_file_param(command, path):
         return run_script(path)
     elif command in ["-c", "--compile"]:
         return compile_file(path)
-    # elif command in ["-s", "--snapshot"]:
-    #     return run_script(path)
+    elif command in ["-s", "--snapshot"]:
+        return run_snapshot(path)
+
+    ewriteln("Unknown command `%s`!" % command)
+    return 1
+
+
+def parse_arg_with_two_file_params(command, path, second_path):
+    if not os.path.exists(path):
+        ewriteln("`%s` not found!\n" % path)
+        return 1
+
+    if command in ["-s", "--snapshot"]:
+        if not os.path.exists(second_path):
+            ewriteln("`%s` not found!\n" % second_path)
+            return 1
+
+        return run_script(second_path, snapshot_path=path)
+    elif command in ["-w", "--write-snapshot"]:
+        return write_snapshot(path, second_path)
 
     ewriteln("Unknown command `%s`!" % command)
     return 1
@@ -190,6 +276,9 @@ def parse_args(argv):
     elif len(argv) == 3:
         return parse_arg_with_file_param(argv[1], argv[2])
 
+    elif len(argv) == 4:
+        return parse_arg_with_two_file_params(argv[1], argv[2], argv[3])
+
     else:
         ewriteln("Unknown arguments `%s`!" % str(argv[1:]))
         return 1
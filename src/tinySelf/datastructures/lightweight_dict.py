@@ -44,10 +44,10 @@ class LightWeightDictList(object):
 
     def has_key(self, key):
         if self._use_properties:
-            return key == self._first_key or key == self._second_key or key == self._third_key
+            return key is self._first_key or key is self._second_key or key is self._third_key
         elif self._use_small_array:
             for kv in self._small_array:
-                if kv.key == key:
+                if kv.key is key:
                     return True
             return False
         else:
@@ -58,13 +58,13 @@ class LightWeightDictList(object):
 
     def set(self, key, val):
         if self._use_properties:
-            if self._first_key is None or self._first_key == key:
+            if self._first_key is None or self._first_key is key:
                 self._first_key = key
                 self._first_value = Container(val)
-            elif self._second_key is None or self._second_key == key:
+            elif self._second_key is None or self._second_key is key:
                 self._second_key = key
                 self._second_value = Container(val)
-            elif self._third_key is None or self._third_key == key:
+            elif self._third_key is None or self._third_key is key:
                 self._third_key = key
                 self._third_value = Container(val)
             else:
@@ -101,7 +101,7 @@ class LightWeightDictList(object):
                 return self.set(key, val)
 
             for kv in self._small_array:
-                if kv.key == key:
+                if kv.key is key:
                     kv.val = val
                     return
 
@@ -115,17 +115,17 @@ class LightWeightDictList(object):
 
     def get(self, key, alt=None):
         if self._use_properties:
-            if self._first_key == key:
+            if self._first_key is key:
                 return self._first_value.val
-            elif self._second_key == key:
+            elif self._second_key is key:
                 return self._second_value.val
-            elif self._third_key == key:
+            elif self._third_key is key:
                 return self._third_value.val
             else:
                 return alt
         elif self._use_small_array:
             for kv in self._small_array:
-                if kv.key == key:
+                if kv.key is key:
                     return kv.val
 
             return alt
@@ -134,17 +134,17 @@ class LightWeightDictList(object):
 
     def __getitem__(self, key):
         if self._use_properties:
-            if self._first_key == key:
+            if self._first_key is key:
                 return self._first_value.val
-            elif self._second_key == key:
+            elif self._second_key is key:
                 return self._second_value.val
-            elif self._third_key == key:
+            elif self._third_key is key:
                 return self._third_value.val
             else:
                 raise KeyError("`%s` not found." % key)
         elif self._use_small_array:
             for kv in self._small_array:
-                if kv.key == key:
+                if kv.key is key:
                     return kv.val
 
             raise KeyError("`%s` not found." % key)
@@ -153,7 +153,7 @@ class LightWeightDictList(object):
 
     def delete(self, key):
         if self._use_properties:
-            if self._first_key == key:
+            if self._first_key is key:
                 self._first_key = self._second_key
                 self._second_key = self._third_key
                 self._third_key = None
@@ -161,18 +161,18 @@ class LightWeightDictList(object):
                 self._first_value = self._second_value
                 self._second_value = self._third_value
                 self._third_value = None
-            elif self._second_key == key:
+            elif self._second_key is key:
                 self._second_key = self._third_key
                 self._third_key = None
 
                 self._second_value = self._third_value
                 self._third_value = None
-            elif self._third_key == key:
+            elif self._third_key is key:
                 self._third_key = None
                 self._third_value = None
         elif self._use_small_array:
             for cnt, kv in enumerate(self._small_array):
-                if kv.key == key:
+                if kv.key is key:
                     self._small_array.pop(cnt)
                     return
         else:
@@ -313,6 +313,8 @@ class LightWeightDictList(object):
 class LightWeightDict(object):
     """
     Implementation with statically allocated array.
+
+    Keys are compared by identity, so they have to be interned.
     """
     def __init__(self):
         self._first_key = None
@@ -334,10 +336,10 @@ class LightWeightDict(object):
 
     def has_key(self, key):
         if self._use_properties:
-            return key == self._first_key or key == self._second_key or key == self._third_key
+            return key is self._first_key or key is self._second_key or key is self._third_key
         elif self._use_small_array:
             for i in xrange(self._small_array_len):
-                if self._small_array[i].key == key:
+                if self._small_array[i].key is key:
                     return True
             return False
         else:
@@ -348,13 +350,13 @@ class LightWeightDict(object):
 
     def set(self, key, val):
         if self._use_properties:
-            if self._first_key is None or self._first_key == key:
+            if self._first_key is None or self._first_key is key:
                 self._first_key = key
                 self._first_value = Container(val)
-            elif self._second_key is None or self._second_key == key:
+            elif self._second_key is None or self._second_key is key:
                 self._second_key = key
                 self._second_value = Container(val)
-            elif self._third_key is None or self._third_key == key:
+            elif self._third_key is None or self._third_key is key:
                 self._third_key = key
                 self._third_value = Container(val)
             else:
@@ -395,7 +397,7 @@ class LightWeightDict(object):
 
             for i in xrange(self._small_array_len):
                 kv = self._small_array[i]
-                if kv.key == key:
+                if kv.key is key:
                     kv.val = val
                     return
 
@@ -410,18 +412,18 @@ class LightWeightDict(object):
 
     def get(self, key, alt=None):
         if self._use_properties:
-            if self._first_key == key:
+            if self._first_key is key:
                 return self._first_value.val
-            elif self._second_key == key:
+            elif self._second_key is key:
                 return self._second_value.val
-            elif self._third_key == key:
+            elif self._third_key is key:
                 return self._third_value.val
             else:
                 return alt
         elif self._use_small_array:
             for i in xrange(self._small_array_len):
                 kv = self._small_array[i]
-                if kv.key == key:
+                if kv.key is key:
                     return kv.val
 
             return alt
@@ -430,18 +432,18 @@ class LightWeightDict(object):
 
     def __getitem__(self, key):
         if self._use_properties:
-            if self._first_key == key:
+            if self._first_key is key:
                 return self._first_value.val
-            elif self._second_key == key:
+            elif self._second_key is key:
                 return self._second_value.val
-            elif self._third_key == key:
+            elif self._third_key is key:
                 return self._third_value.val
             else:
                 raise KeyError("`%s` not found." % key)
         elif self._use_small_array:
             for i in xrange(self._small_array_len):
                 kv = self._small_array[i]
-                if kv.key == key:
+                if kv.key is key:
                     return kv.val
 
             raise KeyError("`%s` not found." % key)
@@ -450,7 +452,7 @@ class LightWeightDict(object):
 
     def delete(self, key):
         if self._use_properties:
-            if self._first_key == key:
+            if self._first_key is key:
                 self._first_key = self._second_key
                 self._second_key = self._third_key
                 self._third_key = None
@@ -458,13 +460,13 @@ class LightWeightDict(object):
                 self._first_value = self._second_value
                 self._second_value = self._third_value
                 self._third_value = None
-            elif self._second_key == key:
+            elif self._second_key is key:
                 self._second_key = self._third_key
                 self._third_key = None
 
                 self._second_value = self._third_value
                 self._third_value = None
-            elif self._third_key == key:
+            elif self._third_key is key:
                 self._third_key = None
                 self._third_value = None
 
@@ -472,7 +474,7 @@ class LightWeightDict(object):
             for i in xrange(self._small_array_len):
                 kv = self._small_array[i]
 
-                if kv.key == key:
+                if kv.key is key:
                     j = i
                     while j < self._small_array_len:
                         self._small_array[j] = self._small_array[j + 1]
@@ -550,9 +552,15 @@ class LightWeightDict(object):
             lwd._third_key = self._third_key
             lwd._third_value = self._third_value
         elif self._use_small_array:
-            lwd._small_array = self._small_array
+            # pairs are changed in place by .set(), so they can't be shared
+            lwd._small_array = [None for _ in xrange(self._max_array_items)]
+            for i in xrange(self._small_array_len):
+                kv = self._small_array[i]
+                lwd._small_array[i] = KeyValPair(kv.key, kv.val)
         else:
-            lwd._dict = self._dict
+            lwd._dict = OrderedDict()
+            for k, v in self._dict.iteritems():
+                lwd._dict[k] = v
 
         lwd._use_properties = self._use_properties
         lwd._use_small_array = self._use_small_array
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+
+class _Timer(object):
+    def __init__(self, deadline, sequence, item):
+        self.deadline = deadline
+        self.sequence = sequence
+        self.item = item
+
+    def is_before(self, other):
+        if self.deadline == other.deadline:
+            return self.sequence < other.sequence
+
+        return self.deadline < other.deadline
+
+
+class TimerHeap(object):
+    """
+    Binary min-heap of items ordered by their deadline. Items with the same
+    deadline are returned in the order in which they were pushed.
+    """
+    def __init__(self):
+        self._heap = []
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, deadline, item):
+        self._heap.append(_Timer(deadline, self._sequence, item))
+        self._sequence += 1
+        self._sift_up(len(self._heap) - 1)
+
+    def next_deadline(self):
+        if not self._heap:
+            raise IndexError()
+
+        return self._heap[0].deadline
+
+    def pop(self):
+        if not self._heap:
+            raise IndexError()
+
+        top = self._heap[0]
+        last = self._heap.pop()
+        if self._heap:
+            self._heap[0] = last
+            self._sift_down(0)
+
+        return top.item
+
+    def pop_expired(self, now):
+        """
+        Args:
+            now (float): Current time.
+
+        Returns:
+            list: Items with the deadline before or at `now`, earliest first.
+        """
+        expired = []
+        while self._heap and self._heap[0].deadline <= now:
+            expired.append(self.pop())
+
+        return expired
+
+    def _sift_up(self, index):
+        timer = self._heap[index]
+        while index > 0:
+            parent_index = (index - 1) >> 1
+            parent = self._heap[parent_index]
+            if not timer.is_before(parent):
+                break
+
+            self._heap[index] = parent
+            index = parent_index
+
+        self._heap[index] = timer
+
+    def _sift_down(self, index):
+        length = len(self._heap)
+        timer = self._heap[index]
+        while True:
+            child_index = 2 * index + 1
+            if child_index >= length:
+                break
+
+            right_index = child_index + 1
+            if right_index < length and \
+               self._heap[right_index].is_before(self._heap[child_index]):
+                child_index = right_index
+
+            child = self._heap[child_index]
+            if not child.is_before(timer):
+                break
+
+            self._heap[index] = child
+            index = child_index
+
+        self._heap[index] = timer
@@ -36,18 +36,167 @@ def _repr_dict(d):
     return "{" + ", ".join(results) + "}"
 
 
+def _contains_block(item):
+    """
+    Check whether compiled `item` creates a block in the current code context.
+
+    Code of nested objects is not checked, as it is compiled into its own
+    code context.
+    """
+    if isinstance(item, Block):
+        return True
+
+    if isinstance(item, Object):
+        for value in item.slots.values():
+            if _contains_block(value):
+                return True
+
+        for value in item.parents.values():
+            if _contains_block(value):
+                return True
+
+    elif isinstance(item, Send) or isinstance(item, Cascade):
+        if _contains_block(item.obj):
+            return True
+
+        if isinstance(item, Send):
+            return _contains_block(item.msg)
+
+        for msg in item.msgs:
+            if _contains_block(msg):
+                return True
+
+    elif isinstance(item, Resend):
+        return _contains_block(item.msg)
+
+    elif isinstance(item, KeywordMessage):
+        for parameter in item.parameters:
+            if _contains_block(parameter):
+                return True
+
+    elif isinstance(item, BinaryMessage):
+        return _contains_block(item.parameter)
+
+    elif isinstance(item, Return):
+        return _contains_block(item.value)
+
+    return False
+
+
+def _annotate_code_context(context, params, slots, code):
+    context.number_of_parameters = len(params)
+    context.number_of_locals = len(slots)
+
+    context.needs_closure = False
+    for item in code:
+        if _contains_block(item):
+            context.needs_closure = True
+            break
+
+
+def _compile_body(context, new_context, code):
+    """
+    Compile the `code` of the nested method or block into the `new_context`,
+    or only remember it for the first activation, if the `context` compiles
+    lazily.
+    """
+    new_context.compile_lazily = context.compile_lazily
+
+    if context.compile_lazily:
+        new_context.set_lazy_code(code)
+        return
+
+    for item in code:
+        item.compile(new_context)
+
+
+class SourceLines(object):
+    """
+    Source of one parse, shared by all its :class:`SourcePos`. The source is
+    split into the lines only once, when the first snippet is needed.
+    """
+    def __init__(self, source):
+        self.source = source
+        self._lines = None
+
+    def lines(self):
+        if self._lines is None:
+            self._lines = self.source.splitlines()
+
+        return self._lines
+
+
 class SourcePos(BaseBox):
-    def __init__(self, start_line, start_column, end_line, end_column, source=""):
+    def __init__(self, start_line, start_column, end_line, end_column,
+                 source_lines=None):
         self.start_line = start_line
         self.start_column = start_column
         self.end_line = end_line
         self.end_column = end_column
 
-        self.source_snippet = self._parse_source(source)
+        # positions loaded from the serialized code come without the source
+        self.source_lines = source_lines
+        self._source_snippet = None
 
-    def _parse_source(self, source):
-        source_lines = source.splitlines()
+    @property
+    def source_snippet(self):
+        if self._source_snippet is None:
+            self._source_snippet = ""
+            if self.source_lines is not None:
+                self._source_snippet = self._parse_source(
+                    self.source_lines.lines()
+                )
+
+        return self._source_snippet
+
+    @source_snippet.setter
+    def source_snippet(self, source_snippet):
+        self._source_snippet = source_snippet
+
+    def is_in(self, source_lines):
+        """
+        Check that the position points to the existing part of the
+        `source_lines`.
+        """
+        lines = source_lines.lines()
+        if self.start_line < 1 or self.end_line > len(lines) or \
+           self.start_line > self.end_line or self.start_column < 1:
+            return False
+
+        if self.start_column > len(lines[self.start_line - 1]):
+            return False
+
+        return 0 <= self.end_column <= len(lines[self.end_line - 1])
+
+    def positioned_source(self, source_lines):
+        """
+        Returns:
+            str: Source of the position, padded by the empty lines and spaces,
+                so it is parsed with the same line and column numbers.
+        """
+        lines = source_lines.lines()
+
+        start_index = self.start_column - 1
+        end_index = self.end_column
+        assert start_index >= 0
+        assert end_index >= 0
+
+        parts = ["\n" * (self.start_line - 1), " " * start_index]
+        if self.start_line == self.end_line:
+            parts.append(lines[self.start_line - 1][start_index:end_index])
+            return "".join(parts)
 
+        parts.append(lines[self.start_line - 1][start_index:])
+        for i in range(self.start_line + 1, self.end_line):
+            parts.append("\n")
+            parts.append(lines[i - 1])
+
+        parts.append("\n")
+        parts.append(lines[self.end_line - 1][:end_index])
+
+        return "".join(parts)
+
+    def _parse_source(self, source_lines):
         if self.start_line == self.end_line:
             from_index = self.start_column - 1
             to_index = self.end_column
@@ -83,6 +232,8 @@ class Root(BaseBox):
         for item in self.ast:
             item.compile(context)
 
+        _annotate_code_context(context, [], {}, self.ast)
+
         return context
 
     def __str__(self):
@@ -91,7 +242,7 @@ class Root(BaseBox):
 
 class Self(BaseBox):
     def compile(self, context):
-        context.add_bytecode(BYTECODE_PUSH_SELF)
+        context.add_bytecode(BYTECODE_PUSH_RECEIVER)
 
         return context
 
@@ -164,9 +315,9 @@ class Object(BaseBox):
         if self.code:
             new_context = CodeContext()
             obj.meta_set_code_context(new_context)
-            for item in self.code:
-                item.compile(new_context)
+            _compile_body(context, new_context, self.code)
 
+            _annotate_code_context(new_context, self.params, self.slots, self.code)
             obj.map.code_context = new_context
 
         return context
@@ -207,7 +358,7 @@ class Block(Object):
         # push current scope
         context.add_bytecode(BYTECODE_PUSH_SELF)
 
-        index = context.add_literal_obj(block)
+        index = context.add_literal_block(block)
         context.add_bytecode(BYTECODE_PUSH_LITERAL)
         context.add_bytecode(LITERAL_TYPE_BLOCK)
         context.add_bytecode(index)
@@ -222,9 +373,9 @@ class Block(Object):
 
         new_context = CodeContext()
         block.meta_set_code_context(new_context)
-        for item in self.code:
-            item.compile(new_context)
+        _compile_body(context, new_context, self.code)
 
+        _annotate_code_context(new_context, self.params, self.slots, self.code)
         block.map.code_context = new_context
 
         return context
@@ -443,13 +594,24 @@ class BinaryMessage(BaseBox):
         )
 
 
+def _compile_receiver(context, obj):
+    """
+    Messages sent to `self` are sent to the activation record, so the method
+    sees its own slots and parameters.
+    """
+    if isinstance(obj, Self):
+        context.add_bytecode(BYTECODE_PUSH_SELF)
+    else:
+        obj.compile(context)
+
+
 class Send(BaseBox):
     def __init__(self, obj, msg):
         self.obj = obj
         self.msg = msg
 
     def compile(self, context):
-        self.obj.compile(context)
+        _compile_receiver(context, self.obj)
         self.msg.compile(context)
 
         return context
@@ -514,7 +676,7 @@ class Cascade(BaseBox):
 
     def compile(self, context):
         for msg in self.msgs:
-            self.obj.compile(context)
+            _compile_receiver(context, self.obj)
             msg.compile(context)
 
         return context
@@ -8,6 +8,7 @@ from rply.token import BaseBox
 from lexer import lexer
 
 from ast_tokens import SourcePos
+from ast_tokens import SourceLines
 from ast_tokens import Root
 from ast_tokens import Comment
 
@@ -62,7 +63,7 @@ pg = ParserGenerator(
 
 class SourceHolderToGoAroundRPythonsGlobalConstants(object):
     def __init__(self):
-        self.source = ""
+        self.source_lines = None
 
 
 SOURCE_REF = SourceHolderToGoAroundRPythonsGlobalConstants()
@@ -552,7 +553,7 @@ def get_source_pos(p):
         p[0].getsourcepos().colno,
         p[-1].getsourcepos().lineno,
         p[-1].getsourcepos().colno,
-        SOURCE_REF.source
+        SOURCE_REF.source_lines
     )
 
 
@@ -791,22 +792,22 @@ parser = pg.build()
 
 
 def lex_and_parse(source):
-    SOURCE_REF.source = source
+    SOURCE_REF.source_lines = SourceLines(source)
 
     tree = parser.parse(lexer.lex(source))
     assert isinstance(tree, Root)
 
-    SOURCE_REF.source = ""
+    SOURCE_REF.source_lines = None
 
     return tree.ast
 
 
 def lex_and_parse_as_root(source):
-    SOURCE_REF.source = source
+    SOURCE_REF.source_lines = SourceLines(source)
 
     tree = parser.parse(lexer.lex(source))
     assert isinstance(tree, Root)
 
-    SOURCE_REF.source = ""
+    SOURCE_REF.source_lines = None
 
     return tree
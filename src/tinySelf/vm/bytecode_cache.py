@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the compiled scripts.
+
+Compiled code of the `script.tself` is stored in the
+`__tselfcache__/script.tselfc` next to it. The cache file starts with the
+header made of the source path, its mtime, the MD5 of the source and the MD5
+of the rest of the file, followed by the serialized code context. The cache
+is used only when all of them match, otherwise the source is compiled and
+the cache rewritten.
+
+Method and block bodies, which were not run before the cache was written,
+are stored without the bytecodes and compiled from the source on their first
+activation, same as the bodies of the freshly compiled source.
+"""
+import os
+
+from rpython.rlib.rmd5 import RMD5
+
+from tinySelf.parser import lex_and_parse_as_root
+from tinySelf.parser.ast_tokens import SourceLines
+from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.code_serialization import Reader
+from tinySelf.vm.code_serialization import Writer
+from tinySelf.vm.code_serialization import SerializationError
+from tinySelf.vm.code_serialization import read_code_context
+from tinySelf.vm.code_serialization import write_code_context
+
+
+CACHE_MAGIC = "tinySelf bytecode v4\n"
+CACHE_DIRECTORY = "__tselfcache__"
+CACHE_SUFFIX = "c"
+
+
+def _cache_directory(path):
+    index = path.rfind("/") + 1
+    assert index >= 0
+
+    return path[:index] + CACHE_DIRECTORY
+
+
+def cache_path(path):
+    index = path.rfind("/") + 1
+    assert index >= 0
+
+    return _cache_directory(path) + "/" + path[index:] + CACHE_SUFFIX
+
+
+def source_hash(source):
+    return RMD5(source).hexdigest()
+
+
+def _payload_hash(payload):
+    return RMD5(payload).hexdigest()
+
+
+def _source_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return -1.0
+
+
+def compile_source(source):
+    """
+    Args:
+        source (str): tinySelf source code.
+
+    Returns:
+        obj: Finalized :class:`CodeContext` of the whole source.
+    """
+    ast_root = lex_and_parse_as_root(source)
+    code = ast_root.compile(CodeContext())
+
+    return code.finalize()
+
+
+def _write_cache(path, mtime, source, code):
+    writer = Writer()
+    writer.write_str(CACHE_MAGIC)
+    writer.write_str(path)
+    writer.write_float(mtime)
+    writer.write_str(source_hash(source))
+
+    code_writer = Writer()
+    write_code_context(code_writer, code)
+    payload = code_writer.getvalue()
+
+    writer.write_str(_payload_hash(payload))
+    writer.write_str(payload)
+
+    # write the cache atomically, so the readers never see half of it
+    tmp_path = cache_path(path) + ".tmp"
+    try:
+        cache_directory = _cache_directory(path)
+        if not os.path.isdir(cache_directory):
+            os.mkdir(cache_directory, 0755)
+
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+        try:
+            data = writer.getvalue()
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+        finally:
+            os.close(fd)
+
+        os.rename(tmp_path, cache_path(path))
+    except OSError:
+        # cache is only an optimization, read-only directories are fine
+        pass
+
+
+def _read_file(path):
+    try:
+        fd = os.open(path, os.O_RDONLY, 0)
+    except OSError:
+        return ""
+
+    chunks = []
+    try:
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+
+            chunks.append(chunk)
+    except OSError:
+        chunks = []
+    finally:
+        os.close(fd)
+
+    return "".join(chunks)
+
+
+def _read_cache(path, mtime, source):
+    data = _read_file(cache_path(path))
+    if not data:
+        return None
+
+    try:
+        reader = Reader(data)
+        if reader.read_str() != CACHE_MAGIC or \
+           reader.read_str() != path or \
+           reader.read_float() != mtime or \
+           reader.read_str() != source_hash(source):
+            return None
+
+        # corrupted caches are compiled again, not run
+        payload_hash = reader.read_str()
+        payload = reader.read_str()
+        if _payload_hash(payload) != payload_hash:
+            return None
+
+        # bodies which were not compiled are parsed from the source again
+        code_reader = Reader(payload, source_lines=SourceLines(source))
+        code = read_code_context(code_reader)
+        if not code_reader.at_end() or not reader.at_end():
+            return None
+
+        return code
+    except SerializationError:
+        return None
+
+
+def load_code(source, path=""):
+    """
+    Compile the `source` of the script at `path`, or load its code from the
+    cache, if the cache is up to date.
+
+    Args:
+        source (str): Content of the file at `path`.
+        path (str, default ""): Path of the script. Source without the path
+            is always compiled and not cached.
+
+    Returns:
+        obj: Finalized :class:`CodeContext`.
+    """
+    if not path:
+        return compile_source(source)
+
+    mtime = _source_mtime(path)
+    if mtime >= 0:
+        code = _read_cache(path, mtime, source)
+        if code is not None:
+            return code
+
+    code = compile_source(source)
+    if mtime >= 0:
+        _write_cache(path, mtime, source, code)
+
+    return code
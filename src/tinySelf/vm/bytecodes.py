@@ -1,13 +1,38 @@
 # -*- coding: utf-8 -*-
 
 BYTECODE_SEND = 0
-# BYTECODE_SELF_SEND = 1
+BYTECODE_SELF_SEND = 1
 BYTECODE_PUSH_SELF = 2
 BYTECODE_PUSH_LITERAL = 3
 BYTECODE_RETURN_TOP = 4
 BYTECODE_RETURN_IMPLICIT = 5
 BYTECODE_ADD_SLOT = 6
 
+# Quickened sends; the interpreter rewrites binary BYTECODE_SEND to these in
+# CodeContext.opcodes, they never appear in the encoded bytecodes.
+BYTECODE_QUICK_ADD = 7
+BYTECODE_QUICK_SUBSTRACT = 8
+BYTECODE_QUICK_MULTIPLY = 9
+BYTECODE_QUICK_LT = 10
+BYTECODE_QUICK_LTE = 11
+BYTECODE_QUICK_GT = 12
+BYTECODE_QUICK_GTE = 13
+BYTECODE_QUICK_COMPARE = 14
+
+# Superinstructions; CodeContext.finalize() fuses common sequences into them,
+# again only in CodeContext.opcodes. The fused instruction is stored at the
+# index of the first instruction of the sequence:
+#
+#   SELF_SEND:          PUSH_SELF, PUSH_LITERAL STR, unary SEND
+#   SEND_LITERAL:       PUSH_LITERAL STR, SEND
+#   ADD_LITERAL_SLOT:   PUSH_LITERAL STR, PUSH_LITERAL (not BLOCK), ADD_SLOT
+BYTECODE_SEND_LITERAL = 15
+BYTECODE_ADD_LITERAL_SLOT = 16
+
+# Explicit `self`; pushes the receiver, while PUSH_SELF pushes the activation
+# record used as the receiver of the implicit sends.
+BYTECODE_PUSH_RECEIVER = 17
+
 LITERAL_TYPE_NIL = 0
 LITERAL_TYPE_INT = 1
 LITERAL_TYPE_STR = 2
@@ -25,6 +50,59 @@ SEND_TYPE_KEYWORD_RESEND = 4
 SLOT_NORMAL = 0
 SLOT_PARENT = 1
 
+# Encoding of the instructions in the `bytecodes` string:
+#
+#   SEND:          opcode, send_type (1 byte), number_of_params (2 bytes)
+#   PUSH_LITERAL:  opcode, literal_type (1 byte), literal_index (2 bytes)
+#   ADD_SLOT:      opcode, slot_type (1 byte)
+#   everything else is just the opcode
+#
+# Wide operands are big endian.
+MAX_OPERAND = 0xFF
+MAX_WIDE_OPERAND = 0xFFFF
+
+
+def number_of_operands(bytecode):
+    if bytecode == BYTECODE_SEND or bytecode == BYTECODE_PUSH_LITERAL:
+        return 2
+    elif bytecode == BYTECODE_ADD_SLOT:
+        return 1
+
+    return 0
+
+
+def stack_effect(bytecode, operand_a, operand_b):
+    """
+    Compute how many items `bytecode` adds to (or removes from) the stack.
+
+    Result of the send is always counted, even though primitives may not push
+    anything.
+
+    Returns:
+        int: Difference of the stack depth.
+    """
+    if bytecode == BYTECODE_SEND:
+        # name of the message, parameters and receiver, then the result
+        popped = 1 + operand_b + 1
+        if operand_a == SEND_TYPE_UNARY_RESEND or operand_a == SEND_TYPE_KEYWORD_RESEND:
+            popped += 1
+
+        return 1 - popped
+
+    elif bytecode == BYTECODE_PUSH_LITERAL:
+        if operand_a == LITERAL_TYPE_BLOCK:
+            return 0  # scope parent is replaced by the block
+
+        return 1
+
+    elif bytecode == BYTECODE_PUSH_SELF or bytecode == BYTECODE_PUSH_RECEIVER:
+        return 1
+
+    elif bytecode == BYTECODE_ADD_SLOT:
+        return -2  # receiver stays on the stack
+
+    return 0
+
 
 def disassemble(bytecodes, tokens=None):
     disassembled = []
@@ -61,6 +139,12 @@ def disassemble(bytecodes, tokens=None):
                 "PUSH_SELF"
             ])
 
+        elif bytecode == BYTECODE_PUSH_RECEIVER:
+            disassembled.append([
+                index,
+                "PUSH_RECEIVER"
+            ])
+
         elif bytecode == BYTECODE_PUSH_LITERAL:
             literal_type = token[2]
             literal_index = token[3]
@@ -117,46 +201,92 @@ def disassemble(bytecodes, tokens=None):
 
 
 def bytecode_tokenizer(bytecodes):
-    bytecodes = [ord(c) for c in bytecodes]
-    bytecodes_len = len(bytecodes)
-    while bytecodes:
-        index = _compute_index(bytecodes_len, bytecodes)
-        bytecode = bytecodes.pop(0)
+    """
+    Decode `bytecodes` string into list of instructions.
 
-        if bytecode == BYTECODE_SEND:
-            send_type = bytecodes.pop(0)
-            number_of_params = bytecodes.pop(0)
+    Args:
+        bytecodes (str): Encoded bytecodes, see the description of the
+            encoding at the top of this file.
 
-            yield [index, bytecode, send_type, number_of_params]
+    Returns:
+        list: List of ``[instruction_index, bytecode, operands..]`` lists.
+    """
+    tokens = []
 
-        elif bytecode == BYTECODE_PUSH_LITERAL:
-            literal_type = bytecodes.pop(0)
-            literal_index = bytecodes.pop(0)
+    index = 0
+    while index < len(bytecodes):
+        bytecode = ord(bytecodes[index])
+        index += 1
 
-            yield [index, bytecode, literal_type, literal_index]
+        if bytecode == BYTECODE_SEND or bytecode == BYTECODE_PUSH_LITERAL:
+            operand_type = ord(bytecodes[index])
+            wide_operand = (ord(bytecodes[index + 1]) << 8) | ord(bytecodes[index + 2])
+            index += 3
 
-        elif (bytecode == BYTECODE_RETURN_TOP or
-              bytecode == BYTECODE_RETURN_IMPLICIT or
-              bytecode == BYTECODE_PUSH_SELF):
-            yield [index, bytecode]
+            tokens.append([len(tokens), bytecode, operand_type, wide_operand])
 
         elif bytecode == BYTECODE_ADD_SLOT:
-            slot_type = bytecodes.pop(0)
+            slot_type = ord(bytecodes[index])
+            index += 1
 
-            yield [index, bytecode, slot_type]
+            tokens.append([len(tokens), bytecode, slot_type])
 
         else:
-            yield [index, bytecode]
+            tokens.append([len(tokens), bytecode])
+
+    return tokens
+
+
+def instruction_tokenizer(bytecodes):
+    """
+    Split list of not yet encoded bytecodes (as emitted by the compiler) into
+    instructions.
+
+    Args:
+        bytecodes (list): List of integers, opcodes followed by operands.
+
+    Returns:
+        list: List of ``[instruction_index, bytecode, operands..]`` lists.
+    """
+    tokens = []
+
+    index = 0
+    while index < len(bytecodes):
+        bytecode = bytecodes[index]
+        operands_end = index + 1 + number_of_operands(bytecode)
+        if operands_end > len(bytecodes):
+            raise ValueError("Missing operands for bytecode %d!" % bytecode)
 
+        tokens.append([len(tokens), bytecode] + bytecodes[index + 1:operands_end])
+        index = operands_end
 
-def _compute_index(bytecodes_len, bytecodes):
-    return bytecodes_len - len(bytecodes)
+    return tokens
+
+
+def _encode_operand(operand):
+    if operand < 0 or operand > MAX_OPERAND:
+        raise ValueError("Operand %d doesn't fit into one byte!" % operand)
+
+    return chr(operand)
+
+
+def _encode_wide_operand(operand):
+    if operand < 0 or operand > MAX_WIDE_OPERAND:
+        raise ValueError("Operand %d doesn't fit into two bytes!" % operand)
+
+    return chr(operand >> 8) + chr(operand & 0xFF)
 
 
 def bytecode_detokenizer(tokens):
     bytecodes = []
     for token in tokens:
-        token = token[1:]
-        bytecodes.extend(token)
+        bytecode = token[1]
+        bytecodes.append(chr(bytecode))
+
+        if bytecode == BYTECODE_SEND or bytecode == BYTECODE_PUSH_LITERAL:
+            bytecodes.append(_encode_operand(token[2]))
+            bytecodes.append(_encode_wide_operand(token[3]))
+        elif bytecode == BYTECODE_ADD_SLOT:
+            bytecodes.append(_encode_operand(token[2]))
 
-    return str("".join([chr(x) for x in bytecodes]))
+    return str("".join(bytecodes))
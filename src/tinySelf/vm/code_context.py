@@ -4,6 +4,10 @@ from rply.token import BaseBox
 from tinySelf.datastructures.lightweight_dict import LightWeightDictObjects
 from tinySelf.vm.bytecodes import *
 from tinySelf.vm.object_layout import Object
+from tinySelf.vm.symbols import intern_symbol
+
+
+MAX_POLYMORPHIC_CACHE_SIZE = 4
 
 
 class LiteralBox(BaseBox):
@@ -11,35 +15,66 @@ class LiteralBox(BaseBox):
         pass
 
 
-class IntBox(LiteralBox):
+class _ImmutableLiteralBox(LiteralBox):
+    """
+    Box for literals with immutable value. The runtime object is created only
+    once in .finalize() and then shared by all pushes of the literal.
+    """
+    def __init__(self):
+        self.obj = None
+
+    def _create_obj(self):
+        return None
+
+    def finalize(self):
+        if self.obj is None:
+            self.obj = self._create_obj()
+
+
+class IntBox(_ImmutableLiteralBox):
     def __init__(self, value):
         assert isinstance(value, int)
 
+        _ImmutableLiteralBox.__init__(self)
         self.value = value
         self.literal_type = LITERAL_TYPE_INT
 
+    def _create_obj(self):
+        from tinySelf.vm.primitives import get_primitive_int
+        return get_primitive_int(self.value)
+
     def __str__(self):
         return str(self.value)
 
 
-class FloatBox(LiteralBox):
+class FloatBox(_ImmutableLiteralBox):
     def __init__(self, value):
         assert isinstance(value, float)
 
+        _ImmutableLiteralBox.__init__(self)
         self.value = value
         self.literal_type = LITERAL_TYPE_FLOAT
 
+    def _create_obj(self):
+        from tinySelf.vm.primitives import PrimitiveFloatObject
+        return PrimitiveFloatObject(self.value)
+
     def __str__(self):
         return str(self.value)
 
 
-class StrBox(LiteralBox):
+class StrBox(_ImmutableLiteralBox):
     def __init__(self, value):
         assert isinstance(value, str)
 
+        _ImmutableLiteralBox.__init__(self)
         self.value = value
         self.literal_type = LITERAL_TYPE_STR
 
+    def _create_obj(self):
+        from tinySelf.vm.primitives import PrimitiveStrObject
+        return PrimitiveStrObject(self.value)
+
     def __str__(self):
         return self.value
 
@@ -52,7 +87,9 @@ class ObjBox(LiteralBox):
         self.literal_type = LITERAL_TYPE_OBJ
 
     def finalize(self):
-        if self.value and self.value.code_context:
+        # lazily compiled code is finalized by its first activation
+        if self.value and self.value.code_context and \
+           self.value.code_context.is_compiled():
             self.value.code_context.finalize()
 
     def __str__(self):
@@ -62,6 +99,135 @@ class ObjBox(LiteralBox):
         return "No obj representation"
 
 
+class BlockBox(ObjBox):
+    """
+    Box for the prototype of the block literal. Prototype is turned into the
+    block object in .finalize(), so each push of the literal is only a clone.
+    """
+    def __init__(self, obj):
+        ObjBox.__init__(self, obj)
+        self.literal_type = LITERAL_TYPE_BLOCK
+        self._block_trait_added = False
+
+    def finalize(self):
+        ObjBox.finalize(self)
+
+        if not self._block_trait_added:
+            from tinySelf.vm.primitives import add_block_trait
+            add_block_trait(self.value)
+            self._block_trait_added = True
+
+
+# where the send site found the slot
+INLINE_CACHE_OWN_SLOT = 0
+INLINE_CACHE_SCOPE_PARENT_SLOT = 1
+INLINE_CACHE_PARENT_SLOT = 2
+
+
+class InlineCacheEntry(object):
+    def __init__(self, obj_map, slot_index, kind=INLINE_CACHE_OWN_SLOT,
+                 scope_map=None, parent_lookup=None):
+        self.map = obj_map
+        self.version = obj_map._version
+        self.slot_index = slot_index
+        self.kind = kind
+
+        self.scope_map = scope_map
+        self.scope_version = 0
+        if scope_map is not None:
+            self.scope_version = scope_map._version
+
+        # LookupCacheEntry; invalidated through the dependent lookups of all
+        # maps visited by the parent lookup
+        self.parent_lookup = parent_lookup
+
+    def lookup(self, obj, scope_parent):
+        obj_map = obj.map
+        if self.map is not obj_map or self.version != obj_map._version:
+            return None
+
+        if self.kind == INLINE_CACHE_OWN_SLOT:
+            return obj._slot_values[self.slot_index]
+
+        elif self.kind == INLINE_CACHE_SCOPE_PARENT_SLOT:
+            if scope_parent is None or scope_parent.map is not self.scope_map or \
+               self.scope_map._version != self.scope_version:
+                return None
+
+            return scope_parent._slot_values[self.slot_index]
+
+        parent_lookup = self.parent_lookup
+        if not parent_lookup.matches(obj, parent_lookup.symbol):
+            return None
+
+        return parent_lookup.holder._slot_values[parent_lookup.slot_index]
+
+
+class InlineCache(object):
+    """
+    Cache of the send site. Remembers where the slot was found for the map of
+    the receiver, so repeated sends to objects with the same map don't have
+    to do the lookup at all. The slot may be found in the receiver, in its
+    scope parent, or through the parents.
+
+    Index of the slot is stored instead of the slot itself, because assignment
+    changes values of the slots without changing the map.
+
+    Cache is monomorphic at the beginning, polymorphic up to the
+    `MAX_POLYMORPHIC_CACHE_SIZE` and megamorphic after that, which turns it
+    off for the send site.
+    """
+    def __init__(self):
+        self.entries = []
+        self.is_megamorphic = False
+
+        # set when the quickened opcode of the site failed its guard
+        self.deoptimized = False
+
+    def lookup(self, obj, scope_parent=None):
+        """
+        `scope_parent` replaces the scope parent of `obj`, if given.
+        """
+        if scope_parent is None:
+            scope_parent = obj._scope_parent
+
+        for entry in self.entries:
+            slot = entry.lookup(obj, scope_parent)
+            if slot is not None:
+                return slot
+
+        return None
+
+    def store(self, obj_map, slot_index):
+        self._add(InlineCacheEntry(obj_map, slot_index))
+
+    def store_scope_parent(self, obj_map, scope_map, slot_index):
+        self._add(InlineCacheEntry(obj_map, slot_index,
+                                   kind=INLINE_CACHE_SCOPE_PARENT_SLOT,
+                                   scope_map=scope_map))
+
+    def store_parent(self, obj_map, parent_lookup):
+        self._add(InlineCacheEntry(obj_map, parent_lookup.slot_index,
+                                   kind=INLINE_CACHE_PARENT_SLOT,
+                                   parent_lookup=parent_lookup))
+
+    def _add(self, new_entry):
+        if self.is_megamorphic:
+            return
+
+        for index, entry in enumerate(self.entries):
+            if entry.map is new_entry.map:
+                self.entries[index] = new_entry
+                return
+
+        if len(self.entries) >= MAX_POLYMORPHIC_CACHE_SIZE:
+            self.is_megamorphic = True
+            self.entries = []
+            return
+
+        self.entries.append(new_entry)
+
+
 class CodeContext(object):
     def __init__(self):
         self._finalized = False
@@ -69,14 +235,102 @@ class CodeContext(object):
         self.bytecodes = ""
         self._mutable_bytecodes = []
 
+        # pre-decoded instructions, indexed by the instruction index
+        self.opcodes = []
+        self.operands_a = []
+        self.operands_b = []
+        self.inline_caches = []
+        self.symbols = []  # interned message names of the sends
+
+        # frame metadata, set by the compiler
+        self.max_stack_depth = 0
+        self.number_of_parameters = 0
+        self.number_of_locals = 0
+        self.needs_closure = True
+
         self.str_literal_cache = {}
 
         self.literals = []
-        self._params_cache = None  # used to cache intermediate parameters obj
+        self._params_map = None  # shared map of the intermediate parameters objs
+
+        # shared map of the block activations, built for the map of the block
+        self._locals_map = None
+        self._locals_indexes = None
+        self._locals_source_map = None
+        self._locals_source_version = 0
 
         self.recompile = False
         self.is_recompiled = False
 
+        # nested method and block bodies are compiled on their first
+        # activation, unless this is turned off
+        self.compile_lazily = True
+        self._lazy_code = None
+        self._lazy_source_lines = None
+        self._lazy_source_pos = None
+
+    def set_lazy_code(self, code):
+        """
+        Remember the AST of the body, which is compiled into this context by
+        the .finalize().
+
+        Args:
+            code (list): AST nodes of the body.
+        """
+        self._lazy_code = code
+
+    def set_lazy_source(self, source_lines, source_pos):
+        """
+        Remember where the object or block with the body is in the source.
+        The .finalize() parses it again and compiles the body. Used by the
+        code loaded from the cache, which doesn't have the AST.
+
+        Args:
+            source_lines (obj): :class:`SourceLines` of the whole source.
+            source_pos (obj): :class:`SourcePos` of the object or block.
+        """
+        self._lazy_source_lines = source_lines
+        self._lazy_source_pos = source_pos
+
+    def is_compiled(self):
+        return self._lazy_code is None and self._lazy_source_pos is None
+
+    def _parse_lazy_source(self):
+        from tinySelf.parser import lex_and_parse
+        from tinySelf.parser.ast_tokens import Object as ObjectAST
+
+        source = self._lazy_source_pos.positioned_source(self._lazy_source_lines)
+        self._lazy_source_lines = None
+        self._lazy_source_pos = None
+
+        tree = lex_and_parse(source)
+        assert len(tree) == 1
+        obj = tree[0]
+        assert isinstance(obj, ObjectAST)
+
+        return obj.code
+
+    def compile_eagerly(self):
+        """
+        Compile and finalize the body and all lazily compiled bodies of the
+        nested objects and blocks.
+
+        Returns:
+            bool: True if any body had to be compiled.
+        """
+        compiled = not self.is_compiled()
+        self.finalize()
+
+        for literal in self.literals:
+            if not isinstance(literal, ObjBox):
+                continue
+
+            code_context = literal.value.code_context
+            if code_context is not None and code_context.compile_eagerly():
+                compiled = True
+
+        return compiled
+
     def add_literal(self, literal):
         assert isinstance(literal, LiteralBox)
 
@@ -102,6 +356,9 @@ class CodeContext(object):
     def add_literal_obj(self, literal):
         return self.add_literal(ObjBox(literal))
 
+    def add_literal_block(self, literal):
+        return self.add_literal(BlockBox(literal))
+
     def add_bytecode(self, bytecode):
         self._mutable_bytecodes.append(bytecode)
 
@@ -120,18 +377,40 @@ class CodeContext(object):
         if self._finalized:
             return self
 
+        if self._lazy_source_pos is not None:
+            self._lazy_code = self._parse_lazy_source()
+
+        if self._lazy_code is not None:
+            code = self._lazy_code
+            self._lazy_code = None
+            for item in code:
+                item.compile(self)
+
         if self._mutable_bytecodes:
-            # 4x as 3 is maximum length of multi-bytecode instructions
-            self._mutable_bytecodes.append(BYTECODE_RETURN_TOP)
-            self._mutable_bytecodes.append(BYTECODE_RETURN_TOP)
-            self._mutable_bytecodes.append(BYTECODE_RETURN_TOP)
+            # so there is always next instruction to look at (used for TCO)
             self._mutable_bytecodes.append(BYTECODE_RETURN_TOP)
 
+        tokens = instruction_tokenizer(self._mutable_bytecodes)
+
         # I would use bytearray(), but it behaves differently under rpython
-        self.bytecodes = str("".join([chr(x) for x in self._mutable_bytecodes]))
+        self.bytecodes = bytecode_detokenizer(tokens)
         self._mutable_bytecodes = None
         self.str_literal_cache = None
 
+        self.opcodes = [token[1] for token in tokens]
+        self.operands_a = [token[2] if len(token) > 2 else 0 for token in tokens]
+        self.operands_b = [token[3] if len(token) > 3 else 0 for token in tokens]
+
+        self.max_stack_depth = self._compute_max_stack_depth()
+        self._fuse_superinstructions()
+
+        self.inline_caches = [None for _ in xrange(len(tokens))]
+        self.symbols = [None for _ in xrange(len(tokens))]
+        for token in tokens:
+            if token[1] == BYTECODE_SEND:
+                self.inline_caches[token[0]] = InlineCache()
+                self.symbols[token[0]] = self._message_symbol(tokens, token[0])
+
         for item in self.literals:
             item.finalize()
 
@@ -139,6 +418,58 @@ class CodeContext(object):
 
         return self
 
+    def _message_symbol(self, tokens, send_index):
+        # name of the message is always pushed right before the send
+        name_index = send_index - 1
+        assert name_index >= 0
+        name_token = tokens[name_index]
+        assert name_token[1] == BYTECODE_PUSH_LITERAL
+        assert name_token[2] == LITERAL_TYPE_STR
+
+        boxed_name = self.literals[name_token[3]]
+        assert isinstance(boxed_name, StrBox)
+
+        return intern_symbol(boxed_name.value)
+
+    def _compute_max_stack_depth(self):
+        depth = 0
+        max_depth = 0
+        for i in xrange(len(self.opcodes)):
+            depth += stack_effect(self.opcodes[i], self.operands_a[i],
+                                  self.operands_b[i])
+            max_depth = max(max_depth, depth)
+
+        return max_depth
+
+    def _fuse_superinstructions(self):
+        """
+        Peephole pass replacing common sequences of instructions in the
+        .opcodes with superinstructions. The rest of the sequence stays in
+        place, so the indexes of the instructions don't change.
+        """
+        opcodes = self.opcodes
+        length = len(opcodes)
+
+        for i in xrange(length - 1):
+            if opcodes[i] != BYTECODE_PUSH_LITERAL or \
+               self.operands_a[i] != LITERAL_TYPE_STR:
+                continue
+
+            if opcodes[i + 1] == BYTECODE_SEND:
+                opcodes[i] = BYTECODE_SEND_LITERAL
+
+            elif i + 2 < length and \
+                 opcodes[i + 1] == BYTECODE_PUSH_LITERAL and \
+                 self.operands_a[i + 1] != LITERAL_TYPE_BLOCK and \
+                 opcodes[i + 2] == BYTECODE_ADD_SLOT:
+                opcodes[i] = BYTECODE_ADD_LITERAL_SLOT
+
+        for i in xrange(length - 2):
+            if opcodes[i] == BYTECODE_PUSH_SELF and \
+               opcodes[i + 1] == BYTECODE_SEND_LITERAL and \
+               self.operands_a[i + 2] == SEND_TYPE_UNARY:
+                opcodes[i] = BYTECODE_SELF_SEND
+
     def debug_repr(self):
         out = '(|\n  literals = (| l <- dict clone. |\n    l\n'
         for cnt, i in enumerate(self.literals):
@@ -171,13 +502,31 @@ class CodeContext(object):
 
         cc._mutable_bytecodes = self._mutable_bytecodes
 
+        cc.opcodes = self.opcodes
+        cc.operands_a = self.operands_a
+        cc.operands_b = self.operands_b
+        cc.inline_caches = self.inline_caches
+        cc.symbols = self.symbols
+        cc.max_stack_depth = self.max_stack_depth
+        cc.number_of_parameters = self.number_of_parameters
+        cc.number_of_locals = self.number_of_locals
+        cc.needs_closure = self.needs_closure
+
         cc.str_literal_cache = self.str_literal_cache
         cc.literals = self.literals
 
-        cc._params_cache = self._params_cache
-        cc._parent_cache = self._parent_cache
+        cc._params_map = self._params_map
+        cc._locals_map = self._locals_map
+        cc._locals_indexes = self._locals_indexes
+        cc._locals_source_map = self._locals_source_map
+        cc._locals_source_version = self._locals_source_version
 
         cc.recompile = self.recompile
         cc.is_recompiled = self.is_recompiled
 
+        cc.compile_lazily = self.compile_lazily
+        cc._lazy_code = self._lazy_code
+        cc._lazy_source_lines = self._lazy_source_lines
+        cc._lazy_source_pos = self._lazy_source_pos
+
         return cc
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+Binary format of the finalized code contexts.
+
+Code context is stored as its encoded bytecodes, frame metadata and
+literals. Object and block literals store their parameters, position in the
+source and the nested code context, so the whole tree of the compiled code
+can be loaded without the parser. Message names are stored as strings in the
+literals, so the symbols are interned again when the code is loaded.
+
+Bodies which were not compiled yet are stored only as their frame metadata.
+They are parsed again from their position in the source on their first
+activation, so they can be loaded only together with the source.
+"""
+from rply.token import BaseBox
+from rpython.rlib.rarithmetic import string_to_int
+from rpython.rlib.rstring import ParseStringError
+from rpython.rlib.rfloat import formatd
+from rpython.rlib.rfloat import string_to_float
+
+from tinySelf.vm.bytecodes import *
+from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.code_context import IntBox
+from tinySelf.vm.code_context import FloatBox
+from tinySelf.vm.code_context import StrBox
+from tinySelf.vm.code_context import ObjBox
+from tinySelf.vm.code_context import BlockBox
+from tinySelf.vm.object_layout import Object
+
+from tinySelf.parser.ast_tokens import SourcePos
+from tinySelf.parser.ast_tokens import SourceLines
+from tinySelf.parser.ast_tokens import Object as ObjectAST
+
+
+class SerializationError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class Writer(object):
+    def __init__(self):
+        self._parts = []
+
+    def write_uint(self, value):
+        assert 0 <= value <= 0xFFFFFFFF
+
+        self._parts.append(chr((value >> 24) & 0xFF) +
+                           chr((value >> 16) & 0xFF) +
+                           chr((value >> 8) & 0xFF) +
+                           chr(value & 0xFF))
+
+    def write_bool(self, value):
+        self._parts.append("\x01" if value else "\x00")
+
+    def write_str(self, value):
+        self.write_uint(len(value))
+        self._parts.append(value)
+
+    def write_int(self, value):
+        self.write_str(str(value))
+
+    def write_float(self, value):
+        self.write_str(formatd(value, "r", 0))
+
+    def getvalue(self):
+        return "".join(self._parts)
+
+
+class Reader(object):
+    def __init__(self, data, position=0, source_lines=None):
+        self.data = data
+        self.position = position
+
+        # SourceLines of the source, used by the not yet compiled bodies
+        self.source_lines = source_lines
+
+    def _take(self, length):
+        start = self.position
+        end = start + length
+        if length < 0 or end > len(self.data):
+            raise SerializationError("Unexpected end of the data.")
+
+        self.position = end
+        return self.data[start:end]
+
+    def read_uint(self):
+        data = self._take(4)
+
+        return (ord(data[0]) << 24) | (ord(data[1]) << 16) | \
+               (ord(data[2]) << 8) | ord(data[3])
+
+    def read_bool(self):
+        return self._take(1) != "\x00"
+
+    def read_str(self):
+        return self._take(self.read_uint())
+
+    def read_int(self):
+        try:
+            return string_to_int(self.read_str())
+        except ParseStringError:
+            raise SerializationError("Malformed int.")
+
+    def read_float(self):
+        try:
+            return string_to_float(self.read_str())
+        except ParseStringError:
+            raise SerializationError("Malformed float.")
+
+    def at_end(self):
+        return self.position >= len(self.data)
+
+
+class LoadedAST(BaseBox):
+    """
+    Stands in for the AST of the objects loaded from the serialized code. Only
+    the position in the source is kept, as that is all the VM uses.
+    """
+    def __init__(self, source_pos):
+        self.source_pos = source_pos
+
+    def __str__(self):
+        return self.source_pos.source_snippet
+
+
+def _source_pos(ast):
+    if isinstance(ast, ObjectAST) or isinstance(ast, LoadedAST):
+        return ast.source_pos
+
+    return None
+
+
+def write_ast(writer, ast):
+    """
+    Write the position in the source of the object's `ast`, as that is the
+    only part of the AST used by the VM.
+    """
+    source_pos = _source_pos(ast)
+    if source_pos is None:
+        writer.write_bool(False)
+        return
+
+    writer.write_bool(True)
+    writer.write_int(source_pos.start_line)
+    writer.write_int(source_pos.start_column)
+    writer.write_int(source_pos.end_line)
+    writer.write_int(source_pos.end_column)
+    writer.write_str(source_pos.source_snippet)
+
+
+def read_ast(reader):
+    """
+    Returns:
+        obj: :class:`LoadedAST` instance, or None if there was no position.
+    """
+    if not reader.read_bool():
+        return None
+
+    source_pos = SourcePos(
+        reader.read_int(),
+        reader.read_int(),
+        reader.read_int(),
+        reader.read_int(),
+    )
+    source_pos.source_snippet = reader.read_str()
+
+    return LoadedAST(source_pos)
+
+
+def _write_literal_obj(writer, obj):
+    parameters = obj.map.parameters
+    writer.write_uint(len(parameters))
+    for parameter in parameters:
+        writer.write_str(parameter)
+
+    write_ast(writer, obj.ast)
+
+    code_context = obj.map.code_context
+    writer.write_bool(code_context is not None)
+    if code_context is None:
+        return
+
+    # bodies without the position are compiled, as they can't be parsed again
+    is_lazy = not code_context.is_compiled() and _source_pos(obj.ast) is not None
+    writer.write_bool(is_lazy)
+    if is_lazy:
+        _write_frame_metadata(writer, code_context)
+    else:
+        write_code_context(writer, code_context)
+
+
+def _read_literal_obj(reader):
+    obj = Object()
+
+    parameters = [reader.read_str() for _ in xrange(reader.read_uint())]
+    obj.meta_set_parameters(parameters)
+
+    ast = read_ast(reader)
+    if ast is not None:
+        obj.meta_set_ast(ast)
+
+    if not reader.read_bool():
+        return obj
+
+    if not reader.read_bool():
+        obj.meta_set_code_context(read_code_context(reader))
+        return obj
+
+    if ast is None or reader.source_lines is None or \
+       not ast.source_pos.is_in(reader.source_lines):
+        raise SerializationError("Not compiled body without the source.")
+
+    code_context = CodeContext()
+    _read_frame_metadata(reader, code_context)
+    code_context.set_lazy_source(reader.source_lines, ast.source_pos)
+    obj.meta_set_code_context(code_context)
+
+    return obj
+
+
+def _write_frame_metadata(writer, code_context):
+    writer.write_uint(code_context.number_of_parameters)
+    writer.write_uint(code_context.number_of_locals)
+    writer.write_bool(code_context.needs_closure)
+
+
+def _read_frame_metadata(reader, code_context):
+    code_context.number_of_parameters = reader.read_uint()
+    code_context.number_of_locals = reader.read_uint()
+    code_context.needs_closure = reader.read_bool()
+
+
+def write_code_context(writer, code_context):
+    """
+    Args:
+        writer (obj): :class:`Writer` instance.
+        code_context (obj): :class:`CodeContext`, which is finalized first.
+            Nested bodies, which were not compiled yet, are not compiled.
+    """
+    code_context.finalize()
+
+    writer.write_str(code_context.bytecodes)
+    _write_frame_metadata(writer, code_context)
+
+    writer.write_uint(len(code_context.literals))
+    for literal in code_context.literals:
+        writer.write_uint(literal.literal_type)
+
+        if isinstance(literal, IntBox):
+            writer.write_int(literal.value)
+        elif isinstance(literal, FloatBox):
+            writer.write_float(literal.value)
+        elif isinstance(literal, StrBox):
+            writer.write_str(literal.value)
+        elif isinstance(literal, ObjBox):
+            _write_literal_obj(writer, literal.value)
+        else:
+            raise SerializationError(
+                "Can't serialize literal `%s`." % literal.__str__()
+            )
+
+
+def _check_literal_reference(literals, literal_type, literal_index):
+    if literal_type == LITERAL_TYPE_NIL or \
+       literal_type == LITERAL_TYPE_ASSIGNMENT:
+        return
+
+    if literal_type > LITERAL_TYPE_ASSIGNMENT:
+        raise SerializationError("Unknown literal type %d." % literal_type)
+
+    if literal_index >= len(literals):
+        raise SerializationError("Invalid literal reference.")
+
+    if literals[literal_index].literal_type != literal_type:
+        raise SerializationError("Invalid type of literal %d." % literal_index)
+
+
+def _check_bytecodes(tokens, literals):
+    """
+    Make sure that the decoded `tokens` are something the compiler could
+    emit, so neither the .finalize(), nor the interpreter fail on them.
+    """
+    depth = 0
+    for token in tokens:
+        bytecode = token[1]
+
+        if bytecode == BYTECODE_SEND:
+            if token[2] > SEND_TYPE_KEYWORD_RESEND:
+                raise SerializationError("Unknown send type %d." % token[2])
+
+            # name of the message is always pushed right before the send
+            index = token[0]
+            if index == 0 or tokens[index - 1][1] != BYTECODE_PUSH_LITERAL or \
+               tokens[index - 1][2] != LITERAL_TYPE_STR:
+                raise SerializationError("Send without the message name.")
+
+        elif bytecode == BYTECODE_PUSH_LITERAL:
+            _check_literal_reference(literals, token[2], token[3])
+
+        elif bytecode == BYTECODE_ADD_SLOT:
+            if token[2] != SLOT_NORMAL and token[2] != SLOT_PARENT:
+                raise SerializationError("Unknown slot type %d." % token[2])
+
+        elif bytecode != BYTECODE_PUSH_SELF and \
+             bytecode != BYTECODE_PUSH_RECEIVER and \
+             bytecode != BYTECODE_RETURN_IMPLICIT:
+            raise SerializationError("Unknown bytecode %d." % bytecode)
+
+        depth += stack_effect(bytecode, token[2] if len(token) > 2 else 0,
+                              token[3] if len(token) > 3 else 0)
+        if depth < 0:
+            raise SerializationError("Bytecodes pop from the empty stack.")
+
+
+def read_code_context(reader):
+    """
+    Args:
+        reader (obj): :class:`Reader` positioned at the code context.
+
+    Returns:
+        obj: Finalized :class:`CodeContext`. Bodies stored without the
+            bytecodes are compiled from the source of the `reader` on their
+            first activation.
+
+    Raises:
+        SerializationError: When the data are malformed.
+    """
+    code_context = CodeContext()
+
+    try:
+        tokens = bytecode_tokenizer(reader.read_str())
+    except IndexError:
+        raise SerializationError("Truncated bytecodes.")
+
+    # the last return was added by the .finalize(), which will add it again
+    if tokens:
+        if tokens[-1][1] != BYTECODE_RETURN_TOP:
+            raise SerializationError("Bytecodes without the final return.")
+
+        tokens.pop()
+
+    _read_frame_metadata(reader, code_context)
+
+    for _ in xrange(reader.read_uint()):
+        literal_type = reader.read_uint()
+
+        if literal_type == LITERAL_TYPE_INT:
+            code_context.add_literal(IntBox(reader.read_int()))
+        elif literal_type == LITERAL_TYPE_FLOAT:
+            code_context.add_literal(FloatBox(reader.read_float()))
+        elif literal_type == LITERAL_TYPE_STR:
+            code_context.add_literal(StrBox(reader.read_str()))
+        elif literal_type == LITERAL_TYPE_OBJ:
+            code_context.add_literal(ObjBox(_read_literal_obj(reader)))
+        elif literal_type == LITERAL_TYPE_BLOCK:
+            code_context.add_literal(BlockBox(_read_literal_obj(reader)))
+        else:
+            raise SerializationError("Unknown literal type %d." % literal_type)
+
+    _check_bytecodes(tokens, code_context.literals)
+    for token in tokens:
+        for item in token[1:]:
+            code_context.add_bytecode(item)
+
+    return code_context.finalize()
+
+
+def serialize_code_context(code_context):
+    writer = Writer()
+    write_code_context(writer, code_context)
+
+    return writer.getvalue()
+
+
+def deserialize_code_context(data, source=None):
+    """
+    Args:
+        data (str): Serialized code context.
+        source (str, default None): Source the code was compiled from, needed
+            by the bodies which were not compiled when the code was stored.
+    """
+    source_lines = None
+    if source is not None:
+        source_lines = SourceLines(source)
+
+    reader = Reader(data, source_lines=source_lines)
+    code_context = read_code_context(reader)
+
+    if not reader.at_end():
+        raise SerializationError("Unexpected data after the code context.")
+
+    return code_context
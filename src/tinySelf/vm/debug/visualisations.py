@@ -115,7 +115,7 @@ def _render_method_stack(cnt, method_stack):
         "code_context = %s" % method_stack.code_context,
         # "code_context.self = %s" % method_stack.code_context.self,
         "error_handler = %s" % method_stack.error_handler,
-        "tmp_method_obj_reference = %s" % method_stack.tmp_method_obj_reference,
+        "method_obj = %s" % method_stack.method_obj,
     ])
 
     self_obj = _render_object(method_stack.self)
@@ -123,7 +123,7 @@ def _render_method_stack(cnt, method_stack):
     settings.connect(self_obj, pos="r", desc=".code_context.self")
 
     prev = settings
-    for i, obj in enumerate(method_stack.stack):
+    for i, obj in enumerate(method_stack._stack[:method_stack._length]):
         plantuml_obj = _render_object(obj, name="%s_%s_%s" % (id(obj), cnt, i))
 
         f.add(plantuml_obj)
@@ -147,7 +147,9 @@ def process_stack_to_plantuml(process, numbered=False, prefix="frame"):
     ps.add(settings)
 
     prev = None
-    for cnt, frame in enumerate(process.frames):
+    cnt = 0
+    frame = process.frame
+    while frame is not None:
         plantuml_frame = _render_method_stack(cnt, frame)
         ps.add(plantuml_frame)
 
@@ -155,6 +157,8 @@ def process_stack_to_plantuml(process, numbered=False, prefix="frame"):
             prev.connect(plantuml_frame)
 
         prev = plantuml_frame
+        frame = frame.prev_stack
+        cnt += 1
 
     obj_map_to_plantuml(process.frame.self)
 
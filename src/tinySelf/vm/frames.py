@@ -1,21 +1,57 @@
 # -*- coding: utf-8 -*-
+import time
+
+from rpython.rlib import rpoll
+
 from tinySelf.vm.primitives import PrimitiveNilObject
+from tinySelf.vm.primitives.primitive_time import timestamp
 from tinySelf.vm.code_context import CodeContext
 from tinySelf.vm.object_layout import Object
 
+from tinySelf.datastructures.timer_heap import TimerHeap
+
 
 NIL = PrimitiveNilObject()
 
 
-class ObjectHolder(object):
-    def __init__(self, obj, prev=None):
-        self.obj = obj
-        self.prev = prev
+DEFAULT_STACK_SIZE = 4
+
+# number of bytecodes run by a process before switching to the next one
+DEFAULT_TIME_SLICE = 10
+
+# states of the ProcessStack; only the ready processes are in the run queue
+PROCESS_READY = 0
+PROCESS_BLOCKED = 1
+PROCESS_SLEEPING = 2
+
+# number of the process switches between polls of the file descriptors, when
+# some processes wait for I/O and others are ready to run
+IO_POLL_INTERVAL = 16
+
+# seconds between the checks of the conditions, when no process is ready
+CONDITION_POLL_DELAY = 0.01
+
+
+class VMState(object):
+    """
+    State of the whole OS process. nil, true, false and the block traits are
+    shared by all interpreters of the process, so the snapshot, which
+    replaces their state, can't be restored once some interpreter ran code.
+    """
+    def __init__(self):
+        self.code_ran = False
+
+
+VM_STATE = VMState()
 
 
 class MethodStack(object):
     def __init__(self, code_context=None, prev_stack=None):
-        self._stack = None
+        stack_size = DEFAULT_STACK_SIZE
+        if code_context is not None and code_context.max_stack_depth > 0:
+            stack_size = code_context.max_stack_depth
+
+        self._stack = [None] * stack_size
         self._length = 0
         self.prev_stack = prev_stack
 
@@ -24,33 +60,56 @@ class MethodStack(object):
         self.error_handler = None
         self.self = None
 
-        # used to remove scope parent from the method later
-        self.tmp_method_obj_reference = None
+        # method or block object running in this frame; `self` is its activation
+        self.method_obj = None
+
+    def _grow(self):
+        # max stack depth is just estimate, some primitives may push more
+        self._stack = self._stack + [None] * len(self._stack)
 
     def push(self, obj):
         assert isinstance(obj, Object)
-        if self._length == 0:
-            self._stack = ObjectHolder(obj)
-            self._length = 1
-            return
+        if self._length >= len(self._stack):
+            self._grow()
 
-        self._stack = ObjectHolder(obj, prev=self._stack)
+        self._stack[self._length] = obj
         self._length += 1
 
     def pop(self):
         if self._length == 0:
             raise IndexError()
 
-        if self._length == 1:
-            ret = self._stack
-            self._length = 0
-            self._stack = None
-            return ret.obj
-
-        ret = self._stack
         self._length -= 1
-        self._stack = self._stack.prev
-        return ret.obj
+        obj = self._stack[self._length]
+        self._stack[self._length] = None
+
+        return obj
+
+    def peek(self, depth=0):
+        """
+        Args:
+            depth (int): Number of items above the wanted one.
+
+        Returns:
+            obj: Item from the stack, which is left unchanged.
+        """
+        index = self._length - 1 - depth
+        if index < 0:
+            raise IndexError()
+
+        return self._stack[index]
+
+    def drop(self, count):
+        """
+        Remove `count` items from the top of the stack.
+        """
+        if count > self._length:
+            raise IndexError()
+
+        for i in xrange(self._length - count, self._length):
+            self._stack[i] = None
+
+        self._length -= count
 
     def pop_or_nil(self):
         if self._length == 0:
@@ -68,13 +127,31 @@ class ProcessStack(object):
         self.finished = False
         self.finished_with_error = False
 
+        self.state = PROCESS_READY
+        self.wake_time = 0.0
+
+        # links of the ProcessQueue
+        self.queued = False
+        self.prev_process = None
+        self.next_process = None
+
     def is_nested_call(self):
         return self._length > 1
 
-    def push_frame(self, code_context, method_obj):
+    def push_frame(self, code_context, method_obj, activation=None):
+        """
+        Args:
+            code_context (obj): :class:`CodeContext` to run.
+            method_obj (obj): Method or block to which the code belongs.
+            activation (obj, default None): Object used as `self` of the frame,
+                `method_obj` if not set.
+        """
+        if activation is None:
+            activation = method_obj
+
         self.frame = MethodStack(code_context, prev_stack=self.frame)
-        self.frame.self = method_obj
-        self.frame.tmp_method_obj_reference = method_obj
+        self.frame.self = activation
+        self.frame.method_obj = method_obj
 
         self._length += 1
 
@@ -85,12 +162,7 @@ class ProcessStack(object):
         if self.frame.code_context:
             self.frame.code_context.self = None
 
-        if self.frame.tmp_method_obj_reference:
-            # blocks have local namespaces in scope_parents..
-            if not self.frame.tmp_method_obj_reference.is_block:
-                self.frame.tmp_method_obj_reference.scope_parent = None
-
-            self.frame.tmp_method_obj_reference = None
+        self.frame.method_obj = None
 
     def pop_frame(self):
         if self._length == 1:
@@ -122,12 +194,128 @@ class ProcessStack(object):
         return Object()
 
 
+class ProcessQueue(object):
+    """
+    Circular doubly-linked list of the processes, linked through the
+    ProcessStack objects themselves, so add, remove and rotate are O(1).
+    """
+    def __init__(self):
+        self.head = None
+        self.length = 0
+
+    def append(self, process):
+        """
+        Insert the `process` at the end of the round, that is before `head`.
+        """
+        assert not process.queued
+        process.queued = True
+        self.length += 1
+
+        if self.head is None:
+            process.prev_process = process
+            process.next_process = process
+            self.head = process
+            return
+
+        tail = self.head.prev_process
+        process.prev_process = tail
+        process.next_process = self.head
+        tail.next_process = process
+        self.head.prev_process = process
+
+    def remove(self, process):
+        assert process.queued
+        process.queued = False
+        self.length -= 1
+
+        if self.length == 0:
+            self.head = None
+        else:
+            process.prev_process.next_process = process.next_process
+            process.next_process.prev_process = process.prev_process
+
+            if self.head is process:
+                self.head = process.next_process
+
+        process.prev_process = None
+        process.next_process = None
+
+    def rotate(self):
+        """
+        Move the head to the end of the round.
+
+        Returns:
+            obj: New head.
+        """
+        if self.head is not None:
+            self.head = self.head.next_process
+
+        return self.head
+
+
+class IOWaiter(object):
+    """
+    Operation on the file descriptor, for which the `process` is blocked.
+    """
+    def __init__(self, process, fd, events):
+        self.process = process
+        self.fd = fd
+        self.events = events
+
+    def complete(self, cycler):
+        """
+        Called when the `fd` is ready. Subclasses finish their operation
+        first and may raise the error in the `process` instead; this only
+        wakes up the `process`.
+
+        Args:
+            cycler (obj): :class:`ProcessCycler` where the `process` is blocked.
+
+        Returns:
+            bool: False if the operation would still block.
+        """
+        cycler.wake_process(self.process)
+
+        return True
+
+
+class ConditionWaiter(object):
+    """
+    Condition without the file descriptor, for which the `process` is
+    blocked, like the exit of the child process. The scheduler checks it
+    together with the file descriptors.
+    """
+    def __init__(self, process):
+        self.process = process
+
+    def complete(self, cycler):
+        """
+        Check the condition, finish the operation and wake up the `process`.
+
+        Args:
+            cycler (obj): :class:`ProcessCycler` where the `process` is blocked.
+
+        Returns:
+            bool: False if the process has to wait longer.
+        """
+        cycler.wake_process(self.process)
+
+        return True
+
+
 class ProcessCycler:
-    def __init__(self, code_context=None):
-        self.cycler = 0
+    def __init__(self, code_context=None, time_slice=DEFAULT_TIME_SLICE):
         self.process = None
-        self.processes = []
+        self.processes = ProcessQueue()
         self.process_count = 0
+        self.waiting_count = 0  # blocked and sleeping processes
+        self.sleepers = TimerHeap()
+        self.io_waiters = []
+        self.condition_waiters = []
+        self.polls_left = IO_POLL_INTERVAL
+
+        self.time_slice = time_slice
+        self.slice_left = time_slice
 
         if code_context is not None:
             self.add_process(code_context)
@@ -137,60 +325,239 @@ class ProcessCycler:
 
         code_context.finalize()
 
-        new_process = ProcessStack(code_context)
-        self.processes.append(new_process)
-        self.process_count += 1
-
-        if not self.process or self.process_count <= 0:
-            self.process = new_process
+        return self.restore_process(ProcessStack(code_context))
 
-        return new_process
+    def _set_ready(self, process):
+        if process.state != PROCESS_READY:
+            process.state = PROCESS_READY
+            self.waiting_count -= 1
 
     def restore_process(self, process_stack):
         assert isinstance(process_stack, ProcessStack)
 
-        self.processes.append(process_stack)
-        self.process_count += 1
+        self._set_ready(process_stack)
+        if not process_stack.queued:
+            self.processes.append(process_stack)
+            self.process_count += 1
 
-        if not self.process:
+        if self.process is None or not self.process.queued:
             self.process = process_stack
 
         return process_stack
 
+    def number_of_processes(self):
+        """
+        Returns:
+            int: Number of the ready, blocked and sleeping processes.
+        """
+        return self.process_count + self.waiting_count
+
     def has_processes_to_run(self):
-        return self.process_count != 0
+        return self.process_count != 0 or len(self.sleepers) != 0 or \
+               len(self.io_waiters) != 0 or len(self.condition_waiters) != 0
 
     def remove_process(self, process):
-        self.processes.remove(process)
+        if process.queued:
+            self.processes.remove(process)
+            self.process_count -= 1
 
-        self.cycler = 0
-        self.process_count -= 1
+        self._set_ready(process)
 
-        if self.processes:
-            self.process = self.processes[0]
-        else:
-            self.process = None
+        self.process = self.processes.head
+        self.slice_left = self.time_slice
 
         return process
 
     def remove_active_process(self):
-        if self.process not in self.processes:
-            process = self.process
+        return self.remove_process(self.process)
 
-            if self.processes:
-                self.process = self.processes[0]
+    def _suspend_process(self, process, state):
+        if process.queued:
+            self.processes.remove(process)
+            self.process_count -= 1
 
-            return process
+        if process.state == PROCESS_READY:
+            self.waiting_count += 1
 
-        return self.remove_process(self.process)
+        process.state = state
+
+        # the active process finishes the current bytecode and then the
+        # cycler switches to the next ready one
+        if process is self.process:
+            self.slice_left = 0
+
+    def block_process(self, process):
+        """
+        Take the `process` out of the run queue until :meth:`wake_process`.
+        """
+        self._suspend_process(process, PROCESS_BLOCKED)
+
+    def sleep_process(self, process, wake_time):
+        """
+        Take the `process` out of the run queue until the `wake_time`.
+
+        Args:
+            process (obj): :class:`ProcessStack` instance.
+            wake_time (float): Time from the :func:`timestamp` clock.
+        """
+        self._suspend_process(process, PROCESS_SLEEPING)
+
+        process.wake_time = wake_time
+        self.sleepers.push(wake_time, process)
+
+    def wake_process(self, process):
+        if process.state == PROCESS_READY:
+            return
+
+        self.restore_process(process)
+
+    def wait_for_io(self, waiter):
+        """
+        Block the process of the `waiter` until its file descriptor is ready.
+
+        Args:
+            waiter (obj): :class:`IOWaiter` instance.
+        """
+        self.io_waiters.append(waiter)
+        self.block_process(waiter.process)
+
+    def wait_for_condition(self, waiter):
+        """
+        Block the process of the `waiter` until its condition holds.
+
+        Args:
+            waiter (obj): :class:`ConditionWaiter` instance.
+        """
+        self.condition_waiters.append(waiter)
+        self.block_process(waiter.process)
+
+    def check_conditions(self):
+        waiters = self.condition_waiters
+        self.condition_waiters = []
+
+        # waiters added by the completed ones are kept
+        for waiter in waiters:
+            if not waiter.complete(self):
+                self.condition_waiters.append(waiter)
+
+    def poll_io(self, timeout):
+        """
+        Complete the operations of the ready file descriptors and wake up
+        their processes.
+
+        Args:
+            timeout (int): Milliseconds to wait, -1 to wait until some file
+                descriptor is ready.
+        """
+        events = {}
+        for waiter in self.io_waiters:
+            events[waiter.fd] = events.get(waiter.fd, 0) | waiter.events
+
+        try:
+            ready_list = rpoll.poll(events, timeout)
+        except rpoll.PollError:
+            return  # interrupted, the caller polls again
+
+        if not ready_list:
+            return
+
+        ready = {}
+        for fd, _ in ready_list:
+            ready[fd] = True
+
+        waiters = self.io_waiters
+        self.io_waiters = []
+
+        # waiters added by the completed ones are kept
+        for waiter in waiters:
+            if waiter.fd in ready and waiter.complete(self):
+                continue
+
+            self.io_waiters.append(waiter)
+
+    def wake_sleepers(self, now):
+        for process in self.sleepers.pop_expired(now):
+            # timers of the processes woken up in the meantime are stale
+            if process.state == PROCESS_SLEEPING and process.wake_time <= now:
+                self.wake_process(process)
 
     def next_process(self):
-        if self.process_count == 0 or self.process_count == 1:
+        """
+        Switch to the next process in the round and give it a new time slice.
+        """
+        self.slice_left = self.time_slice
+
+        if len(self.sleepers) != 0:
+            self.wake_sleepers(timestamp())
+
+        if len(self.io_waiters) != 0 or len(self.condition_waiters) != 0:
+            self.polls_left -= 1
+            if self.polls_left <= 0 or self.process_count == 0:
+                self.polls_left = IO_POLL_INTERVAL
+                if len(self.io_waiters) != 0:
+                    self.poll_io(0)
+                if len(self.condition_waiters) != 0:
+                    self.check_conditions()
+
+        if self.process_count == 0:
             return
 
-        self.process = self.processes[self.cycler]
+        # the active process is the head while it is in the run queue, else
+        # the head is already the next process of the round
+        if self.process is self.processes.head:
+            self.process = self.processes.rotate()
+        else:
+            self.process = self.processes.head
+
+    def tick(self):
+        """
+        Account one bytecode to the time slice of the active process and
+        switch the processes when it is used up.
+        """
+        self.slice_left -= 1
+
+        if self.slice_left <= 0:
+            self.next_process()
+
+    def wait_for_process(self):
+        """
+        Called when there is no ready process. Sleep until the first sleeper
+        wakes up, some file descriptor is ready or some condition holds, and
+        switch to the woken process.
+
+        Returns:
+            bool: False if there is nothing to wait for.
+        """
+        while self.process_count == 0:
+            if len(self.sleepers) == 0 and len(self.io_waiters) == 0 and \
+               len(self.condition_waiters) == 0:
+                return False
+
+            delay = -1.0
+            if len(self.sleepers) != 0:
+                delay = max(self.sleepers.next_deadline() - timestamp(), 0.0)
+
+            if len(self.condition_waiters) != 0 and \
+               (delay < 0 or delay > CONDITION_POLL_DELAY):
+                delay = CONDITION_POLL_DELAY
+
+            if len(self.io_waiters) != 0:
+                timeout = -1
+                if delay >= 0:
+                    timeout = int(delay * 1000) + 1
+
+                self.poll_io(timeout)
+
+            elif delay > 0:
+                time.sleep(delay)
+
+            if len(self.condition_waiters) != 0:
+                self.check_conditions()
+
+            if len(self.sleepers) != 0:
+                self.wake_sleepers(timestamp())
 
-        self.cycler += 1
+        self.process = self.processes.head
+        self.slice_left = self.time_slice
 
-        if self.cycler >= self.process_count:
-            self.cycler = 0
+        return True
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Stdlib frozen into the translated binary.
+
+`compile.py` runs the stdlib before the translation and saves the snapshot
+of the initialized universe. Path of the snapshot is passed in the
+`TINYSELF_FROZEN_STDLIB` environment variable and the snapshot is read when
+this module is imported, so it becomes a prebuilt constant of the binary.
+The VM then starts from the ready universe without parsing anything.
+
+Binary built without the frozen stdlib runs the stdlib from `STDLIB_PATH` of
+the checkout it was built from.
+"""
+import os
+
+from tinySelf.vm.snapshot import SnapshotError
+from tinySelf.vm.snapshot import dump_snapshot
+from tinySelf.vm.virtual_machine import virtual_machine
+
+
+FROZEN_STDLIB_ENV = "TINYSELF_FROZEN_STDLIB"
+STDLIB_PATH = os.path.normpath(os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..", "..", "..", "objects", "stdlib.tself"
+))
+
+
+def _read_frozen_stdlib():
+    path = os.environ.get(FROZEN_STDLIB_ENV, "")
+    if not path:
+        return ""
+
+    with open(path) as f:
+        return f.read()
+
+
+FROZEN_STDLIB = _read_frozen_stdlib()
+
+
+def freeze_stdlib(stdlib_source, stdlib_path=""):
+    """
+    Run the stdlib in the new universe and return its snapshot.
+
+    Args:
+        stdlib_source (str): Source of the stdlib.
+        stdlib_path (str, default ""): Path of the stdlib for the bytecode
+            cache.
+
+    Returns:
+        str: Snapshot, which can be passed as `snapshot_data` to the
+             `virtual_machine()`.
+
+    Raises:
+        SnapshotError: When the stdlib fails.
+    """
+    process, interpreter = virtual_machine("()", stdlib_source,
+                                           stdlib_path=stdlib_path)
+    if process is None or process.finished_with_error:
+        raise SnapshotError("Couldn't initialize stdlib.")
+
+    return dump_snapshot(interpreter)
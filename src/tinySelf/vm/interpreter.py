@@ -6,23 +6,31 @@ from rpython.rlib.objectmodel import we_are_translated
 
 from tinySelf.vm.bytecodes import *
 
-from tinySelf.vm.primitives import add_block_trait
+from tinySelf.vm.primitives import clone_block
 from tinySelf.vm.primitives import PrimitiveNilObject
-from tinySelf.vm.primitives import PrimitiveIntObject
 from tinySelf.vm.primitives import PrimitiveStrObject
-from tinySelf.vm.primitives import PrimitiveFloatObject
 from tinySelf.vm.primitives import AssignmentPrimitive
 from tinySelf.vm.primitives import add_primitive_method
 from tinySelf.vm.primitives import gen_interpreter_primitives
 from tinySelf.vm.primitives.interpreter_primitives import ErrorObject
+from tinySelf.vm.primitives.io_primitives import gen_io_primitives
+from tinySelf.vm.primitives.worker_primitives import gen_worker_primitives
 
-from tinySelf.vm.code_context import IntBox
-from tinySelf.vm.code_context import StrBox
 from tinySelf.vm.code_context import ObjBox
-from tinySelf.vm.code_context import FloatBox
+from tinySelf.vm.code_context import BlockBox
+from tinySelf.vm.code_context import _ImmutableLiteralBox
 
 from tinySelf.vm.frames import ProcessCycler
+from tinySelf.vm.frames import DEFAULT_TIME_SLICE
+from tinySelf.vm.frames import VM_STATE
+from tinySelf.vm.quickening import can_quicken
+from tinySelf.vm.quickening import is_quickened
+from tinySelf.vm.quickening import quick_binary_op
+from tinySelf.vm.quickening import quickened_opcode
 from tinySelf.vm.object_layout import Object
+from tinySelf.vm.object_layout import ObjectMap
+
+from tinySelf.vm.symbols import intern_symbol
 
 if not we_are_translated():
     from tinySelf.vm.debug.visualisations import obj_map_to_plantuml
@@ -31,9 +39,16 @@ if not we_are_translated():
 
 NIL = PrimitiveNilObject()
 ONE_BYTECODE_LONG = 1
-TWO_BYTECODES_LONG = 2
-THREE_BYTECODES_LONG = 3
 EMPTY = Object()
+INTERMEDIATE_OBJ_SYMBOL = intern_symbol("ThisIsIntermediateObj")
+VALUE_SYMBOL = intern_symbol("value")
+
+# assignment writes to the object where the setter was found, so all the
+# parameter objects can share one setter
+SETTER = AssignmentPrimitive()
+
+# primitives only read their parameters, so the unary sends can share this
+NO_PARAMETERS = []
 
 
 jit.set_param(None, "enable_opts", "intbounds:rewrite:virtualize:string:pure:earlyforce:heap")
@@ -46,12 +61,22 @@ jitdriver = jit.JitDriver(
 
 
 class Interpreter(ProcessCycler):
-    def __init__(self, universe, code_context=None):
+    def __init__(self, universe, code_context=None,
+                 time_slice=DEFAULT_TIME_SLICE):
         if code_context is not None:
             code_context.finalize()
 
-        ProcessCycler.__init__(self, code_context)
+        ProcessCycler.__init__(self, code_context, time_slice)
         self.universe = universe
+
+        # used to bootstrap the workers and to talk to the parent from one
+        self.stdlib_source = ""
+        self.stdlib_path = ""
+        self.snapshot_path = ""
+        self.snapshot_data = ""
+        self.parent_channel = None
+        self.channels = []  # open channels, closed in the forked workers
+
         self._add_reflection_to_universe()
 
     def _add_reflection_to_universe(self):
@@ -67,21 +92,38 @@ class Interpreter(ProcessCycler):
             self.universe.meta_add_slot(slot, primitives.get_slot(slot))
 
         primitives.meta_add_slot("interpreter", gen_interpreter_primitives(self))
+        primitives.meta_add_slot("io", gen_io_primitives(self))
+        primitives.meta_add_slot("workers", gen_worker_primitives(self))
 
     def interpret(self):
-        while self.process_count > 0:
+        VM_STATE.code_ran = True
+
+        while self.process_count > 0 or self.wait_for_process():
             frame = self.process.frame
             code_obj = frame.code_context
 
-            bytecode = ord(code_obj.bytecodes[frame.bc_index])
+            bytecode = code_obj.opcodes[frame.bc_index]
 
             bc_len = 0
             if bytecode == BYTECODE_SEND:
                 bc_len = self._do_send(frame.bc_index, code_obj)
 
+            elif bytecode == BYTECODE_SEND_LITERAL:
+                bc_len = self._do_send_literal(frame.bc_index, code_obj)
+
+            elif bytecode == BYTECODE_SELF_SEND:
+                bc_len = self._do_self_send(frame.bc_index, code_obj)
+
+            elif is_quickened(bytecode):
+                bc_len = self._do_quick_binary_send(bytecode, frame.bc_index,
+                                                    code_obj)
+
             elif bytecode == BYTECODE_PUSH_SELF:
                 bc_len = self._do_push_self(frame.bc_index, code_obj)
 
+            elif bytecode == BYTECODE_PUSH_RECEIVER:
+                bc_len = self._do_push_receiver(frame.bc_index, code_obj)
+
             elif bytecode == BYTECODE_PUSH_LITERAL:
                 bc_len = self._do_push_literal(frame.bc_index, code_obj)
 
@@ -98,18 +140,21 @@ class Interpreter(ProcessCycler):
                         self.process = process
                         return
 
+                    # the next process continues where it was interrupted
+                    continue
+
                 if bytecode == BYTECODE_RETURN_IMPLICIT:
                     self._handle_nonlocal_return()
 
                 self.process.pop_down_and_cleanup_frame()
-                self.next_process()
+                self.tick()
                 continue
 
             elif bytecode == BYTECODE_ADD_SLOT:
                 bc_len = self._do_add_slot(frame.bc_index, code_obj)
 
-            # elif bytecode == BYTECODE_SELF_SEND:
-            #     self._do_selfSend(bc_index, code_obj, frame)
+            elif bytecode == BYTECODE_ADD_LITERAL_SLOT:
+                bc_len = self._do_add_literal_slot(frame.bc_index, code_obj)
 
             else:
                 self.process.result = ErrorObject(
@@ -136,88 +181,234 @@ class Interpreter(ProcessCycler):
                 self=self,
             )
 
-            if (frame.bc_index % 10) == 0:
-                self.next_process()
+            self.tick()
 
-    def _handle_nonlocal_return(self):
+    def _find_home_frame(self):
         """
-        If the item at the top of the process frame is block which triggered
-        nonlocal return, pop frames down until you reach frame where the block
-        was defined.
+        Find the frame of the method, in which the block running in the top
+        frame was created. Frames of the enclosing blocks are skipped on the
+        way, so the return always leaves the method.
 
         Returns:
-            bool: True if the nonlocal return was triggered.
+            obj: :class:`MethodStack` instance, or None when the block doesn't
+                run from its home method (it was returned from it, or the
+                frame of the method was replaced by the tail call).
         """
-        method_obj = self.process.frame.tmp_method_obj_reference
-        if method_obj and method_obj.is_block:
-            block_scope_parent = method_obj.meta_get_parent("*")
+        method_obj = self.process.frame.method_obj
+        if method_obj is None or not method_obj.is_block:
+            return None
 
-            while block_scope_parent != method_obj:
-                self.process.pop_down_and_cleanup_frame()
-                method_obj = self.process.frame.tmp_method_obj_reference
+        scope = method_obj.scope_parent
+        frame = self.process.frame.prev_stack
+        while frame is not None:
+            if frame.self is scope:
+                if frame.method_obj is None or not frame.method_obj.is_block:
+                    return frame
+
+                scope = frame.method_obj.scope_parent
+
+            frame = frame.prev_stack
+
+        return None
+
+    def _handle_nonlocal_return(self):
+        """
+        If the code at the top of the process frame is block which triggered
+        nonlocal return, pop frames down until you reach frame of the method
+        where the block was defined.
+        """
+        home_frame = self._find_home_frame()
+        if home_frame is None:
+            return
+
+        while self.process.frame is not home_frame:
+            self.process.pop_down_and_cleanup_frame()
 
-    def _put_together_parameters(self, parameter_names, parameters):
-        if len(parameter_names) < len(parameters):
+    def _params_map(self, method_obj):
+        """
+        Map of the parameters objects of the `method_obj`; marker slot
+        first, then getter and setter of each parameter. It is built on the
+        first call and shared by all the parameter objects of the code.
+        """
+        code_context = method_obj.code_context
+        if code_context._params_map is None:
+            params_map = ObjectMap()
+            params_map.add_slot(INTERMEDIATE_OBJ_SYMBOL.name, 0)
+            for i, name in enumerate(method_obj.parameters):
+                params_map.add_slot(name, 1 + 2 * i)
+                params_map.add_slot(name + ":", 2 + 2 * i)
+
+            params_map._used_in_multiple_objects = True
+            code_context._params_map = params_map
+
+        return code_context._params_map
+
+    def _new_params_obj(self, scope_parent, method_obj, number_of_parameters):
+        """
+        Create the parameters object with all parameters set to nil.
+        """
+        number_of_slots = len(method_obj.parameters)
+        if number_of_parameters > number_of_slots:
             raise ValueError("Too many parameters!")
 
-        if len(parameter_names) > len(parameters):
-            for _ in range(len(parameter_names) - len(parameters)):
-                parameters.append(PrimitiveNilObject())
+        intermediate_obj = Object(obj_map=self._params_map(method_obj))
+
+        slot_values = [None] * (1 + 2 * number_of_slots)
+        slot_values[0] = intermediate_obj
+        for i in xrange(number_of_slots):
+            slot_values[1 + 2 * i] = NIL
+            slot_values[2 + 2 * i] = SETTER
+
+        intermediate_obj._slot_values = slot_values
+        intermediate_obj._scope_parent = scope_parent
+
+        return intermediate_obj
+
+    def _create_intermediate_params_obj(self, scope_parent, method_obj, parameters):
+        intermediate_obj = self._new_params_obj(scope_parent, method_obj,
+                                                len(parameters))
+        for i in xrange(len(parameters)):
+            intermediate_obj._slot_values[1 + 2 * i] = parameters[i]
+
+        return intermediate_obj
+
+    def _block_locals_map(self, block):
+        """
+        Map of the activations of the `block`; marker slot first, then the
+        slots declared in the block. The block itself is stored in the shared
+        `value` slot, which is left out.
+
+        Returns:
+            list: Indexes of the values of the slots in the `block`.
+        """
+        code_context = block.code_context
+        if code_context._locals_source_map is block.map and \
+           code_context._locals_source_version == block.map._version:
+            return code_context._locals_indexes
+
+        value_index = block.map._slots.get(VALUE_SYMBOL, -1)
 
-        for i in xrange(len(parameter_names)):  # TODO: benchmark rewrite to enumerate()
-            yield parameter_names[i], parameters[i]
+        locals_map = ObjectMap()
+        locals_map.add_slot(INTERMEDIATE_OBJ_SYMBOL.name, 0)
+        indexes = []
+        for symbol, index in block.map._slots.iteritems():
+            if index != value_index:
+                locals_map.add_slot(symbol.name, 1 + len(indexes))
+                indexes.append(index)
 
-    def _create_intermediate_params_obj(self, scope_parent, method_obj,
-                                        parameters, prev_scope_parent=None):
-        # do not create empty intermediate objects
-        if not method_obj.parameters:
-            # this is used to remember in what context is the block executed,
-            # so in case of indirect return, it is possible to return from
-            # this context and not just block
-            if prev_scope_parent:
-                method_obj.meta_add_parent("*", prev_scope_parent)
+        locals_map._used_in_multiple_objects = True
 
-                if not method_obj.is_block and method_obj.has_code:
-                    return scope_parent
+        # the compiler knows the number of locals, unless someone added slots
+        # to the block through the mirror
+        code_context.number_of_locals = len(indexes)
 
-                return prev_scope_parent
+        code_context._locals_map = locals_map
+        code_context._locals_indexes = indexes
+        code_context._locals_source_map = block.map
+        code_context._locals_source_version = block.map._version
 
+        return indexes
+
+    def _create_block_activation(self, block, scope_parent):
+        if len(block._slot_values) <= 1:
             return scope_parent
 
-        if method_obj.code_context._params_cache is None:
-            intermediate_obj = Object()
-            intermediate_obj.meta_add_slot("ThisIsIntermediateObj", intermediate_obj)
-        else:
-            intermediate_obj = method_obj.code_context._params_cache.clone()
+        indexes = self._block_locals_map(block)
+        code_context = block.code_context
+        number_of_locals = code_context.number_of_locals
 
-        if scope_parent.has_parents or scope_parent.scope_parent or scope_parent.has_slots:
-            intermediate_obj.scope_parent = None if scope_parent == method_obj else scope_parent
+        activation = Object(obj_map=code_context._locals_map)
 
-        if prev_scope_parent is not None:
-            prev_scope_parents_parent = prev_scope_parent.meta_get_parent("*", None)
-            if prev_scope_parents_parent and \
-               prev_scope_parent.scope_parent == prev_scope_parents_parent.scope_parent:
-                parent = prev_scope_parents_parent
-            else:
-                parent = prev_scope_parent
-
-            intermediate_obj.meta_add_parent("*", parent)
-
-        parameter_pairs = self._put_together_parameters(
-            parameter_names=method_obj.parameters,
-            parameters=parameters
-        )
-        for name, value in parameter_pairs:
-            intermediate_obj.meta_add_slot(name, value)
-            intermediate_obj.meta_add_slot(
-                name + ":",
-                AssignmentPrimitive(intermediate_obj)
+        slot_values = [None] * (1 + number_of_locals)
+        slot_values[0] = activation
+        for i in xrange(number_of_locals):
+            slot_values[1 + i] = block._slot_values[indexes[i]]
+
+        activation._slot_values = slot_values
+        activation._scope_parent = scope_parent
+
+        return activation
+
+    def _is_activation(self, obj):
+        if obj.has_code and not obj.is_block:
+            return True
+
+        return obj.map._slots.get(INTERMEDIATE_OBJ_SYMBOL, -1) != -1
+
+    def _unwrap_activation(self, obj):
+        """
+        `self` of the frame is the activation record, so messages sent to
+        `self` are in fact sent to the receiver of the activation. Without
+        this, each recursive call would add one more activation to the
+        lookup chain of the next one.
+        """
+        while obj.scope_parent is not None and self._is_activation(obj):
+            obj = obj.scope_parent
+
+        return obj
+
+    def _create_activation(self, receiver, method_obj, parameters):
+        """
+        Create the activation record; object which is `self` of the frame
+        running the code of the `method_obj`. Method objects are never
+        changed by the call, so the same method may run in any number of
+        frames at once.
+
+        Args:
+            receiver (obj): Receiver of the message.
+            method_obj (obj): Method or block to run.
+            parameters (list): Values of the parameters.
+
+        Returns:
+            obj: Activation record.
+        """
+        scope_parent = self._activation_scope_parent(receiver, method_obj)
+        if method_obj.parameters:
+            scope_parent = self._create_intermediate_params_obj(
+                scope_parent,
+                method_obj,
+                parameters
             )
 
-        if method_obj.code_context._params_cache is None:
-            method_obj.code_context._params_cache = intermediate_obj
+        return self._activation_in_scope(method_obj, scope_parent)
 
-        return intermediate_obj
+    def _create_activation_from_stack(self, receiver, method_obj,
+                                      number_of_parameters):
+        """
+        Same as :meth:`_create_activation`, but the parameters are read from
+        the top of the operand stack of the current frame, without the list.
+        """
+        scope_parent = self._activation_scope_parent(receiver, method_obj)
+        if method_obj.parameters:
+            intermediate_obj = self._new_params_obj(scope_parent, method_obj,
+                                                    number_of_parameters)
+            frame = self.process.frame
+            for i in xrange(number_of_parameters):
+                intermediate_obj._slot_values[1 + 2 * i] = frame.peek(i)
+
+            scope_parent = intermediate_obj
+
+        return self._activation_in_scope(method_obj, scope_parent)
+
+    def _activation_scope_parent(self, receiver, method_obj):
+        if method_obj.is_block:
+            return method_obj.scope_parent
+
+        return self._unwrap_activation(receiver)
+
+    def _activation_in_scope(self, method_obj, scope_parent):
+        if method_obj.is_block:
+            return self._create_block_activation(method_obj, scope_parent)
+
+        # without own slots and blocks, the method can't tell the difference
+        if not method_obj.code_context.needs_closure and \
+           not method_obj.has_slots and not method_obj.has_parents:
+            return scope_parent
+
+        activation = method_obj.clone()
+        activation._scope_parent = scope_parent
+
+        return activation
 
     def _tco_applied(self, next_bytecode):
         if next_bytecode == BYTECODE_RETURN_TOP or next_bytecode == BYTECODE_RETURN_IMPLICIT:
@@ -225,28 +416,35 @@ class Interpreter(ProcessCycler):
 
     def _push_code_obj_for_interpretation(self, next_bytecode, scope_parent,
                                           method_obj, parameters):
-        prev_scope_parent = method_obj.scope_parent
+        activation = self._create_activation(scope_parent, method_obj, parameters)
+        self._push_activation(next_bytecode, method_obj, activation)
+
+    def _push_activation(self, next_bytecode, method_obj, activation):
         self._tco_applied(next_bytecode)
-        method_obj.scope_parent = self._create_intermediate_params_obj(
-            scope_parent=scope_parent,
-            method_obj=method_obj,
-            parameters=parameters,
-            prev_scope_parent=prev_scope_parent,
-        )
 
-        self.process.push_frame(method_obj.code_context, method_obj)
+        # compiles the lazily compiled body on the first activation
+        code_context = method_obj.code_context.finalize()
+        self.process.push_frame(code_context, method_obj, activation)
 
     def _set_scope_parent_if_not_already_set(self, obj, code):
-        if obj.scope_parent is None:
+        # shared values are used by all interpreters in the process, so they
+        # get the universe only for the lookup, see _scope_parent_of()
+        if obj.scope_parent is None and not obj.is_shared_value:
             obj.scope_parent = self.universe
 
+    def _scope_parent_of(self, obj):
+        scope_parent = obj._scope_parent
+        if scope_parent is None and obj.is_shared_value:
+            return self.universe
+
+        return scope_parent
+
     def _resend_to_parent(self, obj, parent_name, message_name):
-        resend_parent = obj.meta_get_parent(parent_name)
-        if resend_parent is None and obj.scope_parent:
-            resend_parent = obj.scope_parent.meta_get_parent(parent_name)
-        if resend_parent is None and obj.scope_parent.map._parent_slots.has_key("*"):  # TODO: rewrite
-            star_parent = obj.scope_parent.meta_get_parent("*")
-            resend_parent = star_parent.meta_get_parent(parent_name)
+        # activations and parameter objects are chained by scope parents
+        resend_parent = None
+        while obj is not None and resend_parent is None:
+            resend_parent = obj.meta_get_parent(parent_name)
+            obj = obj.scope_parent
 
         if resend_parent is None:
             raise ValueError(
@@ -255,6 +453,39 @@ class Interpreter(ProcessCycler):
 
         return resend_parent.slot_lookup(message_name)
 
+    def _cached_slot_lookup(self, obj, code, symbol, bc_index):
+        inline_cache = code.inline_caches[bc_index]
+        assert inline_cache is not None
+
+        scope_parent = self._scope_parent_of(obj)
+        slot = inline_cache.lookup(obj, scope_parent)
+        if slot is not None:
+            return slot
+
+        # same order as Object.slot_lookup_symbol()
+        obj_map = obj.map
+        slot_index = obj_map._slots.get(symbol, -1)
+        if slot_index != -1:
+            inline_cache.store(obj_map, slot_index)
+            return obj._slot_values[slot_index]
+
+        if scope_parent is not None:
+            slot_index = scope_parent.map._slots.get(symbol, -1)
+            if slot_index != -1:
+                inline_cache.store_scope_parent(obj_map, scope_parent.map,
+                                                slot_index)
+                return scope_parent._slot_values[slot_index]
+
+        parent_lookup = obj.parent_lookup_entry(symbol)
+        if parent_lookup is None:
+            if scope_parent is not obj._scope_parent:
+                return scope_parent.parent_lookup_symbol(symbol)
+
+            return None
+
+        inline_cache.store_parent(obj_map, parent_lookup)
+        return parent_lookup.holder._slot_values[parent_lookup.slot_index]
+
     def _handle_missing_slot(self, obj, code, message_name, bc_index):
         # TODO: rewrite from prints to something more sensible
         # TODO: interpreter error instead of exception
@@ -287,44 +518,73 @@ class Interpreter(ProcessCycler):
         Returns:
             int: Index of next bytecode.
         """
-        boxed_message = self.process.frame.pop()
-        assert isinstance(boxed_message, PrimitiveStrObject)
-        message_name = boxed_message.value  # unpack from StrBox
+        self.process.frame.pop()  # name of the message, see code.symbols
+        return self._send(bc_index, code)
+
+    def _send(self, bc_index, code):
+        symbol = code.symbols[bc_index]
+        assert symbol is not None
+        message_name = symbol.name
 
-        parameters = []
-        number_of_parameters = ord(code.bytecodes[bc_index + 2])
-        if number_of_parameters > 0:
-            for _ in range(number_of_parameters):
-                parameters.append(self.process.frame.pop())
+        frame = self.process.frame
+
+        # parameters stay on the stack until it is known what to do with them
+        number_of_parameters = code.operands_b[bc_index]
+        receiver_depth = number_of_parameters
 
         boxed_resend_parent_name = None
-        message_type = ord(code.bytecodes[bc_index + 1])
+        message_type = code.operands_a[bc_index]
         if message_type == SEND_TYPE_UNARY_RESEND or \
            message_type == SEND_TYPE_KEYWORD_RESEND:
-            boxed_resend_parent_name = self.process.frame.pop()
+            boxed_resend_parent_name = frame.peek(receiver_depth)
             assert isinstance(boxed_resend_parent_name, PrimitiveStrObject)
+            receiver_depth += 1
 
-        obj = self.process.frame.pop()
+        obj = frame.peek(receiver_depth)
         self._set_scope_parent_if_not_already_set(obj, code)
 
         if boxed_resend_parent_name is not None:
             parent_name = boxed_resend_parent_name.value
             slot = self._resend_to_parent(obj, parent_name, message_name)
         else:
-            slot = obj.slot_lookup(message_name)
+            slot = self._cached_slot_lookup(obj, code, symbol, bc_index)
 
         if slot is None:
             return self._handle_missing_slot(obj, code, message_name, bc_index)
 
-        if slot.has_code:
-            self._push_code_obj_for_interpretation(
-                next_bytecode=ord(code.bytecodes[bc_index + 4]),
-                scope_parent=obj,
+        if slot.is_block and slot.get_slot_symbol(symbol) is not slot:
+            # blocks run only when sent `value` & co., otherwise they are data
+            frame.drop(receiver_depth + 1)
+            frame.push(slot)
+
+        elif slot.has_code:
+            activation = self._create_activation_from_stack(
+                obj,
+                slot,
+                number_of_parameters
+            )
+            frame.drop(receiver_depth + 1)
+
+            self._push_activation(
+                next_bytecode=code.opcodes[bc_index + 1],
                 method_obj=slot,
-                parameters=parameters,
+                activation=activation,
             )
 
         elif slot.has_primitive_code:
+            if number_of_parameters != slot.primitive_arity:
+                raise ValueError(
+                    "Primitive `%s` takes %d parameters, %d given!" % (
+                        message_name, slot.primitive_arity, number_of_parameters
+                    )
+                )
+
+            parameters = self._parameters_from_stack(number_of_parameters)
+            frame.drop(receiver_depth + 1)
+
+            if message_type == SEND_TYPE_BINARY:
+                self._quicken(obj, parameters[0], code, message_name, bc_index)
+
             return_value = slot.primitive_code(
                 slot.primitive_code_self,
                 obj,
@@ -335,80 +595,178 @@ class Interpreter(ProcessCycler):
                 self.process.frame.push(return_value)
 
         elif slot.is_assignment_primitive:
-            if len(parameters) != 1:
+            if number_of_parameters != 1:
                 raise ValueError("Too many values to set!")
 
-            assert len(message_name) > 1
-            slot_name = message_name[:-1]
+            value = frame.peek(0)
+            frame.drop(receiver_depth + 1)
+
+            slot_symbol = symbol.assigned_symbol
 
-            assignee = slot.real_parent
-            ret_val = assignee.set_slot(slot_name, parameters[0])
+            # setters are shared by clones, so the target is where it was found
+            assignee = obj.slot_holder_symbol(symbol)
+            if assignee is None and obj.is_shared_value:
+                assignee = self.universe.slot_holder_symbol(symbol)
+            ret_val = assignee.set_slot_symbol(slot_symbol, value)
 
             if not ret_val:
-                raise ValueError("Can't set slot %s" % slot_name)
+                raise ValueError("Can't set slot %s" % slot_symbol.name)
+
+        else:
+            frame.drop(receiver_depth + 1)
+            frame.push(slot)
+
+        return ONE_BYTECODE_LONG
+
+    def _parameters_from_stack(self, number_of_parameters):
+        """
+        Parameters for the primitive. Unary sends share one empty list.
+        """
+        if number_of_parameters == 0:
+            return NO_PARAMETERS
+
+        frame = self.process.frame
+        parameters = [None] * number_of_parameters
+        for i in xrange(number_of_parameters):
+            parameters[i] = frame.peek(i)
+
+        return parameters
+
+    def _quicken(self, obj, parameter, code, message_name, bc_index):
+        if code.inline_caches[bc_index].deoptimized:
+            return
+
+        quick_opcode = quickened_opcode(message_name)
+        if quick_opcode != -1 and can_quicken(obj, parameter):
+            code.opcodes[bc_index] = quick_opcode
+
+    def _do_quick_binary_send(self, bytecode, bc_index, code):
+        """
+        Fast path for binary sends rewritten by :meth:`_quicken`.
+        """
+        self.process.frame.pop()  # name of the message
+        return self._quick_binary_send(bytecode, bc_index, code)
+
+    def _quick_binary_send(self, bytecode, bc_index, code):
+        frame = self.process.frame
+        parameter = frame.pop()
+        obj = frame.pop()
+
+        result = quick_binary_op(bytecode, obj, parameter)
+        if result is not None:
+            frame.push(result)
+            return ONE_BYTECODE_LONG
+
+        # deoptimize; put everything back and do the full send
+        code.opcodes[bc_index] = BYTECODE_SEND
+        code.inline_caches[bc_index].deoptimized = True
+
+        frame.push(obj)
+        frame.push(parameter)
 
+        return self._send(bc_index, code)
+
+    def _str_literal_obj(self, bc_index, code_obj):
+        boxed_literal = code_obj.literals[code_obj.operands_b[bc_index]]
+        assert isinstance(boxed_literal, _ImmutableLiteralBox)
+
+        return boxed_literal.obj
+
+    def _do_send_literal(self, bc_index, code_obj):
+        """
+        Superinstruction for PUSH_LITERAL of the message name and SEND. The
+        name is not pushed at all, the send uses its symbol.
+        """
+        send_index = bc_index + 1
+        send_bytecode = code_obj.opcodes[send_index]
+        if is_quickened(send_bytecode):
+            bc_len = self._quick_binary_send(send_bytecode, send_index, code_obj)
         else:
-            return_value = slot
-            self.process.frame.push(return_value)
+            bc_len = self._send(send_index, code_obj)
+
+        return ONE_BYTECODE_LONG + bc_len
 
-        return THREE_BYTECODES_LONG
+    def _do_self_send(self, bc_index, code_obj):
+        """
+        Superinstruction for PUSH_SELF followed by SEND_LITERAL.
+        """
+        self.process.frame.push(self.process.frame.self)
 
-    # def _do_selfSend(self, bc_index, code_obj, frame):
-    #     pass
+        return ONE_BYTECODE_LONG + self._do_send_literal(bc_index + 1, code_obj)
 
     def _do_push_self(self, bc_index, code_obj):
         self.process.frame.push(self.process.frame.self)
 
         return ONE_BYTECODE_LONG
 
+    def _do_push_receiver(self, bc_index, code_obj):
+        """
+        Explicit `self`; activation records never get to the user code.
+        """
+        obj = self.process.frame.self
+        if obj is not None:
+            obj = self._unwrap_activation(obj)
+
+        self.process.frame.push(obj)
+
+        return ONE_BYTECODE_LONG
+
     def _do_push_literal(self, bc_index, code_obj):
-        literal_type = ord(code_obj.bytecodes[bc_index + 1])
-        literal_index = ord(code_obj.bytecodes[bc_index + 2])
+        self.process.frame.push(self._literal_obj(bc_index, code_obj))
+
+        return ONE_BYTECODE_LONG
+
+    def _literal_obj(self, bc_index, code_obj):
+        literal_type = code_obj.operands_a[bc_index]
+        literal_index = code_obj.operands_b[bc_index]
         boxed_literal = code_obj.literals[literal_index]
 
         if literal_type == LITERAL_TYPE_NIL:
             obj = NIL
         elif literal_type == LITERAL_TYPE_ASSIGNMENT:
             obj = AssignmentPrimitive()
-        elif literal_type == LITERAL_TYPE_INT:
-            assert isinstance(boxed_literal, IntBox)
-            obj = PrimitiveIntObject(boxed_literal.value)
-        elif literal_type == LITERAL_TYPE_FLOAT:
-            assert isinstance(boxed_literal, FloatBox)
-            obj = PrimitiveFloatObject(boxed_literal.value)
-        elif literal_type == LITERAL_TYPE_STR:
-            assert isinstance(boxed_literal, StrBox)
-            obj = PrimitiveStrObject(boxed_literal.value)
+        elif literal_type == LITERAL_TYPE_INT or \
+             literal_type == LITERAL_TYPE_FLOAT or \
+             literal_type == LITERAL_TYPE_STR:
+            assert isinstance(boxed_literal, _ImmutableLiteralBox)
+            obj = boxed_literal.obj
         elif literal_type == LITERAL_TYPE_OBJ:
             assert isinstance(boxed_literal, ObjBox)
             obj = boxed_literal.value.clone()
             if self.process.frame.self is None:
                 self.process.frame.self = obj
         elif literal_type == LITERAL_TYPE_BLOCK:
-            assert isinstance(boxed_literal, ObjBox)
-            block = boxed_literal.value.clone()
-            obj = add_block_trait(block)
-            block.is_block = True
-            block.scope_parent = self.process.frame.pop()
+            assert isinstance(boxed_literal, BlockBox)
+            obj = clone_block(boxed_literal.value, self.process.frame.pop())
         else:
             raise ValueError("Unknown literal type; %s" % literal_type)
 
-        self.process.frame.push(obj)
-
-        return THREE_BYTECODES_LONG
+        return obj
 
     def _do_add_slot(self, bc_index, code_obj):
         value = self.process.frame.pop()
         boxed_slot_name = self.process.frame.pop()
+        self._add_slot(boxed_slot_name, value, code_obj.operands_a[bc_index])
+
+        return ONE_BYTECODE_LONG
+
+    def _do_add_literal_slot(self, bc_index, code_obj):
+        """
+        Superinstruction for PUSH_LITERAL of the slot name, PUSH_LITERAL of
+        the value and ADD_SLOT.
+        """
+        boxed_slot_name = self._str_literal_obj(bc_index, code_obj)
+        value = self._literal_obj(bc_index + 1, code_obj)
+        self._add_slot(boxed_slot_name, value, code_obj.operands_a[bc_index + 2])
+
+        return 3 * ONE_BYTECODE_LONG
+
+    def _add_slot(self, boxed_slot_name, value, slot_type):
         obj = self.process.frame.pop()
 
         assert isinstance(boxed_slot_name, PrimitiveStrObject)
         slot_name = boxed_slot_name.value
 
-        if value.is_assignment_primitive:
-            value.real_parent = obj
-
-        slot_type = ord(code_obj.bytecodes[bc_index + 1])
         if slot_type == SLOT_NORMAL:
             obj.meta_add_slot(slot_name=slot_name, value=value)
         elif slot_type == SLOT_PARENT:
@@ -418,5 +776,3 @@ class Interpreter(ProcessCycler):
 
         # keep the receiver on the top of the stack
         self.process.frame.push(obj)
-
-        return TWO_BYTECODES_LONG
@@ -2,40 +2,148 @@
 from collections import OrderedDict
 
 from rply.token import BaseBox
+from rpython.rlib.objectmodel import compute_identity_hash
+from rpython.rlib.rarithmetic import intmask
 
 from tinySelf.datastructures.arrays import TwoPointerArray
 from tinySelf.datastructures.lightweight_dict import LightWeightDict
-from tinySelf.datastructures.lightweight_dict import LightWeightDictObjects
 
+from tinySelf.vm.symbols import intern_symbol
 
-class CachedSlot(object):
-    def __init__(self, result, visited_objects):
-        self.result = result
-        self.visited_objects = visited_objects
 
+LOOKUP_CACHE_SIZE = 1024  # has to be power of two
+MIN_DEPENDENT_LOOKUPS_LIMIT = 32
 
-class VersionedObject(object):
-    def __init__(self, obj):
-        self.obj = obj
-        self.version = obj.map._version
 
-    def verify(self):
-        return self.obj.map._version == self.version
+class LookupCacheEntry(object):
+    def __init__(self, obj_map, symbol, receiver, holder, slot_index):
+        self.map = obj_map
+        self.symbol = symbol
+
+        self.scope_parent = receiver._scope_parent
+
+        # snapshot of the parents; the receiver copies the list before changing it
+        self.parents = receiver._parent_slot_values
+        receiver._parent_slot_values_shared = True
+
+        self.holder = holder
+        self.slot_index = slot_index
+
+        self.is_valid = True
+
+    def matches(self, obj, symbol):
+        if not self.is_valid or self.map is not obj.map:
+            return False
+
+        if self.symbol is not symbol or self.scope_parent is not obj._scope_parent:
+            return False
+
+        if len(self.parents) != len(obj._parent_slot_values):
+            return False
+
+        for i in xrange(len(self.parents)):
+            if self.parents[i] is not obj._parent_slot_values[i]:
+                return False
+
+        return True
+
+    def invalidate(self):
+        self.is_valid = False
+        self.holder = None
+
+
+class GlobalLookupCache(object):
+    """
+    Cache of parent lookups keyed by (map of the receiver, slot symbol).
+
+    Map alone doesn't describe where the parent lookup goes, so each entry
+    also remembers scope parent and parents of the receiver. Entry is
+    registered at map of each object visited by the lookup and invalidated
+    when version of any of them is incremented.
+
+    Holder of the slot and index of the slot is stored instead of the value,
+    because assignment doesn't change the maps.
+    """
+    def __init__(self, size=LOOKUP_CACHE_SIZE):
+        self._entries = [None] * size
+        self._mask = size - 1
+
+    def _index(self, obj_map, symbol):
+        key_hash = compute_identity_hash(obj_map) ^ symbol.id
+        return intmask(key_hash) & self._mask
+
+    def lookup_entry(self, obj, symbol):
+        entry = self._entries[self._index(obj.map, symbol)]
+        if entry is None or not entry.matches(obj, symbol):
+            return None
+
+        return entry
+
+    def lookup(self, obj, symbol):
+        entry = self.lookup_entry(obj, symbol)
+        if entry is None:
+            return None
+
+        return entry.holder._slot_values[entry.slot_index]
+
+    def lookup_holder(self, obj, symbol):
+        entry = self.lookup_entry(obj, symbol)
+        if entry is None:
+            return None
+
+        return entry.holder
+
+    def store(self, obj, symbol, holder, slot_index, visited_objects):
+        index = self._index(obj.map, symbol)
+
+        old_entry = self._entries[index]
+        if old_entry is not None:
+            old_entry.invalidate()
+
+        entry = LookupCacheEntry(obj.map, symbol, obj, holder, slot_index)
+        for visited_obj in visited_objects:
+            visited_obj.map.add_dependent_lookup(entry)
+
+        self._entries[index] = entry
+
+
+LOOKUP_CACHE = GlobalLookupCache()
 
 
 class _BareObject(object):
+    # values like ints and string literals are shared by many slots at once,
+    # so storing them into a slot can't make the holder their scope
+    is_shared_value = False
+
     def __init__(self, obj_map=None):
         if obj_map is None:
             obj_map = ObjectMap()
 
         self.map = obj_map
-        self.scope_parent = None
+        self._scope_parent = None
 
         self.visited = False
 
         self._parent_slot_values = []
         self._slot_values = []
 
+        # clones share the value lists until one of them writes to it
+        self._slot_values_shared = False
+        self._parent_slot_values_shared = False
+
+    @property
+    def scope_parent(self):
+        return self._scope_parent
+
+    @scope_parent.setter
+    def scope_parent(self, scope_parent):
+        if scope_parent is self._scope_parent:
+            return
+
+        # cached lookups may go through the old scope parent
+        self._scope_parent = scope_parent
+        self.map.invalidate_dependent_lookups()
+
     @property
     def has_code(self):
         return self.map.code_context is not None
@@ -49,16 +157,23 @@ class _BareObject(object):
         return False
 
     def set_slot(self, slot_name, value):
-        slot_index = self.map._slots.get(slot_name, -1)
+        return self.set_slot_symbol(intern_symbol(slot_name), value)
+
+    def set_slot_symbol(self, symbol, value):
+        slot_index = self.map._slots.get(symbol, -1)
 
         if slot_index == -1:
             return False
 
+        self._unshare_slot_values()
         self._slot_values[slot_index] = value
         return True
 
     def get_slot(self, slot_name):
-        slot_index = self.map._slots.get(slot_name, -1)
+        return self.get_slot_symbol(intern_symbol(slot_name))
+
+    def get_slot_symbol(self, symbol):
+        slot_index = self.map._slots.get(symbol, -1)
 
         if slot_index == -1:
             return None
@@ -78,14 +193,51 @@ class _BareObject(object):
         Raises:
             KeyError: If multiple slots are found.
         """
-        result = self._cached_lookup(slot_name)
+        return self.parent_lookup_symbol(intern_symbol(slot_name))
+
+    def parent_lookup_symbol(self, symbol):
+        result = LOOKUP_CACHE.lookup(self, symbol)
         if result is not None:
             return result
 
+        holder = self._find_parent_holder(symbol)
+        if holder is None:
+            return None
+
+        return holder.get_slot_symbol(symbol)
+
+    def parent_lookup_holder_symbol(self, symbol):
+        """
+        Same as :meth:`parent_lookup_symbol`, but returns the object in which
+        the slot was found.
+        """
+        holder = LOOKUP_CACHE.lookup_holder(self, symbol)
+        if holder is not None:
+            return holder
+
+        return self._find_parent_holder(symbol)
+
+    def parent_lookup_entry(self, symbol):
+        """
+        Same as :meth:`parent_lookup_symbol`, but returns the
+        :class:`LookupCacheEntry` describing where the slot was found, so the
+        send sites can keep it.
+        """
+        entry = LOOKUP_CACHE.lookup_entry(self, symbol)
+        if entry is not None:
+            return entry
+
+        if self._find_parent_holder(symbol) is None:
+            return None
+
+        return LOOKUP_CACHE.lookup_entry(self, symbol)
+
+    def _find_parent_holder(self, symbol):
         objects = TwoPointerArray(100)
         objects.append(self)
 
-        result = None
+        holder = None
+        slot_index = -1
         visited_objects = TwoPointerArray(100)
         while len(objects) > 0:
             obj = objects.pop_first()
@@ -96,16 +248,18 @@ class _BareObject(object):
             obj.visited = True
             visited_objects.append(obj)
 
-            slot = obj.get_slot(slot_name)
-            if slot is not None:
-                if result is not None:
-                    raise KeyError("Too many parent slots `%s`, use resend!" % slot_name)
+            index = obj.map._slots.get(symbol, -1)
+            if index != -1:
+                if holder is not None:
+                    raise KeyError("Too many parent slots `%s`, use resend!" % symbol.name)
 
-                result = slot
+                holder = obj
+                slot_index = index
                 continue
 
-            if obj.scope_parent is not None and not obj.scope_parent.visited:
-                objects.append(obj.scope_parent)
+            scope_parent = obj._scope_parent
+            if scope_parent is not None and not scope_parent.visited:
+                objects.append(scope_parent)
 
             # objects.extend(obj._parent_slot_values)
             if len(obj._parent_slot_values) > 0:  # this actually produces faster code
@@ -117,72 +271,10 @@ class _BareObject(object):
         for obj in visited_as_list:
             obj.visited = False
 
-        if result is not None:
-            self._store_to_parent_cache(slot_name, result, visited_as_list)
-
-        return result
-
-    def _store_to_parent_cache(self, slot_name, result, visited_as_list):
-        if self.map._parent_cache is None:
-            self.map._parent_cache = LightWeightDictObjects()
-
-        self.map._parent_cache.set(
-            slot_name,
-            CachedSlot(result, [VersionedObject(x) for x in visited_as_list])
-        )
-
-    def _cached_lookup(self, slot_name):
-        if self.map._parent_cache is None:
-            return None
-
-        cached_result = self.map._parent_cache.get(slot_name)
-        if cached_result is None:
-            return None
-
-        objects = TwoPointerArray(100)
-        visited_objects = TwoPointerArray(100)
-
-        for item in cached_result.visited_objects:
-            if item.verify():
-                item.obj.visited = True
-                visited_objects.append(item.obj)
-            else:
-                item.obj.visited = False
-                objects.append(item.obj)
-
-        if not self.visited:
-            objects.append(self)
-        else:
-            visited_objects.append(self)
-
-        result = cached_result.result
-        while len(objects) > 0:
-            obj = objects.pop_first()
-            visited_objects.append(obj)
-
-            if obj.visited:
-                continue
-
-            obj.visited = True
+        if holder is not None:
+            LOOKUP_CACHE.store(self, symbol, holder, slot_index, visited_as_list)
 
-            if obj.scope_parent is not None and not obj.scope_parent.visited:
-                objects.append(obj.scope_parent)
-
-            # objects_to_visit.extend(obj._parent_slot_values)
-            if len(obj._parent_slot_values) > 0:  # this actually produces faster code
-                for parent in obj._parent_slot_values:
-                    if not parent.visited:
-                        objects.append(parent)
-
-            slot = obj.get_slot(slot_name)
-            if slot is not None:
-                result = slot
-                continue
-
-        for obj in visited_objects.to_list():
-            obj.visited = False
-
-        return result
+        return holder
 
     def slot_lookup(self, slot_name):
         """
@@ -199,47 +291,81 @@ class _BareObject(object):
         """
         assert isinstance(slot_name, str)
 
-        slot_index = self.map._slots.get(slot_name, -1)
+        return self.slot_lookup_symbol(intern_symbol(slot_name))
+
+    def slot_lookup_symbol(self, symbol):
+        slot_index = self.map._slots.get(symbol, -1)
 
         if slot_index != -1:
             return self._slot_values[slot_index]
 
         if self.scope_parent is not None:
-            obj = self.scope_parent.get_slot(slot_name)
+            obj = self.scope_parent.get_slot_symbol(symbol)
 
             if obj is not None:
                 return obj
 
-        return self.parent_lookup(slot_name)
+        return self.parent_lookup_symbol(symbol)
+
+    def slot_holder_symbol(self, symbol):
+        """
+        Find the object which holds the slot, with the same lookup order as
+        :meth:`slot_lookup_symbol`.
+
+        Returns:
+            obj: Holder of the slot, or None.
+        """
+        if self.map._slots.get(symbol, -1) != -1:
+            return self
+
+        scope_parent = self.scope_parent
+        if scope_parent is not None and scope_parent.map._slots.get(symbol, -1) != -1:
+            return scope_parent
+
+        return self.parent_lookup_holder_symbol(symbol)
 
     def clone(self):
         obj = Object(obj_map=self.map)
-        obj._slot_values = self._slot_values[:]
-        obj._parent_slot_values = self._parent_slot_values[:]
-        obj.scope_parent = self.scope_parent
+        obj._slot_values = self._slot_values
+        obj._parent_slot_values = self._parent_slot_values
+        obj._slot_values_shared = True
+        obj._parent_slot_values_shared = True
+        self._slot_values_shared = True
+        self._parent_slot_values_shared = True
+        obj._scope_parent = self._scope_parent
         self.map._used_in_multiple_objects = True
 
         return obj
 
+    def _unshare_slot_values(self):
+        if self._slot_values_shared:
+            self._slot_values = self._slot_values[:]
+            self._slot_values_shared = False
+
+    def _unshare_parent_slot_values(self):
+        if self._parent_slot_values_shared:
+            self._parent_slot_values = self._parent_slot_values[:]
+            self._parent_slot_values_shared = False
+
     def __str__(self):
-        return "Object(%s)" % ", ".join(self.map._slots.keys())
+        return "Object(%s)" % ", ".join(self.slot_keys)
 
 
 class _ObjectWithMapEncapsulation(_BareObject):
     # map encapsulation - lets pretend that map is not present at all
     @property
     def slot_keys(self):
-        return self.map._slots.keys()
+        return [symbol.name for symbol in self.map._slots.keys()]
 
     @property
     def parent_slot_keys(self):
-        return self.map._parent_slots.keys()
+        return [symbol.name for symbol in self.map._parent_slots.keys()]
 
     @property
     def expensive_parent_slots(self):
         return OrderedDict(
-            (key, self._parent_slot_values[self.map._parent_slots[key]])
-            for key in self.parent_slot_keys
+            (symbol.name, self._parent_slot_values[index])
+            for symbol, index in self.map._parent_slots.iteritems()
         )
 
     @property
@@ -275,6 +401,7 @@ class _ObjectWithMapEncapsulation(_BareObject):
 
     @code_context.setter
     def code_context(self, new_code_context):
+        self.map.invalidate_dependent_lookups()
         new_map = self.map.clone()
         new_map.code_context = new_code_context
         self.map = new_map
@@ -287,6 +414,10 @@ class _ObjectWithMapEncapsulation(_BareObject):
     def primitive_code_self(self):
         return self.map.primitive_code_self
 
+    @property
+    def primitive_arity(self):
+        return self.map.primitive_arity
+
     @property
     def has_slots(self):
         return bool(self._slot_values)
@@ -297,8 +428,14 @@ class _ObjectWithMapEncapsulation(_BareObject):
 
     def _clone_map_if_used_by_multiple_objects(self):
         if self.map._used_in_multiple_objects:
+            # lookups through this object were registered at the old map
+            self.map.invalidate_dependent_lookups()
             self.map = self.map.clone()
 
+    def _use_transition_map(self, new_map):
+        self.map.invalidate_dependent_lookups()
+        self.map = new_map
+
 
 class _ObjectWithMetaOperations(_ObjectWithMapEncapsulation):
     def meta_add_slot(self, slot_name, value, check_duplicates=False):
@@ -307,68 +444,90 @@ class _ObjectWithMetaOperations(_ObjectWithMapEncapsulation):
         """
         assert isinstance(value, Object)
 
-        value.scope_parent = self
+        # blocks keep the scope in which they were created
+        if not value.is_block and not value.is_shared_value:
+            value.scope_parent = self
 
-        if self.map._slots.has_key(slot_name):
-            self.set_slot(slot_name, value)
-            self.map._version += 1
+        symbol = intern_symbol(slot_name)
+        if self.map._slots.has_key(symbol):
+            self.set_slot_symbol(symbol, value)
+            self.map.increment_version()
             return
 
-        self._clone_map_if_used_by_multiple_objects()
-
-        if not check_duplicates:
-            self.map.add_slot(slot_name, len(self._slot_values))
+        if not check_duplicates or value not in self._slot_values:
+            slot_index = len(self._slot_values)
+            self._unshare_slot_values()
             self._slot_values.append(value)
+
+            if self.map._used_in_multiple_objects:
+                self._use_transition_map(
+                    self.map.slot_transition(symbol, slot_index)
+                )
+            else:
+                self.map.add_slot(slot_name, slot_index)
+
             return
 
-        if value in self._slot_values:
-            self.map.add_slot(slot_name, self._slot_values.index(value))
-        else:
-            self.map.add_slot(slot_name, len(self._slot_values))
-            self._slot_values.append(value)
+        self._clone_map_if_used_by_multiple_objects()
+        self.map.add_slot(slot_name, self._slot_values.index(value))
 
     def meta_remove_slot(self, slot_name):
-        if not self.map._slots.has_key(slot_name):
+        symbol = intern_symbol(slot_name)
+        if not self.map._slots.has_key(symbol):
             return
 
         self._clone_map_if_used_by_multiple_objects()
 
-        slot_index = self.map._slots[slot_name]
+        slot_index = self.map._slots[symbol]
         self.map.remove_slot(slot_name)
+        self._unshare_slot_values()
         self._slot_values.pop(slot_index)
 
-        for name, reference in self.map._slots.iteritems():
+        for key, reference in self.map._slots.iteritems():
             if reference >= slot_index:
-                self.map._slots[name] -= 1
+                self.map._slots[key] -= 1
 
     def meta_insert_slot(self, slot_index, slot_name, value):  # TODO: wtf?
-        if self.map._slots.has_key(slot_name):
-            self.set_slot(slot_name, value)
-            self.map._version += 1
+        symbol = intern_symbol(slot_name)
+        if self.map._slots.has_key(symbol):
+            self.set_slot_symbol(symbol, value)
+            self.map.increment_version()
             return
 
         self._clone_map_if_used_by_multiple_objects()
 
         self.map.insert_slot(slot_index, slot_name, len(self._slot_values))
 
+        self._unshare_slot_values()
         self._slot_values.append(value)
 
     def meta_add_parent(self, parent_name, value):
         assert isinstance(value, Object)
 
-        if self.map._parent_slots.has_key(parent_name):
-            index = self.map._parent_slots[parent_name]
+        symbol = intern_symbol(parent_name)
+        if self.map._parent_slots.has_key(symbol):
+            index = self.map._parent_slots[symbol]
+            if self._parent_slot_values[index] is value:
+                return
+
+            self._unshare_parent_slot_values()
             self._parent_slot_values[index] = value
-            self.map._version += 1
+            self.map.increment_version()
             return
 
-        self._clone_map_if_used_by_multiple_objects()
-
-        self.map.add_parent(parent_name, len(self._parent_slot_values))
+        parent_index = len(self._parent_slot_values)
+        self._unshare_parent_slot_values()
         self._parent_slot_values.append(value)
 
+        if self.map._used_in_multiple_objects:
+            self._use_transition_map(
+                self.map.parent_transition(symbol, parent_index)
+            )
+        else:
+            self.map.add_parent(parent_name, parent_index)
+
     def meta_get_parent(self, parent_name, alt=None):
-        index = self.map._parent_slots.get(parent_name, -1)
+        index = self.map._parent_slots.get(intern_symbol(parent_name), -1)
 
         if index == -1:
             return alt
@@ -376,18 +535,20 @@ class _ObjectWithMetaOperations(_ObjectWithMapEncapsulation):
         return self._parent_slot_values[index]
 
     def meta_remove_parent(self, parent_name):
-        if not self.map._parent_slots.has_key(parent_name):
+        symbol = intern_symbol(parent_name)
+        if not self.map._parent_slots.has_key(symbol):
             return
 
         self._clone_map_if_used_by_multiple_objects()
 
-        parent_index = self.map._parent_slots[parent_name]
+        parent_index = self.map._parent_slots[symbol]
         self.map.remove_parent(parent_name)
+        self._unshare_parent_slot_values()
         self._parent_slot_values.pop(parent_index)
 
-        for name, reference in self.map._parent_slots.iteritems():
+        for key, reference in self.map._parent_slots.iteritems():
             if reference >= parent_index:
-                self.map._parent_slots[name] -= 1
+                self.map._parent_slots[key] -= 1
 
     def meta_set_parameters(self, parameters):
         self._clone_map_if_used_by_multiple_objects()
@@ -408,13 +569,25 @@ class Object(_ObjectWithMetaOperations):
 
 
 class ObjectMap(object):
+    """
+    Slots and parents are stored under the interned symbols of their names,
+    see :mod:`tinySelf.vm.symbols`.
+
+    Map used by multiple objects is never changed when one of them gets a new
+    slot or parent. The object moves to the successor map from the transition
+    tree instead, so objects cloned from the same prototype and extended the
+    same way keep sharing their maps.
+    """
     def __init__(self):
         self._slots = LightWeightDict()
         self._parent_slots = LightWeightDict()
         self._used_in_multiple_objects = False
 
         self._version = 0
-        self._parent_cache = None
+        self._slot_transitions = None
+        self._parent_transitions = None
+        self._dependent_lookups = None
+        self._dependent_lookups_limit = MIN_DEPENDENT_LOOKUPS_LIMIT
 
         self.is_block = False
 
@@ -422,6 +595,7 @@ class ObjectMap(object):
         self.code_context = None
         self.primitive_code = None
         self.primitive_code_self = None
+        self.primitive_arity = 0
 
         self.parameters = []
 
@@ -436,13 +610,79 @@ class ObjectMap(object):
         new_map.parameters = self.parameters[:]
 
         new_map._version = self._version
-        if self._parent_cache is not None:
-            new_map._parent_cache = self._parent_cache.copy()
 
         if self.code_context is not None:
             new_map.code_context = self.code_context #.clone()
 
         new_map.primitive_code = self.primitive_code
+        new_map.primitive_arity = self.primitive_arity
+
+        return new_map
+
+    def increment_version(self):
+        self._version += 1
+        self.invalidate_dependent_lookups()
+
+    def add_dependent_lookup(self, lookup_cache_entry):
+        if self._dependent_lookups is None:
+            self._dependent_lookups = []
+
+        # entries evicted from the cache stay here until the map changes,
+        # so throw them away from time to time for maps which never change
+        if len(self._dependent_lookups) >= self._dependent_lookups_limit:
+            self._dependent_lookups = [
+                entry for entry in self._dependent_lookups if entry.is_valid
+            ]
+            self._dependent_lookups_limit = max(
+                MIN_DEPENDENT_LOOKUPS_LIMIT,
+                2 * len(self._dependent_lookups)
+            )
+
+        self._dependent_lookups.append(lookup_cache_entry)
+
+    def invalidate_dependent_lookups(self):
+        if self._dependent_lookups is None:
+            return
+
+        for lookup_cache_entry in self._dependent_lookups:
+            lookup_cache_entry.invalidate()
+
+        self._dependent_lookups = None
+
+    def slot_transition(self, symbol, index):
+        """
+        Args:
+            symbol (obj): :class:`Symbol` of the new slot.
+            index (int): Index of the value of the new slot.
+
+        Returns:
+            obj: Shared successor map with the slot added.
+        """
+        if self._slot_transitions is None:
+            self._slot_transitions = {}
+
+        new_map = self._slot_transitions.get(symbol, None)
+        if new_map is None or new_map._slots.get(symbol, -1) != index:
+            new_map = self.clone()
+            new_map._slots[symbol] = index
+            new_map._used_in_multiple_objects = True
+            self._slot_transitions[symbol] = new_map
+
+        return new_map
+
+    def parent_transition(self, symbol, index):
+        """
+        Same as :meth:`slot_transition`, just for parent slots.
+        """
+        if self._parent_transitions is None:
+            self._parent_transitions = {}
+
+        new_map = self._parent_transitions.get(symbol, None)
+        if new_map is None or new_map._parent_slots.get(symbol, -1) != index:
+            new_map = self.clone()
+            new_map._parent_slots[symbol] = index
+            new_map._used_in_multiple_objects = True
+            self._parent_transitions[symbol] = new_map
 
         return new_map
 
@@ -450,15 +690,16 @@ class ObjectMap(object):
     def add_slot(self, slot_name, index):
         assert isinstance(index, int)
 
-        self._slots[slot_name] = index
-        self._version += 1
+        self._slots[intern_symbol(slot_name)] = index
+        self.increment_version()
 
     def remove_slot(self, slot_name):
-        if slot_name not in self._slots:
+        symbol = intern_symbol(slot_name)
+        if symbol not in self._slots:
             return False
 
-        del self._slots[slot_name]
-        self._version += 1
+        del self._slots[symbol]
+        self.increment_version()
 
         return True
 
@@ -472,24 +713,25 @@ class ObjectMap(object):
         new_slots = LightWeightDict()
         for cnt, key in enumerate(self._slots.keys()):
             if cnt == slot_index:
-                new_slots[slot_name] = index
+                new_slots[intern_symbol(slot_name)] = index
 
             new_slots[key] = self._slots[key]
 
         self._slots = new_slots
-        self._version += 1
+        self.increment_version()
 
     def add_parent(self, parent_name, index):
         assert isinstance(index, int)
 
-        self._parent_slots[parent_name] = index
-        self._version += 1
+        self._parent_slots[intern_symbol(parent_name)] = index
+        self.increment_version()
 
     def remove_parent(self, parent_name):
-        if not self._parent_slots.has_key(parent_name):
+        symbol = intern_symbol(parent_name)
+        if not self._parent_slots.has_key(symbol):
             return False
 
-        del self._parent_slots[parent_name]
-        self._version += 1
+        del self._parent_slots[symbol]
+        self.increment_version()
 
         return True
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 from tinySelf.vm.object_layout import Object
+from tinySelf.vm.symbols import intern_symbol
 
 from tinySelf.vm.primitives.mirror import Mirror
 
 from tinySelf.vm.primitives.primitive_int import PrimitiveIntObject
+from tinySelf.vm.primitives.primitive_int import get_primitive_int
 from tinySelf.vm.primitives.primitive_str import PrimitiveStrObject
 from tinySelf.vm.primitives.primitive_float import PrimitiveFloatObject
 
@@ -21,10 +23,6 @@ from tinySelf.vm.primitives.primitive_time import get_primitive_time_object
 
 
 class AssignmentPrimitive(Object):
-    def __init__(self, real_parent=None):
-        Object.__init__(self)
-        self.real_parent = real_parent
-
     @property
     def is_assignment_primitive(self):
         return True
@@ -48,28 +46,27 @@ class BlockTrait(Object):
 _USER_EDITABLE_BLOCK_TRAIT = BlockTrait()
 
 
+_BLOCK_VALUE_SELECTORS = [
+    "value",
+    "with:",
+    "with:With:",
+    "with:With:With:",
+    "with:With:With:With:",
+    "withAll:",
+]
+
+
 def _print_block_source(context, block_obj, parameters):
-    ast = block_obj.get_slot("value").ast
-    return PrimitiveStrObject(ast.source_pos.source_snippet)
+    return PrimitiveStrObject(block_obj.ast.source_pos.source_snippet)
 
 
 def _get_lineno(context, block_obj, parameters):
-    ast = block_obj.get_slot("value").ast
-    return PrimitiveIntObject(ast.source_pos.start_line)
+    return get_primitive_int(block_obj.ast.source_pos.start_line)
 
 
-def _create_block_trait_prototype():
+def _create_block_trait():
     obj = Object()
 
-    placer = PrimitiveNilObject()
-
-    obj.meta_add_slot("value", placer, check_duplicates=True)
-    obj.meta_add_slot("with:", placer, check_duplicates=True)
-    obj.meta_add_slot("with:With:", placer, check_duplicates=True)
-    obj.meta_add_slot("with:With:With:", placer, check_duplicates=True)
-    obj.meta_add_slot("with:With:With:With:", placer, check_duplicates=True)
-    obj.meta_add_slot("withAll:", placer, check_duplicates=True)
-
     add_primitive_fn(obj, "asString", _print_block_source, [])
     add_primitive_fn(obj, "getLineNumber", _get_lineno, [])
 
@@ -78,12 +75,42 @@ def _create_block_trait_prototype():
     return obj
 
 
-_BLOCK_TRAIT_PROTOTYPE = _create_block_trait_prototype()
+_BLOCK_TRAIT = _create_block_trait()
+_VALUE_SYMBOL = intern_symbol("value")
 
 
 def add_block_trait(block):
-    obj = _BLOCK_TRAIT_PROTOTYPE.clone()
-    obj.set_slot("value", block)
+    """
+    Turn the prototype of the block literal into the block object. All `value`
+    slots share one index and the block trait is added as a parent, so the
+    blocks cloned from the prototype share the map and only have to store
+    themselves into the `value` slot.
+
+    Args:
+        block (obj): Prototype of the block literal.
+    """
+    placer = PrimitiveNilObject()
+    for selector in _BLOCK_VALUE_SELECTORS:
+        block.meta_add_slot(selector, placer, check_duplicates=True)
+
+    block.meta_add_parent("block_trait", _BLOCK_TRAIT)
+    block.is_block = True
+
+
+def clone_block(block, scope_parent):
+    """
+    Args:
+        block (obj): Prototype prepared by :func:`add_block_trait`.
+        scope_parent (obj): Scope in which the block was created.
+
+    Returns:
+        obj: New block object.
+    """
+    obj = block.clone()
+    obj.set_slot_symbol(_VALUE_SYMBOL, obj)
+
+    # new object, so there are no cached lookups going through it yet
+    obj._scope_parent = scope_parent
 
     return obj
 
@@ -13,7 +13,15 @@ class ObjCache(object):
     def __init__(self):
         self.map = None
         self.slots = None
+        self.version = 0
 
     def store(self, obj):
         self.map = obj.map
         self.slots = obj._slot_values
+        self.version = obj.map._version
+
+    def has_pristine_map(self, obj):
+        """
+        Check that `obj` uses the cached map and that nobody changed it since.
+        """
+        return obj.map is self.map and self.map._version == self.version
@@ -1,14 +1,14 @@
 # -*- coding: utf-8 -*-
 from tinySelf.vm.primitives import PrimitiveStrObject
-from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.primitives import get_primitive_int
 from tinySelf.vm.primitives import PrimitiveNilObject
+from tinySelf.vm.primitives.primitive_time import timestamp
+from tinySelf.vm.primitives.primitive_float import _NumberObject
 from tinySelf.vm.primitives.add_primitive_fn import add_primitive_method
 
 from tinySelf.vm.object_layout import Object
 
-from tinySelf.vm.code_context import CodeContext
-
-from tinySelf.parser import lex_and_parse_as_root
+from tinySelf.vm.bytecode_cache import load_code
 
 
 NIL = PrimitiveNilObject()
@@ -33,11 +33,11 @@ class ErrorObject(Object):
 
 
 def _get_number_of_processes(interpreter, _, parameters):
-    return PrimitiveIntObject(len(interpreter.processes))
+    return get_primitive_int(interpreter.number_of_processes())
 
 
 def _get_number_of_stack_frames(interpreter, _, parameters):
-    return PrimitiveIntObject(interpreter.process._length)
+    return get_primitive_int(interpreter.process._length)
 
 
 def _set_error_handler(interpreter, _, parameters):
@@ -100,7 +100,7 @@ def _restore_process(interpreter, _, parameters):
     if not isinstance(obj, ErrorObject):
         raise ValueError("This is not instance of error object!")
 
-    obj.process_stack.push_frame(CodeContext(), NIL)  # it is immediatelly poped anyway
+    obj.process_stack.frame.push(NIL)  # result of the failed send
     interpreter.restore_process(obj.process_stack)
 
     return None
@@ -127,14 +127,15 @@ def _raise_error(interpreter, _, parameters):
     if error_handler is None:
         raise ValueError("Error handler must react to with:With: message!")
 
-    error_handler.scope_parent = interpreter._create_intermediate_params_obj(
-        error_handler.scope_parent,
+    activation = interpreter._create_activation(
+        error_handler,
         error_handler,
         [msg, ErrorObject(msg, process)]  # process is passed to the error_handler
     )
 
     process = interpreter.add_process(error_handler.code_context)
-    process.frame.self = error_handler.scope_parent
+    process.frame.self = activation
+    process.frame.method_obj = error_handler
 
     return None
 
@@ -160,14 +161,10 @@ def _run_script(interpreter, scope_parent, parameters):
             [PrimitiveStrObject("runScript: %s" % str(e))]
         )
 
-    ast_root = lex_and_parse_as_root(source)
-
-    if not ast_root.ast:
+    code = load_code(source, path.value)
+    if not code.bytecodes:
         return
 
-    code = ast_root.compile(CodeContext())
-    code.finalize()
-
     method_obj = Object()
     method_obj.code_context = code
 
@@ -179,6 +176,25 @@ def _run_script(interpreter, scope_parent, parameters):
     )
 
 
+def _sleep(interpreter, scope_parent, parameters):
+    seconds = parameters[0]
+    assert isinstance(seconds, Object)
+
+    if not isinstance(seconds, _NumberObject):
+        return _raise_error(
+            interpreter,
+            scope_parent,
+            [PrimitiveStrObject("sleep: number of seconds expected")]
+        )
+
+    # the process is switched out after this send, other processes run
+    # until it wakes up
+    interpreter.sleep_process(interpreter.process,
+                              timestamp() + seconds.float_value)
+
+    return NIL
+
+
 def gen_interpreter_primitives(interpreter):
     interpreter_namespace = Object()
 
@@ -198,5 +214,7 @@ def gen_interpreter_primitives(interpreter):
                          _restore_process_with, ["msg", "err_obj"])
     add_primitive_method(interpreter, interpreter_namespace, "runScript:",
                          _run_script, ["path"])
+    add_primitive_method(interpreter, interpreter_namespace, "sleep:",
+                         _sleep, ["seconds"])
 
     return interpreter_namespace
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Non-blocking I/O on the file descriptors.
+
+All descriptors are switched to the non-blocking mode. When the operation
+would block, only the calling process is blocked and the scheduler completes
+the operation and wakes the process, once the descriptor is ready.
+
+Descriptors not opened here (stdin, stdout and the inherited ones) are left
+in the blocking mode, as they are shared with other programs. Operations on
+them are attempted only when poll() says they are ready.
+"""
+import os
+import errno
+
+from rpython.rlib import rpoll
+from rpython.rlib import rposix
+from rpython.rlib import rsocket
+
+from tinySelf.vm.object_layout import Object
+
+from tinySelf.vm.frames import IOWaiter
+
+from tinySelf.vm.primitives.primitive_int import PrimitiveIntObject
+from tinySelf.vm.primitives.primitive_int import get_primitive_int
+from tinySelf.vm.primitives.primitive_str import PrimitiveStrObject
+from tinySelf.vm.primitives.primitive_nil import PrimitiveNilObject
+from tinySelf.vm.primitives.add_primitive_fn import add_primitive_method
+from tinySelf.vm.primitives.interpreter_primitives import _raise_error
+
+
+NIL = PrimitiveNilObject()
+
+# writes of up to PIPE_BUF bytes (at least 512 by POSIX) don't block once
+# poll() reports the descriptor as writable
+BLOCKING_WRITE_SIZE = 512
+
+
+class IOFailure(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+def _would_block(error_number):
+    return error_number == errno.EAGAIN or error_number == errno.EWOULDBLOCK
+
+
+def _set_nonblocking(fd):
+    flags = rposix.get_status_flags(fd)
+    rposix.set_status_flags(fd, flags | os.O_NONBLOCK)
+
+
+def _is_blocking(fd):
+    try:
+        return (rposix.get_status_flags(fd) & os.O_NONBLOCK) == 0
+    except OSError:
+        return False  # invalid descriptor, the operation reports the error
+
+
+def _is_ready(fd, events):
+    try:
+        return len(rpoll.poll({fd: events}, 0)) != 0
+    except rpoll.PollError:
+        return False
+
+
+class _PendingIO(IOWaiter):
+    """
+    Subclasses define `.attempt()`, which returns the result of the
+    operation, or None if it would block, and raises :class:`IOFailure`
+    when the operation failed.
+    """
+    def is_ready(self):
+        return _is_ready(self.fd, self.events)
+
+    def complete(self, interpreter):
+        try:
+            result = self.attempt()
+        except IOFailure as e:
+            # raise the error as if it happened in the send of the process
+            interpreter.process = self.process
+            _error(interpreter, None, e.message)
+            return True
+
+        if result is None:
+            return False
+
+        self.process.frame.push(result)
+        interpreter.wake_process(self.process)
+
+        return True
+
+
+class _PendingRead(_PendingIO):
+    def __init__(self, process, fd, size):
+        _PendingIO.__init__(self, process, fd, rpoll.POLLIN)
+        self.size = size
+
+    def attempt(self):
+        try:
+            data = os.read(self.fd, self.size)
+        except OSError as e:
+            if _would_block(e.errno):
+                return None
+
+            raise IOFailure("read: %s" % os.strerror(e.errno))
+
+        return PrimitiveStrObject(data)
+
+
+class _PendingWrite(_PendingIO):
+    def __init__(self, process, fd, data):
+        _PendingIO.__init__(self, process, fd, rpoll.POLLOUT)
+        self.data = data
+        self.blocking = _is_blocking(fd)
+
+    def attempt(self):
+        data = self.data
+        if self.blocking and len(data) > BLOCKING_WRITE_SIZE:
+            data = data[:BLOCKING_WRITE_SIZE]
+
+        try:
+            written = os.write(self.fd, data)
+        except OSError as e:
+            if _would_block(e.errno):
+                return None
+
+            raise IOFailure("write: %s" % os.strerror(e.errno))
+
+        return get_primitive_int(written)
+
+
+class _PendingAccept(_PendingIO):
+    def __init__(self, process, fd):
+        _PendingIO.__init__(self, process, fd, rpoll.POLLIN)
+
+    def attempt(self):
+        server = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM,
+                                 fd=self.fd)
+        try:
+            fd, _ = server.accept()
+        except rsocket.SocketError as e:
+            if isinstance(e, rsocket.CSocketError) and _would_block(e.errno):
+                return None
+
+            raise IOFailure("accept: %s" % e.get_msg())
+        finally:
+            server.detach()
+
+        _set_nonblocking(fd)
+        return get_primitive_int(fd)
+
+
+def _error(interpreter, scope_parent, message):
+    return _raise_error(interpreter, scope_parent, [PrimitiveStrObject(message)])
+
+
+def _start(interpreter, scope_parent, operation):
+    # the descriptor may be in the blocking mode, see the top of the file
+    if not operation.is_ready():
+        interpreter.wait_for_io(operation)
+        return None
+
+    try:
+        result = operation.attempt()
+    except IOFailure as e:
+        return _error(interpreter, scope_parent, e.message)
+
+    if result is None:
+        interpreter.wait_for_io(operation)
+
+    return result
+
+
+def _open_flags(mode):
+    if mode == "r":
+        return os.O_RDONLY
+    elif mode == "w":
+        return os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    elif mode == "a":
+        return os.O_WRONLY | os.O_CREAT | os.O_APPEND
+    elif mode == "rw":
+        return os.O_RDWR | os.O_CREAT
+
+    return -1
+
+
+def _open(interpreter, scope_parent, parameters):
+    path = parameters[0]
+    mode = parameters[1]
+    if not isinstance(path, PrimitiveStrObject) or \
+       not isinstance(mode, PrimitiveStrObject):
+        return _error(interpreter, scope_parent, "open:Mode: str parameters expected")
+
+    flags = _open_flags(mode.value)
+    if flags == -1:
+        return _error(interpreter, scope_parent,
+                      "open:Mode: unknown mode `%s`" % mode.value)
+
+    try:
+        fd = os.open(path.value, flags | os.O_NONBLOCK, 0666)
+    except OSError as e:
+        return _error(interpreter, scope_parent,
+                      "open:Mode: %s" % os.strerror(e.errno))
+
+    return get_primitive_int(fd)
+
+
+def _read(interpreter, scope_parent, parameters):
+    fd = parameters[0]
+    size = parameters[1]
+    if not isinstance(fd, PrimitiveIntObject) or \
+       not isinstance(size, PrimitiveIntObject):
+        return _error(interpreter, scope_parent, "read:Size: int parameters expected")
+
+    return _start(interpreter, scope_parent,
+                  _PendingRead(interpreter.process, fd.value, size.value))
+
+
+def _write(interpreter, scope_parent, parameters):
+    fd = parameters[0]
+    data = parameters[1]
+    if not isinstance(fd, PrimitiveIntObject) or \
+       not isinstance(data, PrimitiveStrObject):
+        return _error(interpreter, scope_parent,
+                      "write:Data: int and str parameters expected")
+
+    return _start(interpreter, scope_parent,
+                  _PendingWrite(interpreter.process, fd.value, data.value))
+
+
+def _close(interpreter, scope_parent, parameters):
+    fd = parameters[0]
+    if not isinstance(fd, PrimitiveIntObject):
+        return _error(interpreter, scope_parent, "close: int parameter expected")
+
+    try:
+        os.close(fd.value)
+    except OSError as e:
+        return _error(interpreter, scope_parent, "close: %s" % os.strerror(e.errno))
+
+    return NIL
+
+
+def _fd_pair(first_name, first_fd, second_name, second_fd):
+    _set_nonblocking(first_fd)
+    _set_nonblocking(second_fd)
+
+    pair = Object()
+    pair.meta_add_slot(first_name, get_primitive_int(first_fd))
+    pair.meta_add_slot(second_name, get_primitive_int(second_fd))
+
+    return pair
+
+
+def _pipe(interpreter, scope_parent, parameters):
+    try:
+        read_fd, write_fd = os.pipe()
+    except OSError as e:
+        return _error(interpreter, scope_parent, "pipe: %s" % os.strerror(e.errno))
+
+    return _fd_pair("readEnd", read_fd, "writeEnd", write_fd)
+
+
+def _socket_pair(interpreter, scope_parent, parameters):
+    try:
+        first, second = rsocket.socketpair(rsocket.AF_UNIX)
+    except rsocket.SocketError as e:
+        return _error(interpreter, scope_parent, "socketPair: %s" % e.get_msg())
+
+    return _fd_pair("first", first.detach(), "second", second.detach())
+
+
+def _listen_on(interpreter, scope_parent, parameters):
+    path = parameters[0]
+    if not isinstance(path, PrimitiveStrObject):
+        return _error(interpreter, scope_parent, "listenOn: str parameter expected")
+
+    server = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+    try:
+        server.bind(rsocket.UNIXAddress(path.value))
+        server.listen(128)
+    except rsocket.SocketError as e:
+        server.close()
+        return _error(interpreter, scope_parent, "listenOn: %s" % e.get_msg())
+
+    fd = server.detach()
+    _set_nonblocking(fd)
+
+    return get_primitive_int(fd)
+
+
+def _accept(interpreter, scope_parent, parameters):
+    fd = parameters[0]
+    if not isinstance(fd, PrimitiveIntObject):
+        return _error(interpreter, scope_parent, "accept: int parameter expected")
+
+    return _start(interpreter, scope_parent,
+                  _PendingAccept(interpreter.process, fd.value))
+
+
+def _connect_to(interpreter, scope_parent, parameters):
+    path = parameters[0]
+    if not isinstance(path, PrimitiveStrObject):
+        return _error(interpreter, scope_parent, "connectTo: str parameter expected")
+
+    # connecting to the local socket doesn't wait for the other side
+    client = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+    try:
+        client.connect(rsocket.UNIXAddress(path.value))
+    except rsocket.SocketError as e:
+        client.close()
+        return _error(interpreter, scope_parent, "connectTo: %s" % e.get_msg())
+
+    fd = client.detach()
+    _set_nonblocking(fd)
+
+    return get_primitive_int(fd)
+
+
+def gen_io_primitives(interpreter):
+    io_namespace = Object()
+
+    add_primitive_method(interpreter, io_namespace, "open:Mode:",
+                         _open, ["path", "mode"])
+    add_primitive_method(interpreter, io_namespace, "read:Size:",
+                         _read, ["fd", "size"])
+    add_primitive_method(interpreter, io_namespace, "write:Data:",
+                         _write, ["fd", "data"])
+    add_primitive_method(interpreter, io_namespace, "close:",
+                         _close, ["fd"])
+    add_primitive_method(interpreter, io_namespace, "pipe",
+                         _pipe, [])
+    add_primitive_method(interpreter, io_namespace, "socketPair",
+                         _socket_pair, [])
+    add_primitive_method(interpreter, io_namespace, "listenOn:",
+                         _listen_on, ["path"])
+    add_primitive_method(interpreter, io_namespace, "accept:",
+                         _accept, ["fd"])
+    add_primitive_method(interpreter, io_namespace, "connectTo:",
+                         _connect_to, ["path"])
+
+    return io_namespace
@@ -10,6 +10,8 @@ from tinySelf.vm.primitives.add_primitive_fn import add_primitive_fn
 
 class _NumberObject(Object):
     _immutable_fields_ = ["value"]
+    is_shared_value = True
+
     def __init__(self, obj_map=None):
         Object.__init__(self, obj_map)
 
@@ -138,10 +140,10 @@ def as_string(_, self, parameters):
 
 
 def as_int(_, self, parameters):
-    from tinySelf.vm.primitives.primitive_int import PrimitiveIntObject
+    from tinySelf.vm.primitives.primitive_int import get_primitive_int
 
     assert isinstance(self, PrimitiveFloatObject)
-    return PrimitiveIntObject(int(self.value))
+    return get_primitive_int(int(self.value))
 
 
 class PrimitiveFloatObject(_NumberObject):
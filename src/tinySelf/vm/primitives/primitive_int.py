@@ -8,6 +8,10 @@ from tinySelf.vm.primitives.primitive_float import PrimitiveFloatObject
 from tinySelf.vm.primitives.add_primitive_fn import add_primitive_fn
 
 
+SMALL_INT_MIN = -5
+SMALL_INT_MAX = 1024
+
+
 def add(_, self, parameters):
     obj = parameters[0]
     # yeah, this can't be factored out, I've tried..
@@ -114,6 +118,42 @@ def as_float(_, self, parameters):
     return PrimitiveFloatObject(float(self.value))
 
 
+class _SmallIntCache(object):
+    """
+    Ints from the SMALL_INT_MIN - SMALL_INT_MAX range are shared, so the
+    common arithmetic doesn't allocate new object for each result. This works,
+    because the int objects are immutable.
+    """
+    def __init__(self):
+        self.ints = [None] * (SMALL_INT_MAX - SMALL_INT_MIN + 1)
+
+    def get(self, value):
+        index = value - SMALL_INT_MIN
+        obj = self.ints[index]
+        if obj is None:
+            obj = PrimitiveIntObject(value)
+            self.ints[index] = obj
+
+        return obj
+
+
+_SMALL_INT_CACHE = _SmallIntCache()
+
+
+def get_primitive_int(value):
+    """
+    Args:
+        value (int): Value of the int object.
+
+    Returns:
+        obj: Shared PrimitiveIntObject for small ints, new one for others.
+    """
+    if SMALL_INT_MIN <= value <= SMALL_INT_MAX:
+        return _SMALL_INT_CACHE.get(value)
+
+    return PrimitiveIntObject(value)
+
+
 class PrimitiveIntObject(_NumberObject):
     _OBJ_CACHE = ObjCache()
     _immutable_fields_ = ["value"]
@@ -148,7 +188,7 @@ class PrimitiveIntObject(_NumberObject):
         return float(self.value)
 
     def result_type(self, val):
-        return PrimitiveIntObject(val)
+        return get_primitive_int(val)
 
     def __eq__(self, obj):
         if not hasattr(obj, "value"):
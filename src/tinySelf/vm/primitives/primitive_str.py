@@ -31,6 +31,8 @@ def print_string(_, self, parameters):
 class PrimitiveStrObject(Object):
     _OBJ_CACHE = ObjCache()
     _immutable_fields_ = ["value"]
+    is_shared_value = True
+
     def __init__(self, value, obj_map=None):
         Object.__init__(self, PrimitiveStrObject._OBJ_CACHE.map)
 
@@ -6,8 +6,15 @@ from tinySelf.vm.primitives.add_primitive_fn import add_primitive_fn
 from tinySelf.vm.primitives.primitive_float import PrimitiveFloatObject
 
 
+def timestamp():
+    """
+    Clock shared by the `primitives time timestamp` and the process scheduler.
+    """
+    return time.time()
+
+
 def get_timestamp(context, time_obj, parameters):
-    return PrimitiveFloatObject(time.time())
+    return PrimitiveFloatObject(timestamp())
 
 
 def get_primitive_time_object():
@@ -0,0 +1,608 @@
+# -*- coding: utf-8 -*-
+"""
+Shared-nothing workers running in separate OS processes.
+
+Each worker is a forked process with its own universe, bootstrapped by the
+`virtual_machine()` from the same stdlib as the parent. The parent and the
+worker exchange values through the channel, which is a socket pair with the
+length-prefixed frames of the serialized values. Sending and receiving use
+the non-blocking I/O, so they only block the calling process. Waiting for the
+exit of the worker only blocks the calling process, too.
+
+Worker pool is a group of the workers running the same source, which
+dispatches the sent values to the workers round-robin.
+"""
+import os
+
+from rpython.rlib import rpoll
+from rpython.rlib import rsocket
+from rpython.rlib.rarithmetic import string_to_int
+from rpython.rlib.rstring import ParseStringError
+from rpython.rlib.rfloat import formatd
+from rpython.rlib.rfloat import string_to_float
+
+from tinySelf.r_io import ewriteln
+from tinySelf.vm.frames import VM_STATE
+from tinySelf.vm.frames import ConditionWaiter
+from tinySelf.vm.object_layout import Object
+
+from tinySelf.vm.primitives.primitive_int import PrimitiveIntObject
+from tinySelf.vm.primitives.primitive_int import get_primitive_int
+from tinySelf.vm.primitives.primitive_str import PrimitiveStrObject
+from tinySelf.vm.primitives.primitive_nil import PrimitiveNilObject
+from tinySelf.vm.primitives.primitive_true import PrimitiveTrueObject
+from tinySelf.vm.primitives.primitive_false import PrimitiveFalseObject
+from tinySelf.vm.primitives.primitive_float import PrimitiveFloatObject
+from tinySelf.vm.primitives.add_primitive_fn import add_primitive_method
+from tinySelf.vm.primitives.io_primitives import IOFailure
+from tinySelf.vm.primitives.io_primitives import _PendingIO
+from tinySelf.vm.primitives.io_primitives import _set_nonblocking
+from tinySelf.vm.primitives.io_primitives import _would_block
+from tinySelf.vm.primitives.io_primitives import _error
+from tinySelf.vm.primitives.io_primitives import _start
+
+
+NIL = PrimitiveNilObject()
+
+FRAME_HEADER_SIZE = 5
+READ_CHUNK_SIZE = 4096
+
+VALUE_NIL = "n"
+VALUE_TRUE = "t"
+VALUE_FALSE = "f"
+VALUE_INT = "i"
+VALUE_FLOAT = "d"
+VALUE_STR = "s"
+
+
+def _encode_length(length):
+    return "".join([chr((length >> shift) & 0xff) for shift in (24, 16, 8, 0)])
+
+
+def _decode_length(data, start):
+    length = 0
+    for i in range(4):
+        length = (length << 8) | ord(data[start + i])
+
+    return length
+
+
+def serialize_value(obj):
+    """
+    Args:
+        obj (obj): nil, true, false, int, float or str.
+
+    Returns:
+        str: Frame with the type, length and the payload of the value, or
+             empty string if the `obj` can't be sent between the workers.
+    """
+    if obj is NIL:
+        kind, payload = VALUE_NIL, ""
+    elif obj is PrimitiveTrueObject():
+        kind, payload = VALUE_TRUE, ""
+    elif obj is PrimitiveFalseObject():
+        kind, payload = VALUE_FALSE, ""
+    elif isinstance(obj, PrimitiveIntObject):
+        kind, payload = VALUE_INT, str(obj.value)
+    elif isinstance(obj, PrimitiveFloatObject):
+        kind, payload = VALUE_FLOAT, formatd(obj.value, "r", 0)
+    elif isinstance(obj, PrimitiveStrObject):
+        kind, payload = VALUE_STR, obj.value
+    else:
+        return ""
+
+    return kind + _encode_length(len(payload)) + payload
+
+
+def deserialize_value(kind, payload):
+    """
+    Args:
+        kind (str): Type of the value from the frame.
+        payload (str): Payload of the frame.
+
+    Returns:
+        obj: Deserialized value, or None if the frame is malformed.
+    """
+    try:
+        if kind == VALUE_NIL:
+            return NIL
+        elif kind == VALUE_TRUE:
+            return PrimitiveTrueObject()
+        elif kind == VALUE_FALSE:
+            return PrimitiveFalseObject()
+        elif kind == VALUE_INT:
+            return get_primitive_int(string_to_int(payload))
+        elif kind == VALUE_FLOAT:
+            return PrimitiveFloatObject(string_to_float(payload))
+        elif kind == VALUE_STR:
+            return PrimitiveStrObject(payload)
+    except ParseStringError:
+        pass
+
+    return None
+
+
+class ChannelObject(Object):
+    """
+    One end of the channel between the parent and the worker.
+
+    Attributes:
+        fd (int): Non-blocking socket.
+        pid (int): PID of the worker on the parent's side, 0 in the worker.
+        buffer (str): Received bytes, which don't form the whole frame yet.
+        at_eof (bool): The other side closed the channel.
+        sender (obj): :class:`_PendingSend` which currently writes its frame.
+        waiting_senders (list): Sends waiting until the `sender` is done.
+    """
+    def __init__(self, fd, pid):
+        Object.__init__(self)
+        self.fd = fd
+        self.pid = pid
+        self.buffer = ""
+        self.at_eof = False
+        self.sender = None
+        self.waiting_senders = []
+
+    def has_frame(self):
+        if len(self.buffer) < FRAME_HEADER_SIZE:
+            return False
+
+        return len(self.buffer) >= FRAME_HEADER_SIZE + _decode_length(self.buffer, 1)
+
+    def take_value(self):
+        """
+        Returns:
+            obj: Value from the first whole frame in the buffer, or None.
+
+        Raises:
+            IOFailure: When the frame is malformed.
+        """
+        if not self.has_frame():
+            return None
+
+        end = FRAME_HEADER_SIZE + _decode_length(self.buffer, 1)
+        kind = self.buffer[0]
+        payload = self.buffer[FRAME_HEADER_SIZE:end]
+        self.buffer = self.buffer[end:]
+
+        value = deserialize_value(kind, payload)
+        if value is None:
+            raise IOFailure("receive: malformed value of type `%s`" % kind)
+
+        return value
+
+    def __str__(self):
+        return "Channel(fd=%d, pid=%d)" % (self.fd, self.pid)
+
+
+class _PendingReceive(_PendingIO):
+    def __init__(self, process, channel):
+        _PendingIO.__init__(self, process, channel.fd, rpoll.POLLIN)
+        self.channel = channel
+
+    def is_ready(self):
+        # frames read together with the previous one are already buffered
+        if self.channel.has_frame() or self.channel.at_eof:
+            return True
+
+        return _PendingIO.is_ready(self)
+
+    def attempt(self):
+        while True:
+            value = self.channel.take_value()
+            if value is not None:
+                return value
+
+            if self.channel.at_eof:
+                raise IOFailure("receive: channel closed")
+
+            try:
+                data = os.read(self.fd, READ_CHUNK_SIZE)
+            except OSError as e:
+                if _would_block(e.errno):
+                    return None
+
+                raise IOFailure("receive: %s" % os.strerror(e.errno))
+
+            if not data:
+                self.channel.at_eof = True
+
+            self.channel.buffer += data
+
+
+class _PendingSend(_PendingIO):
+    def __init__(self, process, channel, frame):
+        _PendingIO.__init__(self, process, channel.fd, rpoll.POLLOUT)
+        self.channel = channel
+        self.frame = frame
+
+    def attempt(self):
+        while self.frame:
+            try:
+                written = os.write(self.fd, self.frame)
+            except OSError as e:
+                if _would_block(e.errno):
+                    return None
+
+                self.channel.sender = None
+                raise IOFailure("send: %s" % os.strerror(e.errno))
+
+            self.frame = self.frame[written:]
+
+        self.channel.sender = None
+        return NIL
+
+    def complete(self, interpreter):
+        if not _PendingIO.complete(self, interpreter):
+            return False
+
+        _start_next_send(interpreter, self.channel)
+        return True
+
+
+def _start_next_send(interpreter, channel):
+    """
+    Give the channel to the first of the sends waiting for it.
+    """
+    if not channel.waiting_senders:
+        return
+
+    channel.sender = channel.waiting_senders.pop(0)
+
+    # the process of the send is already blocked
+    interpreter.io_waiters.append(channel.sender)
+
+
+def _send(interpreter, channel, parameters):
+    assert isinstance(channel, ChannelObject)
+
+    frame = serialize_value(parameters[0])
+    if not frame:
+        return _error(interpreter, channel,
+                      "send: only nil, true, false, int, float and str can "
+                      "be sent, not `%s`" % parameters[0].__str__())
+
+    sender = _PendingSend(interpreter.process, channel, frame)
+
+    # frames of the concurrent sends must not interleave, so they wait in the
+    # queue instead of polling the descriptor, which stays writable
+    if channel.sender is not None:
+        channel.waiting_senders.append(sender)
+        interpreter.block_process(sender.process)
+        return None
+
+    channel.sender = sender
+    return _start(interpreter, channel, sender)
+
+
+def _receive(interpreter, channel, parameters):
+    assert isinstance(channel, ChannelObject)
+
+    return _start(interpreter, channel,
+                  _PendingReceive(interpreter.process, channel))
+
+
+def _close_channel(interpreter, channel, parameters):
+    assert isinstance(channel, ChannelObject)
+
+    if channel in interpreter.channels:
+        interpreter.channels.remove(channel)
+
+    # waiting sends fail on the closed descriptor, same as the current one
+    while channel.waiting_senders:
+        interpreter.io_waiters.append(channel.waiting_senders.pop(0))
+
+    try:
+        os.close(channel.fd)
+    except OSError as e:
+        return _error(interpreter, channel, "close: %s" % os.strerror(e.errno))
+
+    return NIL
+
+
+class _PendingWait(ConditionWaiter):
+    """
+    Wait for the exit of the workers with the `pids`. Result is the exit code
+    of the last one, -1 if it was killed by the signal.
+    """
+    def __init__(self, process, pids):
+        ConditionWaiter.__init__(self, process)
+        self.pids = pids
+        self.exit_code = 0
+        self.failed = 0
+
+    def attempt(self):
+        """
+        Returns:
+            bool: True if all the workers exited.
+
+        Raises:
+            IOFailure: When some of the pids is not a child process.
+        """
+        while self.pids:
+            try:
+                pid, status = os.waitpid(self.pids[-1], os.WNOHANG)
+            except OSError as e:
+                raise IOFailure("wait: %s" % os.strerror(e.errno))
+
+            if pid == 0:
+                return False
+
+            self.pids.pop()
+
+            self.exit_code = -1
+            if os.WIFEXITED(status):
+                self.exit_code = os.WEXITSTATUS(status)
+
+            if self.exit_code != 0:
+                self.failed += 1
+
+        return True
+
+    def result(self):
+        return get_primitive_int(self.exit_code)
+
+    def complete(self, interpreter):
+        try:
+            if not self.attempt():
+                return False
+        except IOFailure as e:
+            # raise the error as if it happened in the send of the process
+            interpreter.process = self.process
+            _error(interpreter, None, e.message)
+            return True
+
+        self.process.frame.push(self.result())
+        interpreter.wake_process(self.process)
+
+        return True
+
+
+class _PendingPoolWait(_PendingWait):
+    """
+    Result is the number of the workers, which didn't exit with 0.
+    """
+    def result(self):
+        return get_primitive_int(self.failed)
+
+
+def _start_wait(interpreter, scope_parent, waiter):
+    try:
+        if waiter.attempt():
+            return waiter.result()
+    except IOFailure as e:
+        return _error(interpreter, scope_parent, e.message)
+
+    interpreter.wait_for_condition(waiter)
+    return None
+
+
+def _wait(interpreter, channel, parameters):
+    assert isinstance(channel, ChannelObject)
+
+    if channel.pid == 0:
+        return _error(interpreter, channel, "wait: not a channel to the worker")
+
+    return _start_wait(interpreter, channel,
+                       _PendingWait(interpreter.process, [channel.pid]))
+
+
+def channel_object(interpreter, fd, pid):
+    channel = ChannelObject(fd, pid)
+
+    add_primitive_method(interpreter, channel, "send:", _send, ["value"])
+    add_primitive_method(interpreter, channel, "receive", _receive, [])
+    add_primitive_method(interpreter, channel, "close", _close_channel, [])
+    add_primitive_method(interpreter, channel, "wait", _wait, [])
+
+    interpreter.channels.append(channel)
+
+    return channel
+
+
+def _close_inherited_channels(interpreter):
+    """
+    Close the channels of the parent in the forked worker. Otherwise the
+    other side of each channel wouldn't see EOF, until all workers spawned
+    after it exit.
+    """
+    for channel in interpreter.channels:
+        try:
+            os.close(channel.fd)
+        except OSError:
+            pass
+
+    interpreter.channels = []
+
+
+def _run_worker(interpreter, source, fd):
+    # imported here, because the virtual machine imports the interpreter
+    from tinySelf.vm.virtual_machine import virtual_machine
+
+    process, _ = virtual_machine(source, interpreter.stdlib_source,
+                                 stdlib_path=interpreter.stdlib_path,
+                                 snapshot_path=interpreter.snapshot_path,
+                                 snapshot_data=interpreter.snapshot_data,
+                                 parent_channel_fd=fd)
+
+    if process is None:
+        return 1
+
+    if process.finished_with_error:
+        ewriteln("Worker failed:")
+        ewriteln(process.result.__str__())
+        return 1
+
+    return 0
+
+
+def _fork_worker(interpreter, source):
+    """
+    Returns:
+        obj: :class:`ChannelObject` to the new worker running the `source`.
+
+    Raises:
+        IOFailure: When the worker couldn't be started.
+    """
+    try:
+        parent_socket, worker_socket = rsocket.socketpair(rsocket.AF_UNIX)
+    except rsocket.SocketError as e:
+        raise IOFailure(e.get_msg())
+
+    parent_fd = parent_socket.detach()
+    worker_fd = worker_socket.detach()
+    _set_nonblocking(parent_fd)
+    _set_nonblocking(worker_fd)
+
+    try:
+        pid = os.fork()
+    except OSError as e:
+        os.close(parent_fd)
+        os.close(worker_fd)
+        raise IOFailure(os.strerror(e.errno))
+
+    if pid == 0:
+        exit_code = 1
+        try:
+            os.close(parent_fd)
+            _close_inherited_channels(interpreter)
+
+            # the worker never returns to the interpreters of the parent, so
+            # it can restore the snapshot into the singletons
+            VM_STATE.code_ran = False
+            exit_code = _run_worker(interpreter, source, worker_fd)
+        finally:
+            os._exit(exit_code)
+
+    os.close(worker_fd)
+
+    return channel_object(interpreter, parent_fd, pid)
+
+
+def _spawn(interpreter, scope_parent, parameters):
+    source = parameters[0]
+    if not isinstance(source, PrimitiveStrObject):
+        return _error(interpreter, scope_parent, "spawn: str parameter expected")
+
+    try:
+        return _fork_worker(interpreter, source.value)
+    except IOFailure as e:
+        return _error(interpreter, scope_parent, "spawn: %s" % e.message)
+
+
+class WorkerPoolObject(Object):
+    """
+    Workers running the same source. Sent values are dispatched to the
+    workers round-robin and received from them in the same order, so when
+    each worker answers each value it receives with one value, the n-th
+    received value is the answer to the n-th sent one.
+    """
+    def __init__(self, channels):
+        Object.__init__(self)
+        self.channels = channels
+        self.next_send = 0
+        self.next_receive = 0
+
+    def __str__(self):
+        return "WorkerPool(size=%d)" % len(self.channels)
+
+
+def _pool_send(interpreter, pool, parameters):
+    assert isinstance(pool, WorkerPoolObject)
+
+    channel = pool.channels[pool.next_send]
+    pool.next_send = (pool.next_send + 1) % len(pool.channels)
+
+    return _send(interpreter, channel, parameters)
+
+
+def _pool_receive(interpreter, pool, parameters):
+    assert isinstance(pool, WorkerPoolObject)
+
+    channel = pool.channels[pool.next_receive]
+    pool.next_receive = (pool.next_receive + 1) % len(pool.channels)
+
+    return _receive(interpreter, channel, parameters)
+
+
+def _pool_size(interpreter, pool, parameters):
+    assert isinstance(pool, WorkerPoolObject)
+
+    return get_primitive_int(len(pool.channels))
+
+
+def _pool_close(interpreter, pool, parameters):
+    assert isinstance(pool, WorkerPoolObject)
+
+    for channel in pool.channels:
+        if _close_channel(interpreter, channel, parameters) is not NIL:
+            return None  # the error was raised
+
+    return NIL
+
+
+def _pool_wait(interpreter, pool, parameters):
+    assert isinstance(pool, WorkerPoolObject)
+
+    pids = [channel.pid for channel in pool.channels]
+    return _start_wait(interpreter, pool,
+                       _PendingPoolWait(interpreter.process, pids))
+
+
+def worker_pool_object(interpreter, channels):
+    pool = WorkerPoolObject(channels)
+
+    add_primitive_method(interpreter, pool, "send:", _pool_send, ["value"])
+    add_primitive_method(interpreter, pool, "receive", _pool_receive, [])
+    add_primitive_method(interpreter, pool, "size", _pool_size, [])
+    add_primitive_method(interpreter, pool, "close", _pool_close, [])
+    add_primitive_method(interpreter, pool, "wait", _pool_wait, [])
+
+    return pool
+
+
+def _spawn_pool(interpreter, scope_parent, parameters):
+    source = parameters[0]
+    count = parameters[1]
+    if not isinstance(source, PrimitiveStrObject) or \
+       not isinstance(count, PrimitiveIntObject):
+        return _error(interpreter, scope_parent,
+                      "spawn:Count: str and int parameters expected")
+
+    if count.value <= 0:
+        return _error(interpreter, scope_parent,
+                      "spawn:Count: positive number of workers expected")
+
+    channels = []
+    for _ in xrange(count.value):
+        try:
+            channels.append(_fork_worker(interpreter, source.value))
+        except IOFailure as e:
+            # the already started workers exit on the closed channel
+            for channel in channels:
+                interpreter.channels.remove(channel)
+                os.close(channel.fd)
+
+            return _error(interpreter, scope_parent, "spawn:Count: %s" % e.message)
+
+    return worker_pool_object(interpreter, channels)
+
+
+def _parent(interpreter, scope_parent, parameters):
+    if interpreter.parent_channel is None:
+        return NIL
+
+    return interpreter.parent_channel
+
+
+def gen_worker_primitives(interpreter):
+    workers_namespace = Object()
+
+    add_primitive_method(interpreter, workers_namespace, "spawn:",
+                         _spawn, ["source"])
+    add_primitive_method(interpreter, workers_namespace, "spawn:Count:",
+                         _spawn_pool, ["source", "count"])
+    add_primitive_method(interpreter, workers_namespace, "parent",
+                         _parent, [])
+
+    return workers_namespace
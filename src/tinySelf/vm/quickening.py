@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Quickened binary sends on numbers.
+
+When a binary send site sees int / float operands and resolves to the number
+primitive, the interpreter rewrites the opcode of the site to one of the
+BYTECODE_QUICK_* opcodes. Those compute the result directly, without the slot
+lookup and the parameter list. When the guard fails, the site is
+deoptimized back to BYTECODE_SEND.
+"""
+from tinySelf.vm.bytecodes import *
+
+from tinySelf.vm.primitives import get_primitive_int
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.primitives import PrimitiveTrueObject
+from tinySelf.vm.primitives import PrimitiveFalseObject
+from tinySelf.vm.primitives import PrimitiveFloatObject
+from tinySelf.vm.primitives.primitive_float import _NumberObject
+
+
+def quickened_opcode(message_name):
+    """
+    Returns:
+        int: Quickened opcode for the `message_name`, or -1 if there is none.
+    """
+    if message_name == "+":
+        return BYTECODE_QUICK_ADD
+    elif message_name == "-":
+        return BYTECODE_QUICK_SUBSTRACT
+    elif message_name == "*":
+        return BYTECODE_QUICK_MULTIPLY
+    elif message_name == "<":
+        return BYTECODE_QUICK_LT
+    elif message_name == "<=":
+        return BYTECODE_QUICK_LTE
+    elif message_name == ">":
+        return BYTECODE_QUICK_GT
+    elif message_name == ">=":
+        return BYTECODE_QUICK_GTE
+    elif message_name == "==":
+        return BYTECODE_QUICK_COMPARE
+
+    return -1
+
+
+def is_quickened(bytecode):
+    return BYTECODE_QUICK_ADD <= bytecode <= BYTECODE_QUICK_COMPARE
+
+
+def _has_pristine_number_map(obj):
+    if isinstance(obj, PrimitiveIntObject):
+        return PrimitiveIntObject._OBJ_CACHE.has_pristine_map(obj)
+    elif isinstance(obj, PrimitiveFloatObject):
+        return PrimitiveFloatObject._OBJ_CACHE.has_pristine_map(obj)
+
+    return False
+
+
+def can_quicken(obj, parameter):
+    """
+    Quickening is safe only for numbers with unchanged primitive slots.
+    """
+    return _has_pristine_number_map(obj) and isinstance(parameter, _NumberObject)
+
+
+def _bool(value):
+    if value:
+        return PrimitiveTrueObject()
+
+    return PrimitiveFalseObject()
+
+
+def _int_op(bytecode, a, b):
+    if bytecode == BYTECODE_QUICK_ADD:
+        return get_primitive_int(a + b)
+    elif bytecode == BYTECODE_QUICK_SUBSTRACT:
+        return get_primitive_int(a - b)
+    elif bytecode == BYTECODE_QUICK_MULTIPLY:
+        return get_primitive_int(a * b)
+    elif bytecode == BYTECODE_QUICK_LT:
+        return _bool(a < b)
+    elif bytecode == BYTECODE_QUICK_LTE:
+        return _bool(a <= b)
+    elif bytecode == BYTECODE_QUICK_GT:
+        return _bool(a > b)
+    elif bytecode == BYTECODE_QUICK_GTE:
+        return _bool(a >= b)
+    elif bytecode == BYTECODE_QUICK_COMPARE:
+        return _bool(a == b)
+
+    return None
+
+
+def _float_op(bytecode, a, b):
+    if bytecode == BYTECODE_QUICK_ADD:
+        return PrimitiveFloatObject(a + b)
+    elif bytecode == BYTECODE_QUICK_SUBSTRACT:
+        return PrimitiveFloatObject(a - b)
+    elif bytecode == BYTECODE_QUICK_MULTIPLY:
+        return PrimitiveFloatObject(a * b)
+    elif bytecode == BYTECODE_QUICK_LT:
+        return _bool(a < b)
+    elif bytecode == BYTECODE_QUICK_LTE:
+        return _bool(a <= b)
+    elif bytecode == BYTECODE_QUICK_GT:
+        return _bool(a > b)
+    elif bytecode == BYTECODE_QUICK_GTE:
+        return _bool(a >= b)
+    elif bytecode == BYTECODE_QUICK_COMPARE:
+        return _bool(a == b)
+
+    return None
+
+
+def quick_binary_op(bytecode, obj, parameter):
+    """
+    Args:
+        bytecode (int): One of the BYTECODE_QUICK_* opcodes.
+        obj (obj): Receiver of the send.
+        parameter (obj): Parameter of the send.
+
+    Returns:
+        obj: Result of the operation, or None if the guard failed.
+    """
+    if not can_quicken(obj, parameter):
+        return None
+
+    if isinstance(obj, PrimitiveIntObject) and \
+       isinstance(parameter, PrimitiveIntObject):
+        return _int_op(bytecode, obj.value, parameter.value)
+
+    assert isinstance(obj, _NumberObject)
+    assert isinstance(parameter, _NumberObject)
+    return _float_op(bytecode, obj.float_value, parameter.float_value)
@@ -0,0 +1,697 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshots of the universe.
+
+Snapshot is an image of the whole object graph reachable from the universe,
+usually saved right after the stdlib initialization. It contains the code
+contexts, maps and objects, each section stored as a flat table, so the
+references between them are just indexes.
+
+Primitive methods are stored by the symbolic name of their function and
+bound to the new interpreter when the snapshot is loaded. Singletons (nil,
+true, false and the block traits) are shared by the whole VM, so their state
+is restored into the existing objects instead of creating new ones. That is
+why the snapshot can be restored only before any interpreter of the OS
+process ran code.
+"""
+import os
+
+from rpython.rlib import rmmap
+from rpython.rlib.objectmodel import r_dict
+from rpython.rlib.objectmodel import compute_identity_hash
+
+from tinySelf.vm.object_layout import Object
+from tinySelf.vm.object_layout import ObjectMap
+from tinySelf.vm.code_serialization import Reader
+from tinySelf.vm.code_serialization import Writer
+from tinySelf.vm.code_serialization import SerializationError
+from tinySelf.vm.code_serialization import read_ast
+from tinySelf.vm.code_serialization import write_ast
+from tinySelf.vm.code_serialization import read_code_context
+from tinySelf.vm.code_serialization import write_code_context
+from tinySelf.vm.symbols import intern_symbol
+
+from tinySelf.vm.primitives import Mirror
+from tinySelf.vm.primitives import ErrorObject
+from tinySelf.vm.primitives import AssignmentPrimitive
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.primitives import PrimitiveStrObject
+from tinySelf.vm.primitives import PrimitiveNilObject
+from tinySelf.vm.primitives import PrimitiveTrueObject
+from tinySelf.vm.primitives import PrimitiveFalseObject
+from tinySelf.vm.primitives import PrimitiveFloatObject
+from tinySelf.vm.primitives import get_primitives
+from tinySelf.vm.primitives import get_primitive_int
+from tinySelf.vm.primitives import _BLOCK_TRAIT
+from tinySelf.vm.primitives import _USER_EDITABLE_BLOCK_TRAIT
+from tinySelf.vm.primitives.worker_primitives import ChannelObject
+from tinySelf.vm.frames import VM_STATE
+from tinySelf.vm.interpreter import Interpreter
+
+
+SNAPSHOT_MAGIC = "tinySelf snapshot v2\n"
+
+OBJ_PLAIN = 0
+OBJ_INT = 1
+OBJ_FLOAT = 2
+OBJ_STR = 3
+OBJ_NIL = 4
+OBJ_TRUE = 5
+OBJ_FALSE = 6
+OBJ_BLOCK_TRAITS = 7  # user editable traits of all blocks
+OBJ_BLOCK_TRAIT = 8  # primitive trait of all blocks
+OBJ_PRIMITIVE = 9
+OBJ_ASSIGNMENT = 10
+OBJ_MIRROR = 11
+
+
+class SnapshotError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+def _identity_eq(a, b):
+    return a is b
+
+
+def _identity_hash(obj):
+    return compute_identity_hash(obj)
+
+
+def _new_identity_dict():
+    return r_dict(_identity_eq, _identity_hash)
+
+
+def bootstrap_interpreter():
+    """
+    Returns:
+        obj: :class:`Interpreter` with the universe containing only the
+             primitives, same as the one created by the `virtual_machine()`.
+    """
+    universe = Object()
+    universe.meta_add_slot("primitives", get_primitives())
+
+    return Interpreter(universe)
+
+
+def _collect_primitive_functions():
+    """
+    Find functions of all primitive methods reachable from the universe.
+    Runs once, when the module is imported, so the names are known also in
+    the translated binary.
+
+    Returns:
+        list: List of ``(name, function)`` tuples.
+    """
+    interpreter = bootstrap_interpreter()
+
+    functions = []
+    seen = set()
+    objects = [interpreter.universe, _BLOCK_TRAIT, Mirror(Object())]
+    while objects:
+        obj = objects.pop()
+        if id(obj) in seen:
+            continue
+
+        seen.add(id(obj))
+
+        primitive_code = obj.map.primitive_code
+        if primitive_code is not None:
+            name = "%s.%s" % (primitive_code.__module__, primitive_code.__name__)
+            if (name, primitive_code) not in functions:
+                functions.append((name, primitive_code))
+
+        objects.extend(obj._slot_values)
+        objects.extend(obj._parent_slot_values)
+
+    return functions
+
+
+_PRIMITIVE_FUNCTIONS = _collect_primitive_functions()
+
+
+def _primitive_function_name(primitive_code):
+    for name, function in _PRIMITIVE_FUNCTIONS:
+        if function is primitive_code:
+            return name
+
+    return ""
+
+
+def _primitive_function(name):
+    for function_name, function in _PRIMITIVE_FUNCTIONS:
+        if function_name == name:
+            return function
+
+    return None
+
+
+def _singleton_kind(obj):
+    if obj is PrimitiveNilObject():
+        return OBJ_NIL
+    elif obj is PrimitiveTrueObject():
+        return OBJ_TRUE
+    elif obj is PrimitiveFalseObject():
+        return OBJ_FALSE
+    elif obj is _USER_EDITABLE_BLOCK_TRAIT:
+        return OBJ_BLOCK_TRAITS
+
+    return -1
+
+
+def _singleton(kind):
+    if kind == OBJ_NIL:
+        return PrimitiveNilObject()
+    elif kind == OBJ_TRUE:
+        return PrimitiveTrueObject()
+    elif kind == OBJ_FALSE:
+        return PrimitiveFalseObject()
+
+    return _USER_EDITABLE_BLOCK_TRAIT
+
+
+def _has_state(kind):
+    return kind == OBJ_PLAIN or kind == OBJ_NIL or kind == OBJ_TRUE or \
+           kind == OBJ_FALSE or kind == OBJ_BLOCK_TRAITS
+
+
+def _object_kind(obj):
+    singleton_kind = _singleton_kind(obj)
+    if singleton_kind != -1:
+        return singleton_kind
+
+    if obj is _BLOCK_TRAIT:
+        return OBJ_BLOCK_TRAIT
+    elif isinstance(obj, PrimitiveIntObject):
+        return OBJ_INT
+    elif isinstance(obj, PrimitiveFloatObject):
+        return OBJ_FLOAT
+    elif isinstance(obj, PrimitiveStrObject):
+        return OBJ_STR
+    elif isinstance(obj, AssignmentPrimitive):
+        return OBJ_ASSIGNMENT
+    elif isinstance(obj, Mirror):
+        return OBJ_MIRROR
+    elif obj.map.primitive_code is not None:
+        return OBJ_PRIMITIVE
+    elif isinstance(obj, ErrorObject) or isinstance(obj, ChannelObject):
+        raise SnapshotError("Can't snapshot `%s`." % obj.__str__())
+
+    return OBJ_PLAIN
+
+
+class _SnapshotWriter(object):
+    def __init__(self):
+        self.objects = []
+        self.kinds = []
+        self.object_ids = _new_identity_dict()
+
+        self.maps = []
+        self.map_ids = {}
+
+        self.code_contexts = []
+        self.code_context_ids = {}
+
+    def object_id(self, obj):
+        obj_id = self.object_ids.get(obj, -1)
+        if obj_id != -1:
+            return obj_id
+
+        obj_id = len(self.objects)
+        self.object_ids[obj] = obj_id
+        self.objects.append(obj)
+        self.kinds.append(_object_kind(obj))
+
+        return obj_id
+
+    def map_id(self, obj_map):
+        map_id = self.map_ids.get(obj_map, -1)
+        if map_id != -1:
+            return map_id
+
+        map_id = len(self.maps)
+        self.map_ids[obj_map] = map_id
+        self.maps.append(obj_map)
+
+        code_context = obj_map.code_context
+        if code_context is not None and \
+           code_context not in self.code_context_ids:
+            self.code_context_ids[code_context] = len(self.code_contexts)
+            self.code_contexts.append(code_context)
+
+        return map_id
+
+    def collect(self, universe):
+        self.object_id(universe)
+
+        # singletons are always restored, even when nothing references them
+        for kind in [OBJ_NIL, OBJ_TRUE, OBJ_FALSE, OBJ_BLOCK_TRAITS]:
+            self.object_id(_singleton(kind))
+
+        index = 0
+        while index < len(self.objects):
+            obj = self.objects[index]
+            kind = self.kinds[index]
+            index += 1
+
+            if _has_state(kind):
+                self.map_id(obj.map)
+
+                for value in obj._slot_values:
+                    self.object_id(value)
+                for parent in obj._parent_slot_values:
+                    self.object_id(parent)
+                if obj._scope_parent is not None:
+                    self.object_id(obj._scope_parent)
+
+            elif kind == OBJ_MIRROR:
+                assert isinstance(obj, Mirror)
+                self.object_id(obj.obj_to_mirror)
+
+    def compile_code_contexts(self):
+        """
+        Returns:
+            bool: True if any lazily compiled body had to be compiled.
+        """
+        compiled = False
+        for code_context in self.code_contexts:
+            if code_context.compile_eagerly():
+                compiled = True
+
+        return compiled
+
+    def _write_map(self, writer, obj_map):
+        writer.write_uint(len(obj_map._slots))
+        for symbol, index in obj_map._slots.iteritems():
+            writer.write_str(symbol.name)
+            writer.write_uint(index)
+
+        writer.write_uint(len(obj_map._parent_slots))
+        for symbol, index in obj_map._parent_slots.iteritems():
+            writer.write_str(symbol.name)
+            writer.write_uint(index)
+
+        writer.write_bool(obj_map.is_block)
+        writer.write_bool(obj_map._used_in_multiple_objects)
+
+        writer.write_uint(len(obj_map.parameters))
+        for parameter in obj_map.parameters:
+            writer.write_str(parameter)
+
+        write_ast(writer, obj_map.ast)
+
+        code_context = obj_map.code_context
+        if code_context is None:
+            writer.write_uint(0)
+        else:
+            writer.write_uint(self.code_context_ids[code_context] + 1)
+
+    def _write_object(self, writer, obj, kind):
+        writer.write_uint(kind)
+
+        if _has_state(kind):
+            writer.write_uint(self.map_ids[obj.map])
+        elif kind == OBJ_INT:
+            assert isinstance(obj, PrimitiveIntObject)
+            writer.write_int(obj.value)
+        elif kind == OBJ_FLOAT:
+            assert isinstance(obj, PrimitiveFloatObject)
+            writer.write_float(obj.value)
+        elif kind == OBJ_STR:
+            assert isinstance(obj, PrimitiveStrObject)
+            writer.write_str(obj.value)
+        elif kind == OBJ_PRIMITIVE:
+            name = _primitive_function_name(obj.map.primitive_code)
+            if not name:
+                raise SnapshotError("Unknown primitive `%s`." % obj.__str__())
+
+            writer.write_str(name)
+            writer.write_uint(obj.map.primitive_arity)
+            writer.write_bool(obj.map.primitive_code_self is not None)
+
+    def _write_references(self, writer, obj, kind):
+        if kind == OBJ_MIRROR:
+            assert isinstance(obj, Mirror)
+            writer.write_uint(self.object_ids[obj.obj_to_mirror])
+            return
+
+        if not _has_state(kind):
+            return
+
+        writer.write_uint(len(obj._slot_values))
+        for value in obj._slot_values:
+            writer.write_uint(self.object_ids[value])
+
+        writer.write_uint(len(obj._parent_slot_values))
+        for parent in obj._parent_slot_values:
+            writer.write_uint(self.object_ids[parent])
+
+        if obj._scope_parent is None:
+            writer.write_uint(0)
+        else:
+            writer.write_uint(self.object_ids[obj._scope_parent] + 1)
+
+    def write(self, writer):
+        writer.write_str(SNAPSHOT_MAGIC)
+
+        writer.write_uint(len(self.code_contexts))
+        for code_context in self.code_contexts:
+            write_code_context(writer, code_context)
+
+        writer.write_uint(len(self.maps))
+        for obj_map in self.maps:
+            self._write_map(writer, obj_map)
+
+        writer.write_uint(len(self.objects))
+        for i in xrange(len(self.objects)):
+            self._write_object(writer, self.objects[i], self.kinds[i])
+
+        for i in xrange(len(self.objects)):
+            self._write_references(writer, self.objects[i], self.kinds[i])
+
+
+def dump_snapshot(interpreter):
+    """
+    Args:
+        interpreter (obj): :class:`Interpreter` with the universe to dump.
+
+    Returns:
+        str: Snapshot of the universe.
+
+    Raises:
+        SnapshotError: When some object can't be stored in the snapshot.
+    """
+    snapshot_writer = _SnapshotWriter()
+    snapshot_writer.collect(interpreter.universe)
+
+    # snapshot stores the compiled code and the compilation may change the
+    # objects already collected (block literals set the scope of the nil)
+    if snapshot_writer.compile_code_contexts():
+        snapshot_writer = _SnapshotWriter()
+        snapshot_writer.collect(interpreter.universe)
+
+    writer = Writer()
+    snapshot_writer.write(writer)
+
+    return writer.getvalue()
+
+
+def save_snapshot(interpreter, path):
+    data = dump_snapshot(interpreter)
+
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+        try:
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+        finally:
+            os.close(fd)
+    except OSError as e:
+        raise SnapshotError("Can't write `%s`: %s" % (path, os.strerror(e.errno)))
+
+
+class _MMapReader(Reader):
+    """
+    Reader of the memory mapped file, so only the parts which are actually
+    read are copied out of the page cache.
+    """
+    def __init__(self, mmap):
+        self.mmap = mmap
+        self.position = 0
+        self.source_lines = None
+
+    def _take(self, length):
+        start = self.position
+        end = start + length
+        if length < 0 or end > self.mmap.size:
+            raise SerializationError("Unexpected end of the data.")
+
+        self.position = end
+        return self.mmap.getslice(start, length)
+
+    def at_end(self):
+        return self.position >= self.mmap.size
+
+
+def _read_map(reader, code_contexts):
+    obj_map = ObjectMap()
+
+    for _ in xrange(reader.read_uint()):
+        name = reader.read_str()
+        obj_map._slots[intern_symbol(name)] = reader.read_uint()
+
+    for _ in xrange(reader.read_uint()):
+        name = reader.read_str()
+        obj_map._parent_slots[intern_symbol(name)] = reader.read_uint()
+
+    obj_map.is_block = reader.read_bool()
+    obj_map._used_in_multiple_objects = reader.read_bool()
+    obj_map.parameters = [reader.read_str() for _ in xrange(reader.read_uint())]
+    obj_map.ast = read_ast(reader)
+
+    code_context_index = reader.read_uint()
+    if code_context_index > 0:
+        if code_context_index > len(code_contexts):
+            raise SnapshotError("Invalid code context reference.")
+
+        obj_map.code_context = code_contexts[code_context_index - 1]
+
+    return obj_map
+
+
+def _read_object(reader, interpreter, maps):
+    kind = reader.read_uint()
+
+    if _has_state(kind):
+        map_index = reader.read_uint()
+        if map_index >= len(maps):
+            raise SnapshotError("Invalid map reference.")
+
+        if kind == OBJ_PLAIN:
+            return kind, Object(obj_map=maps[map_index])
+
+        # cached lookups may go through the old map of the singleton
+        obj = _singleton(kind)
+        obj.map.invalidate_dependent_lookups()
+        obj.map = maps[map_index]
+
+        return kind, obj
+
+    elif kind == OBJ_INT:
+        return kind, get_primitive_int(reader.read_int())
+    elif kind == OBJ_FLOAT:
+        return kind, PrimitiveFloatObject(reader.read_float())
+    elif kind == OBJ_STR:
+        return kind, PrimitiveStrObject(reader.read_str())
+    elif kind == OBJ_BLOCK_TRAIT:
+        return kind, _BLOCK_TRAIT
+    elif kind == OBJ_ASSIGNMENT:
+        return kind, AssignmentPrimitive()
+    elif kind == OBJ_MIRROR:
+        # mirrored object is set, once all objects exist
+        return kind, Mirror(Object())
+    elif kind == OBJ_PRIMITIVE:
+        name = reader.read_str()
+        function = _primitive_function(name)
+        if function is None:
+            raise SnapshotError("Unknown primitive `%s`." % name)
+
+        primitive = Object()
+        primitive.map.primitive_code = function
+        primitive.map.primitive_arity = reader.read_uint()
+        if reader.read_bool():
+            primitive.map.primitive_code_self = interpreter
+
+        return kind, primitive
+
+    raise SnapshotError("Unknown object type %d." % kind)
+
+
+def _read_reference(reader, objects):
+    index = reader.read_uint()
+    if index >= len(objects):
+        raise SnapshotError("Invalid object reference.")
+
+    return objects[index]
+
+
+class _SingletonState(object):
+    """
+    Saved state of the singleton shared by the whole VM.
+    """
+    def __init__(self, obj):
+        self.obj = obj
+        # adding of the slots changes the map and the lists in place
+        self.map = obj.map.clone()
+        self.slot_values = obj._slot_values[:]
+        self.parent_slot_values = obj._parent_slot_values[:]
+        self.slot_values_shared = obj._slot_values_shared
+        self.parent_slot_values_shared = obj._parent_slot_values_shared
+        self.scope_parent = obj._scope_parent
+
+    def restore(self):
+        obj = self.obj
+        obj.map.invalidate_dependent_lookups()
+        obj.map = self.map.clone()
+        obj._slot_values = self.slot_values[:]
+        obj._parent_slot_values = self.parent_slot_values[:]
+        obj._slot_values_shared = self.slot_values_shared
+        obj._parent_slot_values_shared = self.parent_slot_values_shared
+        obj._scope_parent = self.scope_parent
+
+
+def save_singletons():
+    """
+    Returns:
+        list: State of nil, true, false and the block traits, which can be
+              put back by the :func:`restore_singletons`.
+    """
+    return [
+        _SingletonState(_singleton(kind))
+        for kind in [OBJ_NIL, OBJ_TRUE, OBJ_FALSE, OBJ_BLOCK_TRAITS]
+    ]
+
+
+def restore_singletons(singletons):
+    for singleton in singletons:
+        singleton.restore()
+
+
+def _check_slot_indexes(slots, values):
+    for index in slots.values():
+        if index >= len(values):
+            raise SnapshotError("Slot index out of the stored slot values.")
+
+
+def _read_references(reader, obj, kind, objects):
+    if kind == OBJ_MIRROR:
+        assert isinstance(obj, Mirror)
+        obj.obj_to_mirror = _read_reference(reader, objects)
+        return
+
+    if not _has_state(kind):
+        return
+
+    obj._slot_values = [
+        _read_reference(reader, objects) for _ in xrange(reader.read_uint())
+    ]
+    obj._parent_slot_values = [
+        _read_reference(reader, objects) for _ in xrange(reader.read_uint())
+    ]
+    obj._slot_values_shared = False
+    obj._parent_slot_values_shared = False
+
+    # maps are shared, so each of their objects has to fit into them
+    _check_slot_indexes(obj.map._slots, obj._slot_values)
+    _check_slot_indexes(obj.map._parent_slots, obj._parent_slot_values)
+
+    scope_parent_index = reader.read_uint()
+    if scope_parent_index == 0:
+        obj._scope_parent = None
+    else:
+        if scope_parent_index > len(objects):
+            raise SnapshotError("Invalid object reference.")
+
+        obj._scope_parent = objects[scope_parent_index - 1]
+
+
+def restore_snapshot(reader):
+    """
+    Args:
+        reader (obj): :class:`Reader` of the snapshot.
+
+    Returns:
+        obj: :class:`Interpreter` with the universe from the snapshot.
+
+    Raises:
+        SnapshotError: When the snapshot is malformed, or some interpreter
+            already ran code, which may use the singletons.
+    """
+    if VM_STATE.code_ran:
+        raise SnapshotError("Snapshot can't be restored after the code ran, "
+                            "as it replaces nil, true, false and the block "
+                            "traits of all interpreters.")
+
+    # failed restore doesn't leave the singletons half changed
+    singletons = save_singletons()
+    try:
+        interpreter = _restore_snapshot(reader)
+    except SnapshotError:
+        restore_singletons(singletons)
+        raise
+
+    return interpreter
+
+
+def _restore_snapshot(reader):
+    try:
+        if reader.read_str() != SNAPSHOT_MAGIC:
+            raise SnapshotError("Not a tinySelf snapshot.")
+
+        interpreter = bootstrap_interpreter()
+
+        code_contexts = [
+            read_code_context(reader) for _ in xrange(reader.read_uint())
+        ]
+        maps = [
+            _read_map(reader, code_contexts) for _ in xrange(reader.read_uint())
+        ]
+
+        kinds = []
+        objects = []
+        for _ in xrange(reader.read_uint()):
+            kind, obj = _read_object(reader, interpreter, maps)
+            kinds.append(kind)
+            objects.append(obj)
+
+        for i in xrange(len(objects)):
+            _read_references(reader, objects[i], kinds[i], objects)
+
+    except SerializationError as e:
+        raise SnapshotError(e.message)
+
+    if not objects:
+        raise SnapshotError("Snapshot without the universe.")
+
+    interpreter.universe = objects[0]
+
+    return interpreter
+
+
+def load_snapshot(path):
+    """
+    Load the snapshot from the memory mapped file.
+
+    Args:
+        path (str): Path of the snapshot.
+
+    Returns:
+        obj: :class:`Interpreter` with the universe from the snapshot.
+
+    Raises:
+        SnapshotError: When the snapshot can't be read or is malformed.
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY, 0)
+    except OSError as e:
+        raise SnapshotError("Can't open `%s`: %s" % (path, os.strerror(e.errno)))
+
+    try:
+        try:
+            mmap = rmmap.mmap(fd, 0, rmmap.MAP_PRIVATE, rmmap.PROT_READ)
+        except rmmap.RMMapError:
+            raise SnapshotError("Can't map `%s` into memory." % path)
+        except OSError:
+            raise SnapshotError("Can't map `%s` into memory." % path)
+    finally:
+        os.close(fd)
+
+    try:
+        interpreter = restore_snapshot(_MMapReader(mmap))
+    finally:
+        mmap.close()
+
+    interpreter.snapshot_path = path
+
+    return interpreter
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Global table of interned selectors / slot names.
+
+Maps of the objects use symbols as keys, so the slot lookup compares them by
+identity instead of comparing strings. Send sites get their symbol when the
+code context is finalized, so there is no string handling per send.
+"""
+
+
+class Symbol(object):
+    _immutable_fields_ = ["name", "id"]
+
+    def __init__(self, name, symbol_id):
+        self.name = name
+        self.id = symbol_id
+
+        self._assigned_symbol = None
+
+    @property
+    def assigned_symbol(self):
+        """
+        Symbol of the slot set by the assignment `self`, that is `a` for `a:`.
+        """
+        if self._assigned_symbol is None:
+            assert len(self.name) > 1
+            end = len(self.name) - 1
+            assert end >= 0
+            self._assigned_symbol = intern_symbol(self.name[:end])
+
+        return self._assigned_symbol
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return "Symbol(%s)" % self.name
+
+
+class SymbolTable(object):
+    def __init__(self):
+        self._symbols = {}
+        self._symbol_list = []
+
+    def intern(self, name):
+        symbol = self._symbols.get(name, None)
+        if symbol is None:
+            symbol = Symbol(name, len(self._symbol_list))
+            self._symbols[name] = symbol
+            self._symbol_list.append(symbol)
+
+        return symbol
+
+    def __len__(self):
+        return len(self._symbol_list)
+
+
+SYMBOLS = SymbolTable()
+
+
+def intern_symbol(name):
+    """
+    Args:
+        name (str): Name of the slot / message.
+
+    Returns:
+        obj: :class:`Symbol` shared by all uses of the `name`.
+    """
+    return SYMBOLS.intern(name)
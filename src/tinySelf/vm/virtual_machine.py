@@ -3,18 +3,19 @@ from rply import ParsingError
 
 from tinySelf.r_io import ewriteln
 from tinySelf.parser import lex_and_parse
-from tinySelf.parser import lex_and_parse_as_root
-from tinySelf.vm.primitives import get_primitives
-from tinySelf.vm.interpreter import Interpreter
-from tinySelf.vm.code_context import CodeContext
-from tinySelf.vm.object_layout import Object
+from tinySelf.vm.snapshot import SnapshotError
+from tinySelf.vm.snapshot import load_snapshot
+from tinySelf.vm.snapshot import restore_snapshot
+from tinySelf.vm.snapshot import bootstrap_interpreter
+from tinySelf.vm.bytecode_cache import load_code
+from tinySelf.vm.code_serialization import Reader
+from tinySelf.vm.primitives.worker_primitives import channel_object
 
 
-def run_stdlib(interpreter, stdlib_source):
-    stdlib_ast = lex_and_parse_as_root(stdlib_source)
-    code = stdlib_ast.compile(CodeContext())
+def run_stdlib(interpreter, stdlib_source, stdlib_path=""):
+    code = load_code(stdlib_source, stdlib_path)
 
-    stdlib_process = interpreter.add_process(code.finalize())
+    stdlib_process = interpreter.add_process(code)
     interpreter.interpret()
 
     if stdlib_process.finished_with_error:
@@ -27,22 +28,43 @@ def run_stdlib(interpreter, stdlib_source):
     return True
 
 
-def virtual_machine(source, stdlib_source=""):
-    universe = Object()
-    universe.meta_add_slot("primitives", get_primitives())
+def virtual_machine(source, stdlib_source="", path="", stdlib_path="",
+                    snapshot_path="", snapshot_data="", parent_channel_fd=-1):
+    """
+    Run the `source` in the new universe, initialized either by the
+    `stdlib_source`, or loaded from the snapshot at `snapshot_path`, or from
+    the snapshot already in the memory (`snapshot_data`).
 
-    interpreter = Interpreter(universe)
+    Returns:
+        tuple: ``(process, interpreter)``, process is None when the
+               initialization failed.
+    """
+    try:
+        if snapshot_path:
+            interpreter = load_snapshot(snapshot_path)
+        elif snapshot_data:
+            interpreter = restore_snapshot(Reader(snapshot_data))
+        else:
+            interpreter = bootstrap_interpreter()
+    except SnapshotError as e:
+        ewriteln("Couldn't load snapshot:")
+        ewriteln(e.message)
+        return None, bootstrap_interpreter()
+
+    interpreter.snapshot_data = snapshot_data
+
+    interpreter.stdlib_source = stdlib_source
+    interpreter.stdlib_path = stdlib_path
+    if parent_channel_fd >= 0:
+        interpreter.parent_channel = channel_object(interpreter,
+                                                    parent_channel_fd, 0)
 
     if stdlib_source:
-        if not run_stdlib(interpreter, stdlib_source):
+        if not run_stdlib(interpreter, stdlib_source, stdlib_path):
             return None, interpreter
 
-    ast = lex_and_parse_as_root(source)
-    if not ast:
-        return None, interpreter
-
-    code = ast.compile(CodeContext())
-    process = interpreter.add_process(code.finalize())
+    code = load_code(source, path)
+    process = interpreter.add_process(code)
     interpreter.interpret()
 
     return process, interpreter
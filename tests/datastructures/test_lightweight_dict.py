@@ -2,6 +2,7 @@
 import pytest
 
 from tinySelf.datastructures.lightweight_dict import LightWeightDict
+from tinySelf.vm.symbols import Symbol
 
 
 def test_lightweight_dict_init():
@@ -112,3 +113,43 @@ def test_lightweight_dict_more():
 
     assert lwd.keys() == ["a", "c", "d", "e", "f"]
     assert lwd.values() == [1, 3, 4, 5, 6]
+
+
+def test_lightweight_dict_copy_is_independent():
+    for number_of_items in [2, 5, 12]:
+        lwd = LightWeightDict()
+        for i in range(number_of_items):
+            lwd[str(i)] = i
+
+        copy = lwd.copy()
+        copy["new"] = -1
+        copy["0"] = 100
+        lwd["other"] = -2
+
+        assert "new" not in lwd
+        assert "other" not in copy
+        assert lwd["0"] == 0
+        assert copy["0"] == 100
+        assert len(copy) == number_of_items + 1
+
+
+def test_lightweight_dict_compares_keys_by_identity():
+    for number_of_items in [1, 5, 12]:
+        lwd = LightWeightDict()
+        for i in range(number_of_items - 1):
+            lwd[Symbol("key%d" % i, i)] = i
+
+        symbol = Symbol("xe", number_of_items)
+        same_name = Symbol("xe", number_of_items)
+        lwd[symbol] = -1
+
+        assert symbol in lwd
+        assert lwd[symbol] == -1
+        assert same_name not in lwd
+        assert lwd.get(same_name) is None
+
+        with pytest.raises(KeyError):
+            assert lwd[same_name]
+
+        del lwd[same_name]
+        assert len(lwd) == number_of_items
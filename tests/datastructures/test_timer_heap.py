@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from pytest import raises
+
+from tinySelf.datastructures.timer_heap import TimerHeap
+
+
+def test_timer_heap():
+    th = TimerHeap()
+    assert len(th) == 0
+
+    with raises(IndexError):
+        th.pop()
+
+    th.push(3.0, "c")
+    th.push(1.0, "a")
+    th.push(5.0, "e")
+    th.push(2.0, "b")
+    th.push(4.0, "d")
+
+    assert len(th) == 5
+    assert th.next_deadline() == 1.0
+
+    assert [th.pop() for _ in range(5)] == ["a", "b", "c", "d", "e"]
+    assert len(th) == 0
+
+
+def test_timer_heap_same_deadline_keeps_order():
+    th = TimerHeap()
+
+    th.push(1.0, "first")
+    th.push(1.0, "second")
+    th.push(0.5, "zero")
+    th.push(1.0, "third")
+
+    assert [th.pop() for _ in range(4)] == ["zero", "first", "second", "third"]
+
+
+def test_timer_heap_pop_expired():
+    th = TimerHeap()
+
+    th.push(1.0, "a")
+    th.push(3.0, "c")
+    th.push(2.0, "b")
+
+    assert th.pop_expired(0.5) == []
+    assert th.pop_expired(2.0) == ["a", "b"]
+    assert len(th) == 1
+    assert th.next_deadline() == 3.0
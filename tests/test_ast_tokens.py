@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+from tinySelf.parser import lex_and_parse
+from tinySelf.parser.ast_tokens import SourcePos
+from tinySelf.parser.ast_tokens import SourceLines
 from tinySelf.parser.ast_tokens import _escape_sequences
 
 
@@ -8,3 +11,29 @@ def test_escape_sequences():
     assert _escape_sequences(r"\t") == "\t"
     assert _escape_sequences(r"\'") == "'"
     assert _escape_sequences(r'\"') == '"'
+
+
+def test_source_snippet_is_materialized_lazily():
+    source_lines = SourceLines("first\n  (| a = 1 |)\nlast")
+    source_pos = SourcePos(2, 3, 2, 13, source_lines)
+
+    assert source_lines._lines is None
+
+    assert source_pos.source_snippet == "(| a = 1 |)"
+    assert source_lines.lines() == ["first", "  (| a = 1 |)", "last"]
+
+
+def test_source_snippet_without_source():
+    source_pos = SourcePos(1, 1, 1, 5)
+    assert source_pos.source_snippet == ""
+
+    source_pos.source_snippet = "(| |)"
+    assert source_pos.source_snippet == "(| |)"
+
+
+def test_parsed_objects_share_the_source_lines():
+    obj = lex_and_parse("(| a = (| b = 1 |) |)")[0]
+    nested = obj.slots["a"]
+
+    assert obj.source_pos.source_lines is nested.source_pos.source_lines
+    assert nested.source_pos.source_snippet == "(| b = 1 |)"
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from tinySelf.parser import lex_and_parse
+from tinySelf.vm.frames import VM_STATE
+from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.snapshot import save_singletons
+from tinySelf.vm.snapshot import restore_singletons
+
+
+@pytest.fixture
+def new_os_process():
+    """
+    Function, which puts nil, true, false and the block traits back into the
+    state from the start of the test and forgets that the code ran, as if
+    the VM was started in the new OS process. The state is put back after
+    the test, too.
+    """
+    singletons = save_singletons()
+    code_ran = VM_STATE.code_ran
+
+    def new_process():
+        restore_singletons(singletons)
+        VM_STATE.code_ran = False
+
+    yield new_process
+
+    restore_singletons(singletons)
+    VM_STATE.code_ran = code_ran
+
+
+@pytest.fixture
+def add_process():
+    """
+    Function, which compiles the first expression of the `source` and adds
+    it as a new process of the `interpreter`.
+    """
+    def add_process(interpreter, source):
+        ast = lex_and_parse(source)
+        return interpreter.add_process(ast[0].compile(CodeContext()))
+
+    return add_process
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import os
+
+from tinySelf.vm.primitives import get_primitives
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.primitives import PrimitiveStrObject
+from tinySelf.vm.primitives.io_primitives import _set_nonblocking
+from tinySelf.vm.interpreter import Interpreter
+
+
+def _nonblocking_pipe():
+    read_fd, write_fd = os.pipe()
+    _set_nonblocking(read_fd)
+    _set_nonblocking(write_fd)
+
+    return read_fd, write_fd
+
+
+def test_read_blocks_only_the_calling_process(add_process):
+    read_fd, write_fd = _nonblocking_pipe()
+
+    interpreter = Interpreter(universe=get_primitives())
+    reader = add_process(
+        interpreter,
+        "(| run = (|| primitives io read: %d Size: 5) |) run" % read_fd
+    )
+    writer = add_process(
+        interpreter,
+        "(| run = (|| primitives io write: %d Data: 'hello') |) run" % write_fd
+    )
+
+    interpreter.interpret()
+
+    assert writer.finished
+    assert writer.result == PrimitiveIntObject(5)
+    assert reader.finished
+    assert reader.result == PrimitiveStrObject("hello")
+
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_read_from_blocking_fd_blocks_only_the_calling_process(add_process):
+    # like stdin; descriptors not opened by `io` stay in the blocking mode
+    read_fd, write_fd = os.pipe()
+
+    interpreter = Interpreter(universe=get_primitives())
+    reader = add_process(
+        interpreter,
+        "(| run = (|| primitives io read: %d Size: 5) |) run" % read_fd
+    )
+    writer = add_process(
+        interpreter,
+        "(| run = (|| primitives io write: %d Data: '%s') |) run" % (
+            write_fd, "x" * 1000
+        )
+    )
+
+    interpreter.interpret()
+
+    assert writer.finished
+    assert writer.result == PrimitiveIntObject(512)
+    assert reader.finished
+    assert reader.result == PrimitiveStrObject("xxxxx")
+
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_interpreter_polls_when_all_processes_wait(add_process):
+    read_fd, write_fd = _nonblocking_pipe()
+
+    interpreter = Interpreter(universe=get_primitives())
+    reader = add_process(
+        interpreter,
+        "(| run = (|| primitives io read: %d Size: 5) |) run" % read_fd
+    )
+    writer = add_process(interpreter, """(|
+        run = (||
+            primitives interpreter sleep: 0.1.
+            primitives io write: %d Data: 'data'
+        )
+    |) run""" % write_fd)
+
+    # both processes are blocked or sleeping for a while
+    interpreter.interpret()
+
+    assert writer.finished
+    assert reader.finished
+    assert reader.result == PrimitiveStrObject("data")
+
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def test_failure_after_wait_is_raised_in_the_process(add_process):
+    read_fd, write_fd = _nonblocking_pipe()
+
+    # fill the pipe, so the write blocks
+    try:
+        while True:
+            os.write(write_fd, "x" * 4096)
+    except OSError:
+        pass
+
+    interpreter = Interpreter(universe=get_primitives())
+    writer = add_process(
+        interpreter,
+        "(| run = (|| primitives io write: %d Data: 'data') |) run" % write_fd
+    )
+    closer = add_process(interpreter, """(|
+        run = (||
+            primitives interpreter sleep: 0.1.
+            primitives io close: %d
+        )
+    |) run""" % read_fd)
+
+    interpreter.interpret()
+
+    assert closer.finished
+    assert writer.finished
+    assert writer.finished_with_error
+
+    os.close(write_fd)
+
+
+def test_file_write_and_read(tmpdir, add_process):
+    path = str(tmpdir.join("test.txt"))
+
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(interpreter, """(|
+        run = (| fd. data |
+            fd: primitives io open: '%s' Mode: 'w'.
+            primitives io write: fd Data: 'content'.
+            primitives io close: fd.
+
+            fd: primitives io open: '%s' Mode: 'r'.
+            data: primitives io read: fd Size: 100.
+            primitives io close: fd.
+
+            data
+        )
+    |) run""" % (path, path))
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert not process.finished_with_error
+    assert process.result == PrimitiveStrObject("content")
+
+
+def test_socket_pair(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(interpreter, """(|
+        run = (| pair. data |
+            pair: primitives io socketPair.
+            primitives io write: pair first Data: 'ping'.
+            data: primitives io read: pair second Size: 4.
+            primitives io close: pair first.
+            primitives io close: pair second.
+
+            data
+        )
+    |) run""")
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert process.result == PrimitiveStrObject("ping")
+
+
+def test_open_error_is_raised(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(
+        interpreter,
+        "(| run = (|| primitives io open: '/nonexistent/file' Mode: 'r') |) run"
+    )
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert process.finished_with_error
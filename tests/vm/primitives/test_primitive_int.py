@@ -2,9 +2,11 @@
 import pytest
 
 from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.primitives import get_primitive_int
 from tinySelf.vm.primitives import PrimitiveStrObject
 from tinySelf.vm.primitives import PrimitiveTrueObject
 from tinySelf.vm.primitives import PrimitiveFalseObject
+from tinySelf.vm.primitives.primitive_int import SMALL_INT_MAX
 
 
 def call_primitive_int_binary_op(first, op, second, equals):
@@ -78,4 +80,14 @@ def test_PrimitiveIntObject_as_primitive_string():
     plus_slot = o.slot_lookup("asString")
     assert plus_slot.map.primitive_code
     result = plus_slot.map.primitive_code(None, o, [])
-    assert result == PrimitiveStrObject("2")
\ No newline at end of file
+    assert result == PrimitiveStrObject("2")
+
+
+def test_small_ints_are_shared():
+    assert get_primitive_int(1) is get_primitive_int(1)
+    assert get_primitive_int(-1) is get_primitive_int(-1)
+    assert get_primitive_int(SMALL_INT_MAX + 1) is not get_primitive_int(SMALL_INT_MAX + 1)
+
+    o = get_primitive_int(1)
+    result = o.slot_lookup("+").map.primitive_code(None, o, [get_primitive_int(2)])
+    assert result is get_primitive_int(3)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+import os
+
+from tinySelf.vm.primitives import get_primitives
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.primitives import PrimitiveStrObject
+from tinySelf.vm.primitives import PrimitiveNilObject
+from tinySelf.vm.primitives import PrimitiveTrueObject
+from tinySelf.vm.primitives import PrimitiveFloatObject
+from tinySelf.vm.primitives import worker_primitives
+from tinySelf.vm.primitives.worker_primitives import serialize_value
+from tinySelf.vm.primitives.worker_primitives import deserialize_value
+from tinySelf.vm.primitives.worker_primitives import FRAME_HEADER_SIZE
+from tinySelf.vm.interpreter import Interpreter
+from tinySelf.vm.object_layout import Object
+
+
+def test_value_serialization():
+    values = [
+        PrimitiveNilObject(),
+        PrimitiveTrueObject(),
+        PrimitiveIntObject(-42),
+        PrimitiveFloatObject(0.1),
+        PrimitiveStrObject("multi\nline"),
+    ]
+
+    for value in values:
+        frame = serialize_value(value)
+        assert deserialize_value(frame[0], frame[FRAME_HEADER_SIZE:]) == value
+
+    assert serialize_value(Object()) == ""
+    assert deserialize_value("i", "not a number") is None
+
+
+def test_spawned_worker_answers_through_the_channel(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(interpreter, """(|
+        run = (| worker. result |
+            worker: primitives workers spawn: '(|
+                run = (| parent |
+                    parent: primitives workers parent.
+                    parent send: (parent receive) * 2.
+                    parent send: \\'done\\'.
+                )
+            |) run'.
+            worker send: 21.
+            result: worker receive.
+            worker receive.
+            worker wait.
+            worker close.
+
+            result
+        )
+    |) run""")
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert not process.finished_with_error
+    assert process.result == PrimitiveIntObject(42)
+
+
+def test_receive_from_finished_worker_raises_error(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(interpreter, """(|
+        run = (| worker |
+            worker: primitives workers spawn: '()'.
+            worker receive
+        )
+    |) run""")
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert process.finished_with_error
+
+
+def test_later_worker_does_not_keep_earlier_channel_open(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(interpreter, """(|
+        run = (| first. second |
+            first: primitives workers spawn: '()'.
+            second: primitives workers spawn: '(|
+                run = (|| primitives workers parent receive)
+            |) run'.
+            first receive
+        )
+    |) run""")
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert process.finished_with_error
+
+    for channel in interpreter.channels:
+        os.close(channel.fd)
+        os.waitpid(channel.pid, 0)
+
+
+def test_parent_is_nil_outside_of_the_worker(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(
+        interpreter,
+        "(| run = (|| primitives workers parent) |) run"
+    )
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert process.result == PrimitiveNilObject()
+
+
+def test_wait_blocks_only_the_calling_process(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    worker = worker_primitives._spawn(interpreter, None, [PrimitiveStrObject(
+        "(| run = (|| primitives workers parent receive) |) run"
+    )])
+    interpreter.universe.meta_add_slot("worker", worker)
+
+    # the worker exits only after the second process sends it the value
+    waiter = add_process(interpreter, "(| run = (|| worker wait) |) run")
+    add_process(interpreter, "(| run = (|| worker send: 1) |) run")
+
+    interpreter.interpret()
+
+    assert waiter.finished
+    assert not waiter.finished_with_error
+    assert waiter.result == PrimitiveIntObject(0)
+
+
+def test_concurrent_sends_wait_in_the_queue(monkeypatch, add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    worker = worker_primitives._spawn(interpreter, None, [PrimitiveStrObject(
+        """(| run = (| parent |
+            parent: primitives workers parent.
+            parent receive.
+            parent receive.
+            parent send: 'done'.
+        ) |) run"""
+    )])
+    interpreter.universe.meta_add_slot("worker", worker)
+
+    attempts_of_waiting_sends = []
+    original_attempt = worker_primitives._PendingSend.attempt
+
+    def attempt(self):
+        if self.channel.sender is not self:
+            attempts_of_waiting_sends.append(self)
+
+        return original_attempt(self)
+
+    monkeypatch.setattr(worker_primitives._PendingSend, "attempt", attempt)
+
+    # 1MB, more than fits into the socket buffer
+    send = "(| run = (| data | data: 'x'. %s worker send: data) |) run" % (
+        "data: data + data. " * 20
+    )
+    first_sender = add_process(interpreter, send)
+    second_sender = add_process(interpreter, send)
+    receiver = add_process(interpreter, """(|
+        run = (| result | result: worker receive. worker wait. result)
+    |) run""")
+
+    interpreter.interpret()
+
+    assert not first_sender.finished_with_error
+    assert not second_sender.finished_with_error
+    assert receiver.result == PrimitiveStrObject("done")
+    assert not attempts_of_waiting_sends
+
+
+def test_pool_dispatches_values_round_robin(add_process):
+    interpreter = Interpreter(universe=get_primitives())
+    process = add_process(interpreter, """(|
+        run = (| pool. result |
+            pool: primitives workers spawn: '(|
+                run = (| parent |
+                    parent: primitives workers parent.
+                    parent send: (parent receive) * 2.
+                    parent send: (parent receive) * 2.
+                )
+            |) run' Count: 2.
+
+            pool send: 1.
+            pool send: 2.
+            pool send: 3.
+            pool send: 4.
+
+            result: (pool receive) * 1000.
+            result: result + ((pool receive) * 100).
+            result: result + ((pool receive) * 10).
+            result: result + (pool receive).
+
+            result: result + ((pool size) * 10000).
+            result: result + ((pool wait) * 100000).
+            pool close.
+
+            result
+        )
+    |) run""")
+
+    interpreter.interpret()
+
+    assert process.finished
+    assert not process.finished_with_error
+    assert process.result == PrimitiveIntObject(22468)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import os
+
+from tinySelf.vm.primitives import get_primitives
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.interpreter import Interpreter
+from tinySelf.vm.code_context import ObjBox
+from tinySelf.vm import bytecode_cache
+from tinySelf.vm.bytecode_cache import load_code
+from tinySelf.vm.bytecode_cache import cache_path
+
+
+SOURCE = "(| run = (|| 1 + 2) |) run"
+
+
+def _run(code):
+    interpreter = Interpreter(universe=get_primitives())
+    process = interpreter.add_process(code)
+    interpreter.interpret()
+
+    return process.result
+
+
+def _write_script(tmpdir, source):
+    script = tmpdir.join("script.tself")
+    script.write(source)
+
+    return str(script)
+
+
+def test_cache_path():
+    assert cache_path("dir/script.tself") == "dir/__tselfcache__/script.tselfc"
+    assert cache_path("script.tself") == "__tselfcache__/script.tselfc"
+
+
+def test_load_code_writes_and_uses_the_cache(tmpdir, monkeypatch):
+    path = _write_script(tmpdir, SOURCE)
+
+    code = load_code(SOURCE, path)
+    assert os.path.exists(cache_path(path))
+    assert _run(code) == PrimitiveIntObject(3)
+
+    def fail(source):
+        raise AssertionError("Source shouldn't be compiled.")
+
+    monkeypatch.setattr(bytecode_cache, "compile_source", fail)
+
+    cached_code = load_code(SOURCE, path)
+    assert cached_code.bytecodes == code.bytecodes
+    assert _run(cached_code) == PrimitiveIntObject(3)
+
+
+def test_changed_source_invalidates_the_cache(tmpdir):
+    path = _write_script(tmpdir, SOURCE)
+    load_code(SOURCE, path)
+
+    # same mtime, but different content
+    new_source = SOURCE.replace("1 + 2", "3 + 4")
+    stat = os.stat(path)
+    _write_script(tmpdir, new_source)
+    os.utime(path, (stat.st_atime, stat.st_mtime))
+
+    assert _run(load_code(new_source, path)) == PrimitiveIntObject(7)
+
+
+def test_corrupted_cache_is_recompiled(tmpdir):
+    path = _write_script(tmpdir, SOURCE)
+    load_code(SOURCE, path)
+
+    with open(cache_path(path), "r+") as f:
+        f.truncate(30)
+
+    assert _run(load_code(SOURCE, path)) == PrimitiveIntObject(3)
+
+
+def test_source_without_path_is_not_cached():
+    assert _run(load_code(SOURCE)) == PrimitiveIntObject(3)
+    assert not os.path.exists(cache_path(""))
+
+
+def test_cache_with_changed_byte_is_recompiled(tmpdir):
+    path = _write_script(tmpdir, SOURCE)
+    load_code(SOURCE, path)
+
+    with open(cache_path(path)) as f:
+        data = f.read()
+
+    for i in xrange(len(data) - 40, len(data)):
+        with open(cache_path(path), "w") as f:
+            f.write(data[:i] + chr(ord(data[i]) ^ 0x01) + data[i + 1:])
+
+        assert _run(load_code(SOURCE, path)) == PrimitiveIntObject(3)
+
+
+def _method_contexts(code):
+    return [literal.value.map.code_context for literal in code.literals
+            if isinstance(literal, ObjBox) and literal.value.map.code_context]
+
+
+def test_not_executed_bodies_are_not_compiled(tmpdir):
+    source = "(| run = (|| 1 + 2). unused = (|| 3 + 4) |) run"
+    path = _write_script(tmpdir, source)
+
+    for _ in xrange(2):  # written and then loaded from the cache
+        code = load_code(source, path)
+        run_context, unused_context = _method_contexts(code)
+        assert not run_context.is_compiled()
+        assert not unused_context.is_compiled()
+
+        assert _run(code) == PrimitiveIntObject(3)
+        assert run_context.is_compiled()
+        assert not unused_context.is_compiled()
+
+    unused_context.finalize()
+    assert unused_context.opcodes
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+from tinySelf.parser import lex_and_parse
+
+from pytest import raises
+
+from tinySelf.vm.bytecodes import BYTECODE_SEND
+from tinySelf.vm.bytecodes import BYTECODE_ADD_SLOT
+from tinySelf.vm.bytecodes import BYTECODE_PUSH_SELF
+from tinySelf.vm.bytecodes import BYTECODE_PUSH_LITERAL
+from tinySelf.vm.bytecodes import BYTECODE_SELF_SEND
+from tinySelf.vm.bytecodes import BYTECODE_SEND_LITERAL
+from tinySelf.vm.bytecodes import BYTECODE_ADD_LITERAL_SLOT
+from tinySelf.vm.bytecodes import BYTECODE_RETURN_TOP
+from tinySelf.vm.bytecodes import LITERAL_TYPE_INT
+from tinySelf.vm.bytecodes import SLOT_NORMAL
+from tinySelf.vm.bytecodes import SEND_TYPE_KEYWORD
+from tinySelf.vm.bytecodes import disassemble
+from tinySelf.vm.bytecodes import bytecode_tokenizer
+from tinySelf.vm.bytecodes import bytecode_detokenizer
+from tinySelf.vm.bytecodes import instruction_tokenizer
+from tinySelf.vm.code_context import ObjBox
+from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.code_context import InlineCache
+from tinySelf.vm.code_context import MAX_POLYMORPHIC_CACHE_SIZE
+from tinySelf.vm.object_layout import Object
+
+from tinySelf.vm.primitives import get_primitives
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.interpreter import Interpreter
+from tinySelf.vm.symbols import intern_symbol
+
+
+def test_wide_operands_roundtrip():
+    tokens = [
+        [0, BYTECODE_PUSH_SELF],
+        [1, BYTECODE_PUSH_LITERAL, LITERAL_TYPE_INT, 300],
+        [2, BYTECODE_SEND, SEND_TYPE_KEYWORD, 1000],
+        [3, BYTECODE_ADD_SLOT, SLOT_NORMAL],
+    ]
+
+    bytecodes = bytecode_detokenizer(tokens)
+
+    assert len(bytecodes) == 1 + 4 + 4 + 2
+    assert bytecode_tokenizer(bytecodes) == tokens
+    assert disassemble(bytecodes)[1] == ["1", "PUSH_LITERAL", "type:INT", "index:300"]
+
+
+def test_too_wide_operand():
+    with raises(ValueError):
+        bytecode_detokenizer([[0, BYTECODE_PUSH_LITERAL, LITERAL_TYPE_INT, 0x10000]])
+
+
+def test_instruction_tokenizer():
+    bytecodes = [BYTECODE_PUSH_SELF,
+                 BYTECODE_PUSH_LITERAL, LITERAL_TYPE_INT, 256,
+                 BYTECODE_ADD_SLOT, SLOT_NORMAL]
+
+    assert instruction_tokenizer(bytecodes) == [
+        [0, BYTECODE_PUSH_SELF],
+        [1, BYTECODE_PUSH_LITERAL, LITERAL_TYPE_INT, 256],
+        [2, BYTECODE_ADD_SLOT, SLOT_NORMAL],
+    ]
+
+    with raises(ValueError):
+        instruction_tokenizer([BYTECODE_PUSH_LITERAL, LITERAL_TYPE_INT])
+
+
+def test_finalize_predecodes_operands():
+    ast = lex_and_parse("(| a = 1. |) a + 2")
+    context = ast[0].compile(CodeContext()).finalize()
+
+    tokens = bytecode_tokenizer(context.bytecodes)
+
+    assert len(context.opcodes) == len(tokens)
+    for token in tokens:
+        if len(token) > 2:
+            assert context.operands_a[token[0]] == token[2]
+        if len(token) > 3:
+            assert context.operands_b[token[0]] == token[3]
+
+
+def test_object_with_more_than_255_literals():
+    slots = " ".join("slot_%d = %d." % (i, i) for i in range(300))
+    ast = lex_and_parse("(| %s |) slot_299" % slots)
+
+    context = ast[0].compile(CodeContext())
+    assert len(context.literals) > 255
+
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+    interpreter.interpret()
+
+    assert interpreter.process.result == PrimitiveIntObject(299)
+
+
+def test_inline_caches_are_created_for_send_sites():
+    ast = lex_and_parse("(| a = 1. |) a + 2")
+    context = ast[0].compile(CodeContext()).finalize()
+
+    send_indexes = [token[0] for token in bytecode_tokenizer(context.bytecodes)
+                    if token[1] == BYTECODE_SEND]
+
+    assert len(send_indexes) == 2
+    for index, inline_cache in enumerate(context.inline_caches):
+        if index in send_indexes:
+            assert isinstance(inline_cache, InlineCache)
+        else:
+            assert inline_cache is None
+
+
+def test_clone_of_finalized_context():
+    ast = lex_and_parse("(| a = 1. |) a + 2")
+    context = ast[0].compile(CodeContext()).finalize()
+
+    clone = context.clone()
+
+    assert clone.is_compiled()
+    assert clone.bytecodes == context.bytecodes
+    assert clone.opcodes == context.opcodes
+    assert clone.inline_caches == context.inline_caches
+    assert clone.symbols == context.symbols
+    assert clone.number_of_locals == context.number_of_locals
+
+    interpreter = Interpreter(universe=get_primitives(), code_context=clone)
+    interpreter.interpret()
+
+    assert interpreter.process.result == PrimitiveIntObject(3)
+
+
+def test_inline_cache_hit():
+    o = Object()
+    o.meta_add_slot("a", PrimitiveIntObject(1))
+
+    inline_cache = InlineCache()
+    assert inline_cache.lookup(o) is None
+
+    inline_cache.store(o.map, o.map._slots[intern_symbol("a")])
+    assert inline_cache.lookup(o) == PrimitiveIntObject(1)
+
+    o.set_slot("a", PrimitiveIntObject(2))
+    assert inline_cache.lookup(o) == PrimitiveIntObject(2)
+
+    clone = o.clone()
+    assert inline_cache.lookup(clone) == PrimitiveIntObject(2)
+
+
+def test_inline_cache_is_invalidated_by_map_change():
+    o = Object()
+    o.meta_add_slot("a", PrimitiveIntObject(1))
+
+    inline_cache = InlineCache()
+    inline_cache.store(o.map, o.map._slots[intern_symbol("a")])
+
+    o.meta_add_slot("b", PrimitiveIntObject(2))
+    assert inline_cache.lookup(o) is None
+
+
+def test_inline_cache_parent_hit():
+    a_symbol = intern_symbol("a")
+
+    trait = Object()
+    trait.meta_add_slot("a", PrimitiveIntObject(1))
+
+    o = Object()
+    o.meta_add_parent("p", trait)
+
+    inline_cache = InlineCache()
+    inline_cache.store_parent(o.map, o.parent_lookup_entry(a_symbol))
+    assert inline_cache.lookup(o) == PrimitiveIntObject(1)
+
+    trait.set_slot("a", PrimitiveIntObject(2))
+    assert inline_cache.lookup(o) == PrimitiveIntObject(2)
+
+    # new slot in the trait changes its map, which invalidates the entry
+    trait.meta_add_slot("b", PrimitiveIntObject(3))
+    assert inline_cache.lookup(o) is None
+
+
+def test_inline_cache_scope_parent_hit():
+    scope = Object()
+    scope.meta_add_slot("a", PrimitiveIntObject(1))
+
+    o = Object()
+    o.scope_parent = scope
+
+    inline_cache = InlineCache()
+    inline_cache.store_scope_parent(o.map, scope.map,
+                                    scope.map._slots[intern_symbol("a")])
+    assert inline_cache.lookup(o) == PrimitiveIntObject(1)
+
+    other = Object()
+    other.scope_parent = Object()
+    assert inline_cache.lookup(other) is None
+
+    scope.meta_add_slot("b", PrimitiveIntObject(2))
+    assert inline_cache.lookup(o) is None
+
+
+def test_send_caches_slots_found_in_parents():
+    ast = lex_and_parse("""(|
+        run = (| result <- 0. o |
+            o: (| p* = (| a = (|| 1) |) |).
+            result: o a.
+            result: result + (o a).
+            result
+        )
+    |) run""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+    interpreter.interpret()
+
+    assert interpreter.process.result == PrimitiveIntObject(2)
+
+
+def test_inline_cache_polymorphic_and_megamorphic():
+    inline_cache = InlineCache()
+
+    objects = []
+    for _ in range(MAX_POLYMORPHIC_CACHE_SIZE):
+        o = Object()
+        o.meta_add_slot("a", PrimitiveIntObject(1))
+        inline_cache.store(o.map, o.map._slots[intern_symbol("a")])
+        objects.append(o)
+
+    for o in objects:
+        assert inline_cache.lookup(o) == PrimitiveIntObject(1)
+
+    o = Object()
+    o.meta_add_slot("a", PrimitiveIntObject(1))
+    inline_cache.store(o.map, o.map._slots[intern_symbol("a")])
+
+    assert inline_cache.is_megamorphic
+    assert inline_cache.lookup(o) is None
+    assert inline_cache.lookup(objects[0]) is None
+
+
+def _compiled_methods(context):
+    return [
+        literal.value.code_context
+        for literal in context.literals
+        if isinstance(literal, ObjBox) and literal.value.code_context
+    ]
+
+
+def test_finalize_fuses_superinstructions():
+    ast = lex_and_parse("(| a = 1. b = (|| a) |) a + 2")
+    context = ast[0].compile(CodeContext())
+    context.compile_eagerly()
+
+    assert context.opcodes == [
+        BYTECODE_PUSH_LITERAL,
+        BYTECODE_ADD_LITERAL_SLOT,
+        BYTECODE_PUSH_LITERAL,
+        BYTECODE_ADD_SLOT,
+        BYTECODE_ADD_LITERAL_SLOT,
+        BYTECODE_PUSH_LITERAL,
+        BYTECODE_ADD_SLOT,
+        BYTECODE_SEND_LITERAL,
+        BYTECODE_SEND,
+        BYTECODE_PUSH_LITERAL,
+        BYTECODE_SEND_LITERAL,
+        BYTECODE_SEND,
+        BYTECODE_RETURN_TOP,
+    ]
+
+    method_context = _compiled_methods(context)[0]
+    assert method_context.opcodes == [
+        BYTECODE_SELF_SEND,
+        BYTECODE_SEND_LITERAL,
+        BYTECODE_SEND,
+        BYTECODE_RETURN_TOP,
+    ]
+
+
+def test_frame_metadata():
+    code = lex_and_parse("""(|
+        a = (| :x. :y. | x + y).
+        b = (| c. d. | c: [:e | e]. c).
+        f = (| g = 1. | (| h = [1] | ) h).
+    |)""")[0]
+
+    context = code.compile(CodeContext())
+    a_context, b_context, f_context = _compiled_methods(context)[:3]
+
+    assert a_context.number_of_parameters == 2
+    assert a_context.number_of_locals == 0
+    assert not a_context.needs_closure
+
+    assert b_context.number_of_parameters == 0
+    assert b_context.number_of_locals == 4  # getters and setters
+    assert b_context.needs_closure
+
+    assert f_context.number_of_locals == 1
+    assert f_context.needs_closure
+
+
+def test_frame_metadata_of_nested_method_is_not_propagated():
+    code = lex_and_parse("""(|
+        a = (| b = (| | [1] ). | b).
+    |)""")[0]
+
+    a_context = _compiled_methods(code.compile(CodeContext()))[0]
+    assert not a_context.needs_closure
+
+
+def test_method_bodies_are_compiled_on_first_activation():
+    code = lex_and_parse("""(|
+        a = (|| 1 + 2).
+        b = (|| 3).
+    |) a""")[0]
+
+    context = code.compile(CodeContext()).finalize()
+    a_context, b_context = _compiled_methods(context)
+
+    assert not a_context.is_compiled()
+    assert not b_context.is_compiled()
+
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+    interpreter.interpret()
+
+    assert interpreter.process.result == PrimitiveIntObject(3)
+    assert a_context.is_compiled()
+    assert a_context.opcodes
+    assert not b_context.is_compiled()
+
+
+def test_eager_compilation():
+    code = lex_and_parse("(| a = (|| [:x | x] value: 1) |)")[0]
+
+    context = CodeContext()
+    context.compile_lazily = False
+    code.compile(context)
+
+    a_context = _compiled_methods(context)[0]
+    assert a_context.is_compiled()
+    assert _compiled_methods(a_context)[0].is_compiled()
+
+
+def test_compile_eagerly_compiles_nested_bodies():
+    code = lex_and_parse("(| a = (|| [:x | x] value: 1) |)")[0]
+    context = code.compile(CodeContext())
+
+    assert context.compile_eagerly()
+    assert not context.compile_eagerly()
+
+    a_context = _compiled_methods(context)[0]
+    assert a_context.opcodes
+    assert _compiled_methods(a_context)[0].opcodes
+
+
+def test_immutable_literals_are_materialized_in_finalize():
+    context = CodeContext()
+    for expression in lex_and_parse('1. 2.5. "str"'):
+        expression.compile(context)
+
+    assert all(literal.obj is None for literal in context.literals)
+
+    context.finalize()
+
+    int_obj, float_obj, str_obj = [literal.obj for literal in context.literals]
+    assert int_obj.value == 1
+    assert float_obj.value == 2.5
+    assert str_obj.value == "str"
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from pytest import raises
+
+from tinySelf.parser import lex_and_parse
+from tinySelf.parser import lex_and_parse_as_root
+from tinySelf.vm.primitives import get_primitives
+from tinySelf.vm.primitives import PrimitiveStrObject
+from tinySelf.vm.interpreter import Interpreter
+from tinySelf.vm.code_context import ObjBox
+from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.code_serialization import Reader
+from tinySelf.vm.code_serialization import Writer
+from tinySelf.vm.code_serialization import SerializationError
+from tinySelf.vm.code_serialization import serialize_code_context
+from tinySelf.vm.code_serialization import deserialize_code_context
+
+
+SOURCE = """(|
+    add: a To: b = (|| a + b).
+    test = (| tmp |
+        tmp: (add: 1 To: 2) + (add: 1.5 To: 1).
+        tmp: (add: 'a' To: 'b').
+        ^ (add: 2 To: 3) asString + tmp.
+    )
+|) test"""
+
+
+def test_writer_and_reader():
+    writer = Writer()
+    writer.write_uint(0xDEADBEEF)
+    writer.write_bool(True)
+    writer.write_str("xex")
+    writer.write_int(-42)
+    writer.write_float(0.1)
+
+    reader = Reader(writer.getvalue())
+    assert reader.read_uint() == 0xDEADBEEF
+    assert reader.read_bool()
+    assert reader.read_str() == "xex"
+    assert reader.read_int() == -42
+    assert reader.read_float() == 0.1
+    assert reader.at_end()
+
+    with raises(SerializationError):
+        reader.read_uint()
+
+
+def _assert_same_code(original, loaded):
+    assert loaded.bytecodes == original.bytecodes
+    assert loaded.opcodes == original.opcodes
+    assert loaded.symbols == original.symbols
+    assert loaded.max_stack_depth == original.max_stack_depth
+    assert loaded.number_of_locals == original.number_of_locals
+    assert loaded.needs_closure == original.needs_closure
+    assert len(loaded.literals) == len(original.literals)
+
+    for original_literal, loaded_literal in zip(original.literals, loaded.literals):
+        assert loaded_literal.literal_type == original_literal.literal_type
+
+        if isinstance(original_literal, ObjBox):
+            original_obj = original_literal.value
+            loaded_obj = loaded_literal.value
+            assert loaded_obj.map.parameters == original_obj.map.parameters
+
+            if original_obj.map.code_context is None:
+                assert loaded_obj.map.code_context is None
+            else:
+                _assert_same_code(original_obj.map.code_context,
+                                  loaded_obj.map.code_context)
+        else:
+            assert loaded_literal.value == original_literal.value
+
+
+def test_code_context_round_trip():
+    code = lex_and_parse(SOURCE)[0].compile(CodeContext())
+    code.compile_eagerly()
+    loaded = deserialize_code_context(serialize_code_context(code))
+
+    _assert_same_code(code, loaded)
+
+
+def test_loaded_code_is_interpreted():
+    code = lex_and_parse(SOURCE)[0].compile(CodeContext())
+    loaded = deserialize_code_context(serialize_code_context(code), SOURCE)
+
+    interpreter = Interpreter(universe=get_primitives())
+    process = interpreter.add_process(loaded)
+    interpreter.interpret()
+
+    assert process.result == PrimitiveStrObject("5ab")
+
+
+def test_loaded_block_keeps_source_position():
+    source = """(|
+        test = (||
+            [:x | x] asString
+        )
+    |) test"""
+    code = lex_and_parse_as_root(source).compile(CodeContext())
+
+    loaded = deserialize_code_context(serialize_code_context(code), source)
+
+    interpreter = Interpreter(universe=get_primitives())
+    process = interpreter.add_process(loaded)
+    interpreter.interpret()
+
+    assert process.result == PrimitiveStrObject("[:x | x]")
+
+
+def test_not_compiled_bodies_are_stored_without_bytecodes():
+    code = lex_and_parse(SOURCE)[0].compile(CodeContext())
+    loaded = deserialize_code_context(serialize_code_context(code), SOURCE)
+
+    methods = [literal.value.map.code_context for literal in loaded.literals
+               if isinstance(literal, ObjBox) and literal.value.map.code_context]
+    assert len(methods) == 2
+    assert not any(method.is_compiled() for method in methods)
+    assert methods[1].number_of_locals == 2  # tmp and tmp:
+
+    original = [literal.value.map.code_context for literal in code.literals
+                if isinstance(literal, ObjBox) and literal.value.map.code_context]
+    for method, original_method in zip(methods, original):
+        assert method.finalize().bytecodes == original_method.finalize().bytecodes
+
+
+def test_not_compiled_bodies_need_the_source():
+    code = lex_and_parse(SOURCE)[0].compile(CodeContext())
+
+    with raises(SerializationError):
+        deserialize_code_context(serialize_code_context(code))
+
+
+def test_truncated_data_raises_error():
+    code = lex_and_parse(SOURCE)[0].compile(CodeContext())
+    data = serialize_code_context(code)
+
+    with raises(SerializationError):
+        deserialize_code_context(data[:len(data) / 2])
+
+
+def test_corrupted_data_raises_error():
+    code = lex_and_parse(SOURCE)[0].compile(CodeContext())
+    code.compile_eagerly()
+    data = serialize_code_context(code)
+
+    for i in xrange(len(data)):
+        corrupted = data[:i] + chr(ord(data[i]) ^ 0xFF) + data[i + 1:]
+
+        try:
+            deserialize_code_context(corrupted)
+        except SerializationError:
+            pass
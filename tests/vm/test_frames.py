@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
 from pytest import raises
 
+from tinySelf.parser import lex_and_parse
+
 from tinySelf.vm.frames import MethodStack
 from tinySelf.vm.frames import ProcessStack
+from tinySelf.vm.frames import ProcessQueue
 from tinySelf.vm.frames import ProcessCycler
+from tinySelf.vm.frames import PROCESS_READY
+from tinySelf.vm.frames import PROCESS_BLOCKED
+from tinySelf.vm.frames import PROCESS_SLEEPING
 
 from tinySelf.vm.code_context import CodeContext
 from tinySelf.vm.object_layout import Object
@@ -29,6 +35,44 @@ def test_method_stack():
     assert f.pop_or_nil() == NIL
 
 
+def test_method_stack_grows():
+    f = MethodStack()
+    for i in range(100):
+        f.push(PrimitiveIntObject(i))
+
+    for i in reversed(range(100)):
+        assert f.pop() == PrimitiveIntObject(i)
+
+    with raises(IndexError):
+        f.pop()
+
+
+def test_method_stack_peek_and_drop():
+    f = MethodStack()
+    for i in range(3):
+        f.push(PrimitiveIntObject(i))
+
+    assert f.peek() == PrimitiveIntObject(2)
+    assert f.peek(2) == PrimitiveIntObject(0)
+
+    with raises(IndexError):
+        f.peek(3)
+
+    f.drop(2)
+    assert f.pop() == PrimitiveIntObject(0)
+
+    with raises(IndexError):
+        f.drop(1)
+
+
+def test_method_stack_is_preallocated_by_code_context():
+    ast = lex_and_parse("(| a = 1. |) a + (2 * 3)")
+    cc = ast[0].compile(CodeContext()).finalize()
+
+    assert cc.max_stack_depth == 4
+    assert len(MethodStack(cc)._stack) == cc.max_stack_depth
+
+
 def test_process_stack():
     ps = ProcessStack()
 
@@ -62,12 +106,12 @@ def test_process_stack_push_frame_behavior():
     ps.frame.push(retval)
 
     assert ps._length == 2
-    assert ps.frame._stack.obj == retval
-    assert ps.frame.prev_stack._stack.obj != retval
+    assert ps.frame._stack[ps.frame._length - 1] == retval
+    assert ps.frame.prev_stack._stack[ps.frame.prev_stack._length - 1] != retval
 
     ps.pop_down_and_cleanup_frame()
     assert ps._length == 1
-    assert ps.frame._stack.obj == retval
+    assert ps.frame._stack[ps.frame._length - 1] == retval
     assert ps.frame.prev_stack is None
 
 
@@ -96,8 +140,6 @@ def test_process_cycler_multiple_processes():
 
     assert pc.has_processes_to_run()
 
-    assert pc.process.frame.code_context is c1
-    pc.next_process()
     assert pc.process.frame.code_context is c1
     pc.next_process()
     assert pc.process.frame.code_context is c2
@@ -115,8 +157,6 @@ def test_process_cycler_multiple_processes_remove_process():
     pc.add_process(c1)
     pc.add_process(c2)
 
-    assert pc.process.frame.code_context is c1
-    pc.next_process()
     assert pc.process.frame.code_context is c1
     pc.next_process()
     assert pc.process.frame.code_context is c2
@@ -128,3 +168,140 @@ def test_process_cycler_multiple_processes_remove_process():
     pc.remove_active_process()
 
     assert pc.process.frame.code_context is c1
+
+
+def test_process_cycler_is_strict_round_robin():
+    pc = ProcessCycler(time_slice=1)
+    p1 = pc.add_process(CodeContext())
+    p2 = pc.add_process(CodeContext())
+    p3 = pc.add_process(CodeContext())
+
+    order = []
+    for _ in range(6):
+        order.append(pc.process)
+        pc.tick()
+
+    assert order == [p1, p2, p3, p1, p2, p3]
+
+    assert pc.process is p1
+    pc.remove_active_process()
+
+    order = []
+    for _ in range(4):
+        order.append(pc.process)
+        pc.tick()
+
+    assert order == [p2, p3, p2, p3]
+
+
+def test_process_queue():
+    p1 = ProcessStack(CodeContext())
+    p2 = ProcessStack(CodeContext())
+    p3 = ProcessStack(CodeContext())
+
+    pq = ProcessQueue()
+    assert pq.rotate() is None
+
+    pq.append(p1)
+    pq.append(p2)
+    pq.append(p3)
+    assert pq.length == 3
+    assert p1.queued and p2.queued and p3.queued
+
+    assert pq.head is p1
+    assert pq.rotate() is p2
+    assert pq.rotate() is p3
+
+    pq.remove(p3)
+    assert not p3.queued
+    assert pq.length == 2
+    assert pq.head is p1
+    assert pq.rotate() is p2
+    assert pq.rotate() is p1
+
+    pq.remove(p1)
+    pq.remove(p2)
+    assert pq.length == 0
+    assert pq.head is None
+
+
+def test_process_cycler_time_slice():
+    c1 = CodeContext()
+    c2 = CodeContext()
+    pc = ProcessCycler(time_slice=2)
+
+    pc.add_process(c1)
+    pc.add_process(c2)
+    assert pc.process.frame.code_context is c1
+
+    pc.tick()
+    assert pc.process.frame.code_context is c1
+    pc.tick()
+    assert pc.process.frame.code_context is c2
+    pc.tick()
+    assert pc.process.frame.code_context is c2
+    pc.tick()
+    assert pc.process.frame.code_context is c1
+
+
+def test_process_cycler_remove_finished_process():
+    c1 = CodeContext()
+    pc = ProcessCycler(c1)
+
+    process = pc.remove_active_process()
+    assert not pc.has_processes_to_run()
+    assert pc.remove_process(process) is process
+
+    pc.process = process
+    c2 = CodeContext()
+    pc.add_process(c2)
+    assert pc.process.frame.code_context is c2
+
+
+def test_process_cycler_blocked_process_is_not_cycled():
+    c1 = CodeContext()
+    c2 = CodeContext()
+    pc = ProcessCycler()
+
+    p1 = pc.add_process(c1)
+    p2 = pc.add_process(c2)
+
+    pc.block_process(p2)
+    assert p2.state == PROCESS_BLOCKED
+    assert pc.process_count == 1
+    assert pc.number_of_processes() == 2
+
+    for _ in range(4):
+        pc.next_process()
+        assert pc.process is p1
+
+    pc.wake_process(p2)
+    assert p2.state == PROCESS_READY
+    assert pc.process_count == 2
+    assert pc.number_of_processes() == 2
+
+    pc.next_process()
+    assert pc.process is p2
+    pc.next_process()
+    assert pc.process is p1
+
+
+def test_process_cycler_sleeping_process():
+    c1 = CodeContext()
+    pc = ProcessCycler()
+    p1 = pc.add_process(c1)
+
+    pc.sleep_process(p1, 0)
+    assert p1.state == PROCESS_SLEEPING
+    assert pc.process_count == 0
+    assert pc.has_processes_to_run()
+
+    assert pc.wait_for_process()
+    assert pc.process is p1
+    assert p1.state == PROCESS_READY
+    assert len(pc.sleepers) == 0
+
+    pc.remove_active_process()
+    assert pc.number_of_processes() == 0
+    assert not pc.has_processes_to_run()
+    assert not pc.wait_for_process()
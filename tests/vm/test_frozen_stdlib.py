@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.frozen_stdlib import FROZEN_STDLIB_ENV
+from tinySelf.vm.frozen_stdlib import STDLIB_PATH
+from tinySelf.vm.frozen_stdlib import freeze_stdlib
+from tinySelf.vm.frozen_stdlib import _read_frozen_stdlib
+from tinySelf.vm.virtual_machine import virtual_machine
+
+
+def _stdlib_source():
+    with open(STDLIB_PATH) as f:
+        return f.read()
+
+
+def test_script_runs_in_the_frozen_stdlib(new_os_process):
+    snapshot = freeze_stdlib(_stdlib_source())
+    new_os_process()
+
+    process, interpreter = virtual_machine("""(|
+        run = (| i <- 0. |
+            [i < 10] whileTrue: [ i: i + 1 ].
+            true ifTrue: [ i ] False: [ 0 ].
+        )
+    |) run""", snapshot_data=snapshot)
+
+    assert process.finished
+    assert not process.finished_with_error
+    assert process.result == PrimitiveIntObject(10)
+
+    # workers start from the same snapshot
+    assert interpreter.snapshot_data == snapshot
+
+
+def test_read_frozen_stdlib(tmpdir, monkeypatch):
+    monkeypatch.delenv(FROZEN_STDLIB_ENV, raising=False)
+    assert _read_frozen_stdlib() == ""
+
+    snapshot_file = tmpdir.join("stdlib.snapshot")
+    snapshot_file.write("snapshot")
+    monkeypatch.setenv(FROZEN_STDLIB_ENV, str(snapshot_file))
+
+    assert _read_frozen_stdlib() == "snapshot"
@@ -8,12 +8,18 @@ from tinySelf.parser import lex_and_parse
 from tinySelf.vm.primitives import get_primitives
 from tinySelf.vm.primitives import PrimitiveIntObject
 from tinySelf.vm.primitives import PrimitiveStrObject
+from tinySelf.vm.primitives import add_block_trait
+from tinySelf.vm.primitives import clone_block
+from tinySelf.vm.primitives import add_primitive_fn
+from tinySelf.vm.primitives import AssignmentPrimitive
 
 from tinySelf.vm.interpreter import NIL
 from tinySelf.vm.interpreter import Interpreter
 
 from tinySelf.vm.code_context import CodeContext
 
+from tinySelf.vm.bytecodes import BYTECODE_QUICK_ADD
+
 from tinySelf.vm.object_layout import Object
 
 
@@ -116,6 +122,193 @@ def test_calling_block_twice_with_argument():
     assert interpreter.process.result == PrimitiveIntObject(7)
 
 
+def test_block_with_local_slots():
+    ast = lex_and_parse("""(|
+        test = (| b <- 4. |
+            [| a | a: 3. a + b] value
+        )
+    |) test""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+
+    interpreter.interpret()
+    assert interpreter.process.result == PrimitiveIntObject(7)
+
+
+def test_block_activations_share_locals_map():
+    prototype = Object()
+    add_block_trait(prototype)
+    prototype.map.code_context = CodeContext()
+    prototype.map.code_context.number_of_locals = 2
+    prototype.meta_add_slot("a", NIL)
+    prototype.meta_add_slot("a:", AssignmentPrimitive())
+
+    interpreter = Interpreter(universe=get_primitives())
+    scope = Object()
+    first = interpreter._create_block_activation(clone_block(prototype, scope), scope)
+    second = interpreter._create_block_activation(clone_block(prototype, scope), scope)
+
+    assert first.map is second.map
+    assert len(first._slot_values) == 3  # marker of the activation first
+    assert first.get_slot("ThisIsIntermediateObj") is first
+    assert first.get_slot("a") is NIL
+    assert first.get_slot("value") is None
+    assert first.scope_parent is scope
+
+
+def test_block_activation_follows_slots_added_by_mirror():
+    prototype = Object()
+    add_block_trait(prototype)
+    prototype.map.code_context = CodeContext()
+    prototype.map.code_context.number_of_locals = 1
+    prototype.meta_add_slot("a", NIL)
+
+    interpreter = Interpreter(universe=get_primitives())
+    scope = Object()
+    block = clone_block(prototype, scope)
+    interpreter._create_block_activation(block, scope)
+
+    block.meta_add_slot("b", PrimitiveIntObject(1))
+    activation = interpreter._create_block_activation(block, scope)
+
+    assert block.code_context.number_of_locals == 2
+    assert activation.get_slot("b") == PrimitiveIntObject(1)
+
+
+def test_blocks_from_one_literal_share_map():
+    prototype = Object()
+    add_block_trait(prototype)
+
+    scope = Object()
+    first = clone_block(prototype, scope)
+    second = clone_block(prototype, scope)
+
+    assert first.map is second.map
+    assert first.is_block
+    assert first.scope_parent is scope
+    assert first.get_slot("value") is first
+    assert first.get_slot("with:") is first
+    assert second.get_slot("value") is second
+    assert first.parent_lookup("asString") is not None
+
+
+def test_recursion_with_local_slots():
+    ast = lex_and_parse("""(|
+        fact: n = (| r |
+            r: 1.
+            (n < 2) ifFalse: [
+                r: fact: n - 1.
+                r: r * n.
+            ].
+            r
+        ).
+    |) fact: 5""")
+
+    universe = get_primitives()
+    universe.meta_add_slot("primitives", get_primitives())
+
+    dirname = os.path.dirname(__file__)
+    stdlib_path = os.path.join(dirname, "..", "..", "objects", "stdlib.tself")
+    with open(stdlib_path) as stdlib_file:
+        stdlib = lex_and_parse(stdlib_file.read())
+
+    interpreter = Interpreter(universe)
+    for item in stdlib + ast:
+        process = interpreter.add_process(item.compile(CodeContext()))
+        interpreter.interpret()
+
+    assert process.result == PrimitiveIntObject(120)
+
+
+def test_nonlocal_return_from_nested_block():
+    ast = lex_and_parse("""(|
+        test = (||
+            [ [ ^ 1 ] value. 2 ] value.
+            3
+        ).
+    |) test""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+
+    interpreter.interpret()
+    assert interpreter.process.result == PrimitiveIntObject(1)
+
+
+def test_method_object_is_not_changed_by_call():
+    ast = lex_and_parse("""(|
+        a <- 0.
+        m: x = (| local <- 1. | local: x. a: local)
+    |)""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+    interpreter.interpret()
+
+    obj = interpreter.process.result
+    method = obj.get_slot("m:")
+    scope_parent = method.scope_parent
+
+    process = interpreter.add_process(lex_and_parse("m: 2")[0].compile(CodeContext()))
+    process.frame.self = obj
+    interpreter.interpret()
+
+    assert obj.get_slot("a") == PrimitiveIntObject(2)
+    assert method.get_slot("local") == PrimitiveIntObject(1)
+    assert method.scope_parent is scope_parent
+
+
+def test_parameter_objects_share_map_and_setters():
+    ast = lex_and_parse("""(|
+        m: a With: b = (|| a + b)
+    |)""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+    interpreter.interpret()
+
+    method = interpreter.process.result.get_slot("m:With:")
+    receiver = Object()
+
+    first = interpreter._create_intermediate_params_obj(
+        receiver, method, [PrimitiveIntObject(1), PrimitiveIntObject(2)]
+    )
+    second = interpreter._create_intermediate_params_obj(
+        receiver, method, [PrimitiveIntObject(3)]
+    )
+
+    assert first.map is second.map
+    assert first.map is method.code_context._params_map
+    assert first.scope_parent is receiver
+    assert first.get_slot("a") == PrimitiveIntObject(1)
+    assert first.get_slot("b") == PrimitiveIntObject(2)
+    assert second.get_slot("b") is NIL
+    assert first.get_slot("a:") is second.get_slot("b:")
+
+    with raises(ValueError):
+        interpreter._create_intermediate_params_obj(
+            receiver, method, [NIL, NIL, NIL]
+        )
+
+
+def test_primitive_arity_is_checked():
+    universe = get_primitives()
+    add_primitive_fn(universe, "test:", lambda _, __, parameters: NIL, [])
+
+    ast = lex_and_parse("""(|
+        test = (|| test: 2)
+    |) test""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=universe, code_context=context)
+
+    with raises(ValueError) as error:
+        interpreter.interpret()
+
+    assert "takes 0 parameters, 1 given" in str(error.value)
+
+
 def test_resend():
     ast = lex_and_parse("""(|
         p* = (| xex = 1. |).
@@ -190,6 +383,28 @@ def test_parallelism():
     assert two_plus_two_process.result == PrimitiveIntObject(4)
 
 
+def test_sleeping_process_lets_others_run():
+    sleeper_ast = lex_and_parse("""(|
+        run = (|| primitives interpreter sleep: 0.1. 1)
+    |) run""")
+    worker_ast = lex_and_parse("""(|
+        run = (|| primitives interpreter numberOfProcesses)
+    |) run""")
+
+    interpreter = Interpreter(universe=get_primitives())
+    sleeper = interpreter.add_process(sleeper_ast[0].compile(CodeContext()))
+    worker = interpreter.add_process(worker_ast[0].compile(CodeContext()))
+
+    interpreter.interpret()
+
+    assert sleeper.finished
+    assert sleeper.result == PrimitiveIntObject(1)
+
+    # the sleeping process is counted too
+    assert worker.finished
+    assert worker.result == PrimitiveIntObject(2)
+
+
 def test_halt():
     ast = lex_and_parse("""(|
         test = (||
@@ -258,6 +473,36 @@ def test_set_error_handler_and_handle_error():
     assert result == PrimitiveIntObject(2)
 
 
+def test_binary_send_is_quickened():
+    ast = lex_and_parse("""(|
+        a <- 1.
+    |) a + 2""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+
+    interpreter.interpret()
+    assert interpreter.process.result == PrimitiveIntObject(3)
+    assert BYTECODE_QUICK_ADD in context.opcodes
+
+
+def test_quickened_send_deoptimizes():
+    ast = lex_and_parse("""(|
+        add: a To: b = (|| a + b).
+        test = (| tmp |
+            tmp: (add: 1 To: 2) + (add: 1.5 To: 1).
+            tmp: (add: 'a' To: 'b').
+            ^ (add: 2 To: 3) asString + tmp.
+        )
+    |) test""")
+
+    context = ast[0].compile(CodeContext())
+    interpreter = Interpreter(universe=get_primitives(), code_context=context)
+
+    interpreter.interpret()
+    assert interpreter.process.result == PrimitiveStrObject("5ab")
+
+
 def test_running_self_unittest_file():
     universe = Object()
     universe.meta_add_slot("primitives", get_primitives())
@@ -274,3 +519,64 @@ def test_running_self_unittest_file():
 
         assert process.finished
         assert not process.finished_with_error
+
+
+def test_storing_shared_int_does_not_change_its_scope():
+    ast = lex_and_parse("""(|
+        test = (| o |
+            o: (| secret = 42. a = 7 |).
+            (3 + 4) secret
+        )
+    |) test""")
+
+    interpreter = Interpreter(universe=get_primitives())
+    interpreter.add_process(ast[0].compile(CodeContext()))
+
+    with raises(ValueError):
+        interpreter.interpret()
+
+
+def test_storing_literal_str_does_not_change_its_scope():
+    ast = lex_and_parse("""(|
+        test = (| o |
+            o: (| secret = 42. a = 'x' |).
+            'x' secret
+        )
+    |) test""")
+
+    interpreter = Interpreter(universe=get_primitives())
+    interpreter.add_process(ast[0].compile(CodeContext()))
+
+    with raises(ValueError):
+        interpreter.interpret()
+
+
+def test_shared_int_uses_universe_of_each_interpreter():
+    for marker in (111, 222):
+        universe = get_primitives()
+        universe.meta_add_slot("marker", PrimitiveIntObject(marker))
+
+        ast = lex_and_parse("5 marker")
+        interpreter = Interpreter(universe=universe)
+        interpreter.add_process(ast[0].compile(CodeContext()))
+        interpreter.interpret()
+
+        assert interpreter.process.result == PrimitiveIntObject(marker)
+        assert PrimitiveIntObject(5).scope_parent is None
+
+
+def test_self_is_the_receiver_not_the_activation():
+    for message in ["foo: 2", "bar: 2"]:
+        ast = lex_and_parse("""(|
+            a <- 1.
+            foo: x = (| y <- 3 | self).
+            bar: x = (| y <- 3 | [| z <- 4 | z. self] value).
+        |) %s""" % message)
+
+        interpreter = Interpreter(universe=get_primitives())
+        process = interpreter.add_process(ast[0].compile(CodeContext()))
+        interpreter.interpret()
+
+        assert process.result.get_slot("a") == PrimitiveIntObject(1)
+        assert process.result.get_slot("x") is None
+        assert process.result.get_slot("y") is None
@@ -3,6 +3,8 @@ from tinySelf.vm.primitives import PrimitiveStrObject
 from tinySelf.vm.primitives import AssignmentPrimitive
 from tinySelf.vm.code_context import CodeContext
 from tinySelf.vm.object_layout import Object
+from tinySelf.vm.object_layout import LOOKUP_CACHE
+from tinySelf.vm.symbols import intern_symbol
 
 
 def test_meta_add_slot():
@@ -71,11 +73,11 @@ def test_meta_remove_slot():
 
     o.meta_add_slot("test", Object())
     assert o._slot_values
-    assert "test" in o.map._slots
+    assert intern_symbol("test") in o.map._slots
 
     o.meta_remove_slot("test")
     assert not o._slot_values
-    assert "test" not in o.map._slots
+    assert intern_symbol("test") not in o.map._slots
 
 
 def test_meta_remove_missing_slot():
@@ -105,8 +107,8 @@ def test_meta_remove_slot_shift_map_pointers():
 
     assert len(o._slot_values) == 2
     assert len(o.map._slots) == 2
-    assert o.map._slots["second"] == 0
-    assert o.map._slots["third"] == 1
+    assert o.map._slots[intern_symbol("second")] == 0
+    assert o.map._slots[intern_symbol("third")] == 1
 
     assert o.get_slot("first") is None
     assert o.get_slot("second") == second
@@ -128,7 +130,9 @@ def test_meta_insert_slot():
     assert o.get_slot("third") is third
 
     o.meta_insert_slot(1, "second", second)
-    assert o.map._slots.keys() == ["first", "second", "third"]
+    assert o.map._slots.keys() == [
+        intern_symbol(name) for name in ["first", "second", "third"]
+    ]
 
     # make sure that objects didn't shifted
     assert o.get_slot("first") is first
@@ -162,7 +166,7 @@ def test_meta_add_parent():
     o = Object()
     o.meta_add_parent("p*", val)
 
-    assert "p*" in o.map._parent_slots
+    assert intern_symbol("p*") in o.map._parent_slots
     assert val in o._parent_slot_values
 
 
@@ -381,3 +385,114 @@ def test_is_assignment_primitive():
     assert o.is_assignment_primitive
     assert not o.has_code
 
+
+
+def test_parent_lookup_is_cached():
+    val = PrimitiveStrObject("it is xex!")
+
+    p = Object()
+    p.meta_add_slot("xex", val)
+
+    o = Object()
+    o.meta_add_parent("p", p)
+
+    assert LOOKUP_CACHE.lookup(o, intern_symbol("xex")) is None
+    assert o.parent_lookup("xex") is val
+    assert LOOKUP_CACHE.lookup(o, intern_symbol("xex")) is val
+
+
+def test_parent_lookup_cache_is_invalidated_by_structural_change():
+    val = PrimitiveStrObject("it is xex!")
+    new_val = PrimitiveStrObject("it is the new xex!")
+
+    grandparent = Object()
+    grandparent.meta_add_slot("xex", val)
+
+    p = Object()
+    p.meta_add_parent("grandparent", grandparent)
+
+    o = Object()
+    o.meta_add_parent("p", p)
+
+    assert o.parent_lookup("xex") is val
+
+    p.meta_add_slot("xex", new_val)
+    assert LOOKUP_CACHE.lookup(o, intern_symbol("xex")) is None
+
+    grandparent.meta_remove_slot("xex")
+    assert o.parent_lookup("xex") is new_val
+
+
+def test_parent_lookup_cache_is_invalidated_by_scope_parent_change():
+    val = PrimitiveStrObject("it is xex!")
+    new_val = PrimitiveStrObject("it is the new xex!")
+
+    o = Object()
+    o.scope_parent = Object()
+    o.scope_parent.scope_parent = Object()
+    o.scope_parent.scope_parent.meta_add_slot("xex", val)
+
+    assert o.parent_lookup("xex") is val
+
+    o.scope_parent.scope_parent = Object()
+    o.scope_parent.scope_parent.meta_add_slot("xex", new_val)
+
+    assert o.parent_lookup("xex") is new_val
+
+
+def test_parent_lookup_cache_respects_parents_of_receiver():
+    val = PrimitiveStrObject("it is xex!")
+    other_val = PrimitiveStrObject("it is other xex!")
+
+    p = Object()
+    p.meta_add_slot("xex", val)
+
+    other_p = Object()
+    other_p.meta_add_slot("xex", other_val)
+
+    o = Object()
+    o.meta_add_parent("p", p)
+    clone = o.clone()
+
+    assert o.parent_lookup("xex") is val
+
+    clone._parent_slot_values = [other_p]  # same map, different parent
+    assert clone.map is o.map
+    assert clone.parent_lookup("xex") is other_val
+
+
+def test_parent_lookup_cache_reflects_assignment():
+    p = Object()
+    p.meta_add_slot("xex", PrimitiveStrObject("it is xex!"))
+
+    o = Object()
+    o.meta_add_parent("p", p)
+
+    assert o.parent_lookup("xex") == PrimitiveStrObject("it is xex!")
+
+    p.set_slot("xex", PrimitiveStrObject("assigned"))
+    assert o.parent_lookup("xex") == PrimitiveStrObject("assigned")
+
+
+def test_clone_shares_slot_values_until_write():
+    o = Object()
+    o.meta_add_slot("a", Object())
+    o.meta_add_parent("p", Object())
+
+    clone = o.clone()
+    assert clone._slot_values is o._slot_values
+    assert clone._parent_slot_values is o._parent_slot_values
+
+    new_value = Object()
+    clone.set_slot("a", new_value)
+    assert clone._slot_values is not o._slot_values
+    assert clone.get_slot("a") is new_value
+    assert o.get_slot("a") is not new_value
+
+    o.meta_add_parent("p", new_value)
+    assert o.meta_get_parent("p") is new_value
+    assert clone.meta_get_parent("p") is not new_value
+
+    o.meta_add_slot("b", Object())
+    assert clone.get_slot("b") is None
+    assert len(clone._slot_values) == 1
@@ -2,6 +2,7 @@
 from tinySelf.vm.object_layout import Object
 from tinySelf.vm.object_layout import ObjectMap
 from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.symbols import intern_symbol
 
 
 def test_create_instance():
@@ -12,18 +13,18 @@ def test_add_slot():
     om = ObjectMap()
 
     om.add_slot("test", 1)
-    assert "test" in om._slots
-    assert om._slots["test"] == 1
+    assert intern_symbol("test") in om._slots
+    assert om._slots[intern_symbol("test")] == 1
 
 
 def test_remove_slot():
     om = ObjectMap()
 
     om.add_slot("test", 1)
-    assert "test" in om._slots
+    assert intern_symbol("test") in om._slots
 
     om.remove_slot("test")
-    assert "test" not in om._slots
+    assert intern_symbol("test") not in om._slots
 
     om.remove_slot("azgabash")
 
@@ -33,37 +34,47 @@ def test_insert_slot():
 
     om.add_slot("first", 1)
     om.add_slot("third", 1)
-    assert om._slots.keys() == ["first", "third"]
+    assert om._slots.keys() == [
+        intern_symbol(name) for name in ["first", "third"]
+    ]
 
     om.insert_slot(1, "second", 1)
-    assert om._slots.keys() == ["first", "second", "third"]
+    assert om._slots.keys() == [
+        intern_symbol(name) for name in ["first", "second", "third"]
+    ]
 
     om.insert_slot(0, "zero", 1)
-    assert om._slots.keys() == ["zero", "first", "second", "third"]
+    assert om._slots.keys() == [
+        intern_symbol(name) for name in ["zero", "first", "second", "third"]
+    ]
 
     om.insert_slot(10, "tenth", 1)
-    assert om._slots.keys() == ["zero", "first", "second", "third", "tenth"]
+    assert om._slots.keys() == [
+        intern_symbol(name) for name in ["zero", "first", "second", "third", "tenth"]
+    ]
 
     om.insert_slot(-1, "-1", 1)
-    assert om._slots.keys() == ["-1", "zero", "first", "second", "third", "tenth"]
+    assert om._slots.keys() == [
+        intern_symbol(name) for name in ["-1", "zero", "first", "second", "third", "tenth"]
+    ]
 
 
 def test_set_or_add_parent():
     om = ObjectMap()
     om.add_parent("test", 1)
 
-    assert "test" in om._parent_slots
-    assert om._parent_slots["test"] == 1
+    assert intern_symbol("test") in om._parent_slots
+    assert om._parent_slots[intern_symbol("test")] == 1
 
 
 def test_remove_parent():
     om = ObjectMap()
 
     om.add_parent("test", 1)
-    assert "test" in om._parent_slots
+    assert intern_symbol("test") in om._parent_slots
 
     om.remove_parent("test")
-    assert "test" not in om._parent_slots
+    assert intern_symbol("test") not in om._parent_slots
 
 
 def test_clone():
@@ -83,3 +94,40 @@ def test_clone_is_block():
     o.meta_add_parent("xe", Object())  # creates new map
 
     assert o.is_block
+
+
+def test_transitions_share_maps():
+    prototype = Object()
+    prototype.meta_add_slot("a", Object())
+
+    first = prototype.clone()
+    second = prototype.clone()
+
+    first.meta_add_slot("b", Object())
+    second.meta_add_slot("b", Object())
+    assert first.map is second.map
+    assert first.map is not prototype.map
+    assert prototype.slot_keys == ["a"]
+
+    first.meta_add_parent("p", Object())
+    second.meta_add_parent("p", Object())
+    assert first.map is second.map
+
+    third = prototype.clone()
+    third.meta_add_slot("c", Object())
+    assert third.map is not first.map
+    assert third.slot_keys == ["a", "c"]
+    assert first.slot_keys == ["a", "b"]
+
+
+def test_transition_map_is_not_changed_in_place():
+    prototype = Object()
+    first = prototype.clone()
+    second = prototype.clone()
+
+    first.meta_add_slot("a", Object())
+    second.meta_add_slot("a", Object())
+
+    first.meta_add_slot("b", Object())
+    assert second.slot_keys == ["a"]
+    assert first.slot_keys == ["a", "b"]
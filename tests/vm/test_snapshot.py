@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from pytest import raises
+
+from tinySelf.parser import lex_and_parse
+from tinySelf.vm.primitives import PrimitiveIntObject
+from tinySelf.vm.primitives import PrimitiveStrObject
+from tinySelf.vm.primitives import PrimitiveTrueObject
+from tinySelf.vm.code_context import CodeContext
+from tinySelf.vm.code_serialization import Reader
+from tinySelf.vm.snapshot import SnapshotError
+from tinySelf.vm.snapshot import dump_snapshot
+from tinySelf.vm.snapshot import load_snapshot
+from tinySelf.vm.snapshot import save_snapshot
+from tinySelf.vm.snapshot import restore_snapshot
+from tinySelf.vm.virtual_machine import virtual_machine
+
+
+INIT_SOURCE = """(|
+    init = (| universe_mirror |
+        universe_mirror: primitives mirrorOn: universe.
+        universe_mirror toSlot: 'answer' Add: 42.
+        universe_mirror toSlot: 'name' Add: 'snapshot'.
+        universe_mirror toSlot: 'counter' Add: (|
+            value <- 0.
+            inc = (|| value: value + 1. value)
+        |).
+        universe_mirror toSlot: 'increment' Add: [:x | x + 1].
+
+        (primitives mirrorOn: true) toSlot: 'snapshotTest' Add: (|| 'yes').
+    ).
+|) init."""
+
+
+def _prepared_interpreter():
+    process, interpreter = virtual_machine(INIT_SOURCE)
+    assert process.finished
+    assert not process.finished_with_error
+
+    return interpreter
+
+
+def _run(interpreter, source):
+    ast = lex_and_parse(source)
+    process = interpreter.add_process(ast[0].compile(CodeContext()))
+    interpreter.interpret()
+
+    assert process.finished
+    assert not process.finished_with_error
+
+    return process.result
+
+
+def test_snapshot_restores_the_universe(new_os_process):
+    data = dump_snapshot(_prepared_interpreter())
+    new_os_process()
+
+    # changes of the singletons are restored from the snapshot
+    assert PrimitiveTrueObject().get_slot("snapshotTest") is None
+
+    interpreter = restore_snapshot(Reader(data))
+
+    assert _run(interpreter, """(|
+        run = (|| counter inc. counter inc + answer)
+    |) run""") == PrimitiveIntObject(44)
+    assert _run(interpreter, "(| run = (|| name) |) run") == \
+        PrimitiveStrObject("snapshot")
+    assert _run(interpreter, "(| run = (|| increment with: 1) |) run") == \
+        PrimitiveIntObject(2)
+    assert _run(interpreter, "(| run = (|| true snapshotTest) |) run") == \
+        PrimitiveStrObject("yes")
+
+
+def test_primitives_are_bound_to_the_new_interpreter(new_os_process):
+    data = dump_snapshot(_prepared_interpreter())
+    new_os_process()
+
+    interpreter = restore_snapshot(Reader(data))
+    assert _run(interpreter, """(|
+        run = (|| primitives interpreter numberOfProcesses)
+    |) run""") == PrimitiveIntObject(1)
+
+
+def test_load_snapshot_from_file(tmpdir, new_os_process):
+    path = str(tmpdir.join("universe.snapshot"))
+    save_snapshot(_prepared_interpreter(), path)
+    new_os_process()
+
+    interpreter = load_snapshot(path)
+    assert interpreter.snapshot_path == path
+    assert _run(interpreter, "(| run = (|| answer) |) run") == \
+        PrimitiveIntObject(42)
+
+    new_os_process()
+    process, _ = virtual_machine("(| run = (|| answer + 1) |) run",
+                                 snapshot_path=path)
+    assert process.result == PrimitiveIntObject(43)
+
+
+def test_invalid_snapshot_raises_error(tmpdir, new_os_process):
+    new_os_process()
+
+    path = tmpdir.join("invalid.snapshot")
+    path.write("not a snapshot")
+
+    with raises(SnapshotError):
+        load_snapshot(str(path))
+
+    with raises(SnapshotError):
+        load_snapshot(str(tmpdir.join("missing.snapshot")))
+
+
+def test_slot_index_out_of_slot_values_raises_error(new_os_process):
+    interpreter = _prepared_interpreter()
+    universe = interpreter.universe
+    universe._slot_values = universe._slot_values[:-1]
+    data = dump_snapshot(interpreter)
+    new_os_process()
+
+    with raises(SnapshotError):
+        restore_snapshot(Reader(data))
+
+    # failed restore doesn't change the singletons
+    assert PrimitiveTrueObject().get_slot("snapshotTest") is None
+
+
+def test_snapshot_is_not_restored_after_the_code_ran(new_os_process):
+    data = dump_snapshot(_prepared_interpreter())
+
+    with raises(SnapshotError):
+        restore_snapshot(Reader(data))
+
+    # the singletons stay as the code left them
+    assert PrimitiveTrueObject().get_slot("snapshotTest") is not None
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from tinySelf.parser import lex_and_parse
+
+from tinySelf.vm.symbols import SYMBOLS
+from tinySelf.vm.symbols import intern_symbol
+from tinySelf.vm.code_context import CodeContext
+
+
+def test_intern_symbol():
+    symbol = intern_symbol("test_intern_symbol:")
+
+    assert symbol is intern_symbol("test_intern_symbol:")
+    assert symbol is not intern_symbol("test_intern_symbol")
+    assert symbol.name == "test_intern_symbol:"
+    assert SYMBOLS.intern("test_intern_symbol:") is symbol
+
+
+def test_assigned_symbol():
+    symbol = intern_symbol("xe:")
+
+    assert symbol.assigned_symbol is intern_symbol("xe")
+
+
+def test_send_sites_have_symbols():
+    ast = lex_and_parse("a: 1 B: 2")
+    context = ast[0].compile(CodeContext()).finalize()
+
+    symbols = [symbol for symbol in context.symbols if symbol is not None]
+    assert symbols == [intern_symbol("a:B:")]